@@ -1,30 +1,56 @@
 import os
-import json
 import random
 import numpy as np
-import faiss
+import sys
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.faiss_utils import vectors_by_id, load_index
+from utils.chunk_meta import load_chunk_meta, META_PREFIX
+from utils.embedding_store import load_embedding_store
+from utils.chunking import pool_chunks
+
 INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked.faiss")
-METADATA_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked_meta.json")
 OUTPUT_DATA_PATH = os.path.join(ROOT_DIR, "data", "audio_triplets.npz")
 
 
-def create_triplets(num_triplets=2000):
+def load_vectors_from_store(store):
+    """
+    Raw 512-d chunk vectors pooled straight from the OpenL3 store, so triplets
+    always match the adapter's input even when the index holds 128-d vectors.
+    """
+    print(f"🔹 Pooling chunks for {len(store)} songs from the OpenL3 store...")
+    all_vectors = []
+    song_to_indices = {}
+    for name in sorted(store.songs):
+        emb = store.get(name)
+        if emb is None or len(emb) == 0: continue
+        pooled, _ = pool_chunks(emb)
+        pooled = pooled / (np.linalg.norm(pooled, axis=1, keepdims=True) + 1e-12)
+        song_to_indices[name] = list(range(len(all_vectors), len(all_vectors) + len(pooled)))
+        all_vectors.extend(pooled)
+    return np.array(all_vectors).astype('float32'), song_to_indices
+
+
+def load_vectors_from_index():
     # 1. Validation
-    if not os.path.exists(INDEX_PATH) or not os.path.exists(METADATA_PATH):
+    meta = load_chunk_meta(META_PREFIX)
+    if not os.path.exists(INDEX_PATH) or meta is None:
         print("❌ Error: Index missing. Run scripts/2_build_audio_index.py first!")
-        return
+        return None, None
 
     print("🔹 Loading index to generate training data...")
+
     try:
-        index = faiss.read_index(INDEX_PATH)
-        # reconstruct_n pulls the raw vectors back out of FAISS
-        all_vectors = index.reconstruct_n(0, index.ntotal)
+        index = load_index(INDEX_PATH)
+        # Pull the raw vectors back out of FAISS, row i = chunk ID i
+        # (incrementally updated indexes are ID-mapped and may have gaps)
+        all_vectors = vectors_by_id(index, len(meta))
     except Exception as e:
         print(f"❌ Error reading index: {e}")
         print("Tip: Make sure you are using faiss-cpu or faiss-gpu and the index is IndexFlatIP.")
-        return
+        return None, None
 
     # 2. Dimension Check (Critical!)
     # We expect 512 dimensions (Raw OpenL3).
@@ -35,17 +61,22 @@ def create_triplets(num_triplets=2000):
             "   If you already trained the model, delete 'models/audio_adapter.pth' and 'data/audio_chunked.faiss' and start over.")
         # We allow it to proceed, but it might crash the training script later.
 
-    with open(METADATA_PATH, 'r') as f:
-        meta = json.load(f)
-
     # 3. Grouping
     print(f"🔹 Grouping {len(meta)} chunks by song...")
-    song_to_indices = {}
-    for idx, entry in enumerate(meta):
-        name = entry['name']
-        if name not in song_to_indices:
-            song_to_indices[name] = []
-        song_to_indices[name].append(idx)
+    # Chunks removed by an incremental update are skipped
+    song_to_indices = meta.song_chunks()
+
+    return all_vectors, song_to_indices
+
+
+def create_triplets(num_triplets=2000):
+    # Prefer the raw OpenL3 store (always 512-d); fall back to the index vectors
+    store = load_embedding_store()
+    if store is not None and len(store):
+        all_vectors, song_to_indices = load_vectors_from_store(store)
+    else:
+        all_vectors, song_to_indices = load_vectors_from_index()
+        if all_vectors is None: return
 
     song_names = list(song_to_indices.keys())
     anchors, positives, negatives = [], [], []
@@ -1,24 +1,41 @@
 import os
 import sys
-import json
+import time
 import numpy as np
-import faiss
 import torch
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 
 from utils.openl3_utils import extract_openl3_embedding
-from utils.model_def import AudioAdapter
+from utils.audio_utils import DecodedAudio, as_decoded, file_hash
+from utils.chroma_store import ChromaStoreWriter, compute_chroma, compute_beats, load_chroma_store
+from utils.beat_store import BeatStoreWriter, load_beat_store
+from utils.embedding_store import EmbeddingStoreWriter, load_embedding_store
+from utils.faiss_utils import (as_id_map, make_index, save_index, load_index, load_params, vectors_by_id,
+                               save_exact_vectors, append_exact_vectors, load_exact_vectors)
+from utils.chunking import pool_chunks
+from utils import index_manifest
+from utils.chunk_meta import ChunkMeta, META_PREFIX, load_chunk_meta
+from utils.song_index import save_song_index
+from utils.sharded_index import write_shards, load_shards_manifest, SHARDS_MANIFEST_PATH
+from utils.model_def import AudioAdapter, adapt_vectors
+from utils.worker_pool import map_embedding_workers
 
 # Config
 SONGS_DIR = os.path.join(ROOT_DIR, "data", "songs")
 INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked.faiss")
-METADATA_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked_meta.json")
 MODEL_PATH = os.path.join(ROOT_DIR, "models", "audio_adapter.pth")
 
 CHUNK_SIZE = 10.0
 HOP_SIZE = 5.0
+NUM_WORKERS = 1  # Override with: python 2_build_audio_index.py <workers> [--update | --from-store] [--index=<type>] [--rerank] [--shards=N]
+INDEX_TYPE = "flat"  # flat | ivf | hnsw | sq8 | fp16 | pq, override with --index=<type>
+RERANK = False  # --rerank: keep float32 vectors on disk and re-score shortlists exactly
+NUM_SHARDS = 1  # --shards=N: split the chunk index by song hash, searched by N worker processes
+
+# Per-process adapter for pool workers (set by load_worker_model)
+WORKER_MODEL = None
 
 
 def load_ai_model():
@@ -33,74 +50,290 @@ def load_ai_model():
         return None
 
 
-def process_file(filepath, model):
+def chunk_embeddings(full_emb, model):
+    """Pools per-second OpenL3 frames (T x 512) into index vectors + (start, end) spans."""
+    # 2. Chunking (10 s windows, 5 s hop) in one vectorized pass
+    pooled, spans = pool_chunks(full_emb, CHUNK_SIZE, HOP_SIZE)
+
+    # 3. Apply AI Model (Dimension Reduction 512 -> 128), all chunks in one batch
+    # Fallback without a model: just normalize the raw 512 vectors
+    vectors = adapt_vectors(pooled, model)
+    return vectors, spans
+
+
+def extract_raw(audio):
     # 1. Extract Raw OpenL3 (Shape: T x 512)
     try:
-        full_emb = extract_openl3_embedding(filepath)
+        full_emb = extract_openl3_embedding(audio)
     except:
-        return [], []
-
+        return np.empty((0, 512))
     if full_emb.ndim == 1: full_emb = full_emb.reshape(1, -1)
+    return full_emb
 
-    vectors = []
-    metadata = []
-    filename = os.path.basename(filepath)
-    num_seconds = full_emb.shape[0]
 
-    # 2. Chunking Loop
-    for start in range(0, num_seconds, int(HOP_SIZE)):
-        end = start + int(CHUNK_SIZE)
-        if end > num_seconds and start > 0: break
+def process_file(filepath, model):
+    # filepath may also be a DecodedAudio (the build reuses it for chroma)
+    audio = as_decoded(filepath)
+    return chunk_embeddings(extract_raw(audio), model)
 
-        # Average the chunk
-        chunk_raw = np.mean(full_emb[start:end], axis=0)
 
-        # 3. Apply AI Model (Dimension Reduction 512 -> 128)
-        if model:
-            with torch.no_grad():
-                tensor_in = torch.from_numpy(chunk_raw).float().unsqueeze(0)  # Add batch dim
-                tensor_out = model(tensor_in)
-                final_vec = tensor_out.numpy().flatten()
-        else:
-            # Fallback: Just normalize the raw 512 vector
-            final_vec = chunk_raw / (np.linalg.norm(chunk_raw) + 1e-12)
+def index_song(path, model):
+    """
+    Everything the build needs from one song, from a single decode:
+    raw OpenL3 frames, chunk vectors + spans, chroma and beats for the feature stores and timing.
+    """
+    t0 = time.perf_counter()
+    name = os.path.basename(path)
+    audio = DecodedAudio(path)
+    full_emb = extract_raw(audio)
+    v, spans = chunk_embeddings(full_emb, model)
+    chroma = beats = None
+    try:
+        chroma = compute_chroma(audio)
+        beats = compute_beats(audio)
+    except Exception as e:
+        print(f"   Chroma failed for {name}: {e}")
+    audio.release()
+    return {
+        "name": name,
+        "embedding": full_emb.astype('float16'),
+        "vectors": v,
+        "spans": spans,
+        "hash": file_hash(path),
+        "chroma": chroma,
+        "beats": beats,
+        "elapsed": time.perf_counter() - t0
+    }
 
-        vectors.append(final_vec)
-        metadata.append({"name": filename, "time": f"{start}-{end}s"})
 
-    return vectors, metadata
+def load_worker_model():
+    global WORKER_MODEL
+    WORKER_MODEL = load_ai_model()
 
 
-def build():
-    model = load_ai_model()
+def index_song_worker(path):
+    return index_song(path, WORKER_MODEL)
+
+
+def iter_indexed_songs(paths, workers):
+    """Yields index_song results in input order, serially or from a process pool."""
+    # Input order keeps the index layout deterministic
+    yield from map_embedding_workers(index_song_worker, paths, workers, initializer=load_worker_model)
+
+
+def build(workers=NUM_WORKERS, index_type=INDEX_TYPE, rerank=RERANK, shards=NUM_SHARDS):
     all_vecs = []
-    all_meta = []
+    meta = ChunkMeta()
+
+    files = sorted(f for f in os.listdir(SONGS_DIR) if f.endswith(".mp3"))
+    print(f"Found {len(files)} songs. Workers: {workers}")
+
+    # Chroma for melody verification is computed from the same decode
+    chroma_writer = ChromaStoreWriter()
+    # Beat positions for beat-synchronous chroma DTW
+    beat_writer = BeatStoreWriter()
+    # Raw per-second OpenL3 frames, so rechunking never re-runs OpenL3
+    emb_writer = EmbeddingStoreWriter()
+    # Manifest of content hashes enables later incremental updates
+    manifest = index_manifest.new_manifest()
 
-    files = [f for f in os.listdir(SONGS_DIR) if f.endswith(".mp3")]
-    print(f"Found {len(files)} songs.")
+    paths = [os.path.join(SONGS_DIR, f) for f in files]
+    t_start = time.perf_counter()
+    for i, res in enumerate(iter_indexed_songs(paths, workers)):
+        print(f"Processing [{i + 1}/{len(files)}] {res['name']}... "
+              f"{len(res['spans'])} chunks in {res['elapsed']:.1f}s")
+        first_id = meta.add_song(res['name'], res['spans'])
+        index_manifest.add_song(manifest, res['name'], res['hash'], first_id, len(res['spans']))
+        all_vecs.append(res['vectors'])
+        emb_writer.add(res['name'], res['hash'], res['embedding'])
+        if res['chroma'] is not None:
+            chroma_writer.add(res['name'], res['hash'], res['chroma'])
+        if res['beats'] is not None:
+            beat_writer.add(res['name'], res['hash'], res['beats'])
 
-    for i, f in enumerate(files):
-        print(f"Processing [{i + 1}/{len(files)}] {f}...")
-        v, m = process_file(os.path.join(SONGS_DIR, f), model)
-        all_vecs.extend(v)
-        all_meta.extend(m)
+    chroma_writer.close()
+    beat_writer.close()
+    emb_writer.close()
 
-    if not all_vecs: return
+    wall = time.perf_counter() - t_start
+    if files:
+        print(f"⏱️ {len(files)} songs in {wall:.1f}s "
+              f"({len(files) / wall:.2f} songs/s, {len(meta) / wall:.1f} chunks/s)")
+
+    save_catalog(all_vecs, meta, manifest, index_type, rerank, shards)
+
+
+def save_catalog(all_vecs, meta, manifest, index_type=INDEX_TYPE, rerank=RERANK, shards=NUM_SHARDS):
+    # all_vecs: one (chunks x d) array per song, meta: ChunkMeta with one row per chunk
+    if not len(meta): return
 
     # 4. Create Index
-    X = np.array(all_vecs).astype('float32')
+    X = np.vstack(all_vecs).astype('float32')
     d = X.shape[1]  # Will be 128 if model used, 512 if not
-    print(f"Building Index with vector dimension: {d}")
+    print(f"Building '{index_type}' Index with vector dimension: {d}")
 
-    index = faiss.IndexFlatIP(d)
-    index.add(X)
-
-    faiss.write_index(index, INDEX_PATH)
-    with open(METADATA_PATH, 'w') as f:
-        json.dump(all_meta, f)
+    # The single index file is always written: the offline scripts (5_main_check,
+    # check_*, stats, triplets) read it even when the engine searches shards
+    index, params = make_index(X, index_type)
+    if rerank:
+        save_exact_vectors(X, INDEX_PATH)
+        params["rerank"] = True
+    save_index(index, INDEX_PATH, params)
+    if shards > 1:
+        # The engine searches the shards instead; IDs and metadata stay global
+        hashes = {name: song['hash'] for name, song in manifest['songs'].items()}
+        sharded = write_shards(X, meta, hashes, shards, index_type)
+        print(f"🔹 Wrote {shards} shards: {[s['n_chunks'] for s in sharded['shards']]} chunks")
+        if rerank:
+            print("⚠️ Exact re-rank is not available for sharded indexes; only the single index uses it.")
+    elif os.path.exists(SHARDS_MANIFEST_PATH):
+        os.remove(SHARDS_MANIFEST_PATH)  # Engines would otherwise keep using the old shards
+    meta.save(META_PREFIX)
+    # Coarse song-level stage of the search
+    save_song_index(X, meta.song_ids)
+    index_manifest.save_manifest(manifest)
 
     print("✅ Indexing Complete.")
 
 
+def rebuild_from_store(index_type=INDEX_TYPE, rerank=RERANK, shards=NUM_SHARDS):
+    """
+    Rechunks and re-adapts the whole catalog from the raw OpenL3 store, e.g. after
+    changing CHUNK_SIZE/HOP_SIZE or retraining the adapter. No audio is decoded.
+    """
+    store = load_embedding_store()
+    if store is None:
+        print("❌ No OpenL3 store found. Run a full build first.")
+        return
+
+    t_start = time.perf_counter()
+    model = load_ai_model()
+    all_vecs = []
+    meta = ChunkMeta()
+    manifest = index_manifest.new_manifest()
+    # Pool every song first, then run the adapter over the whole catalog in large batches
+    names = sorted(store.songs)
+    pooled_all = []
+    for name in names:
+        pooled, spans = pool_chunks(store.get(name), CHUNK_SIZE, HOP_SIZE)
+        first_id = meta.add_song(name, spans)
+        index_manifest.add_song(manifest, name, store.songs[name]['hash'], first_id, len(spans))
+        pooled_all.append(pooled)
+    if pooled_all:
+        all_vecs.append(adapt_vectors(np.vstack(pooled_all), model))
+
+    print(f"⏱️ Rechunked {len(store)} songs from the OpenL3 store in {time.perf_counter() - t_start:.1f}s")
+    save_catalog(all_vecs, meta, manifest, index_type, rerank, shards)
+
+
+def rewrite_store(writer, old_store, names, fresh):
+    """Writes `fresh` {name: (hash, features)} plus unchanged songs copied from `old_store`."""
+    for name in names:
+        if name in fresh:
+            writer.add(name, *fresh[name])
+        elif old_store is not None and name in old_store:
+            writer.copy_from(old_store, name)
+    writer.close()
+
+
+def update(workers=NUM_WORKERS):
+    """
+    Incremental build: embeds only new/changed songs and drops the chunks of
+    changed/deleted ones by stable ID. Metadata rows of removed chunks are marked
+    removed and new chunks are appended, so existing IDs never move.
+    """
+    sharded = load_shards_manifest()
+    if sharded is not None:
+        print(f"🔸 Index is split into {sharded['n_shards']} shards. Running full build.")
+        return build(workers, sharded['index_type'], shards=sharded['n_shards'])
+
+    manifest = index_manifest.load_manifest()
+    meta = load_chunk_meta(META_PREFIX, mmap=False)
+    if manifest is None or meta is None or not os.path.exists(INDEX_PATH):
+        print("🔸 No manifest/index found. Running full build.")
+        return build(workers)
+
+    t_start = time.perf_counter()
+    files = sorted(f for f in os.listdir(SONGS_DIR) if f.endswith(".mp3"))
+    current = {f: file_hash(os.path.join(SONGS_DIR, f)) for f in files}
+    to_embed, to_remove = index_manifest.diff_catalog(manifest, current)
+    deleted = [n for n in to_remove if n not in current]
+    print(f"Found {len(files)} songs: {len(to_embed)} new/changed, {len(deleted)} deleted.")
+    if not to_embed and not to_remove:
+        print("✅ Index already up to date.")
+        return
+
+    try:
+        index = as_id_map(load_index(INDEX_PATH, rerank=False))
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    params = load_params(INDEX_PATH) or {}
+    if params.get("rerank"):
+        # Exact rows are indexed by ID, so new IDs can only be appended if nothing is missing
+        exact = load_exact_vectors(INDEX_PATH, index.d)
+        if exact is None or len(exact) != len(meta):
+            print("⚠️ Exact re-rank vectors out of sync with the index; disabling re-rank.")
+            params["rerank"] = False
+        del exact
+
+    # 1. Remove stale chunks in one batch
+    stale_ids = []
+    for name in to_remove:
+        stale_ids.extend(index_manifest.song_ids(manifest, name))
+        del manifest['songs'][name]
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype='int64'))
+        meta.remove(stale_ids)
+
+    # 2. Embed new/changed songs, appending fresh IDs
+    new_chroma = {}
+    new_beats = {}
+    new_emb = {}
+    paths = [os.path.join(SONGS_DIR, f) for f in to_embed]
+    for i, res in enumerate(iter_indexed_songs(paths, workers)):
+        print(f"Processing [{i + 1}/{len(paths)}] {res['name']}... "
+              f"{len(res['spans'])} chunks in {res['elapsed']:.1f}s")
+        first_id = len(meta)
+        if len(res['vectors']):
+            X = np.asarray(res['vectors'], dtype='float32')
+            if X.shape[1] != index.d:
+                print(f"❌ Vector dimension {X.shape[1]} does not match index ({index.d}). Run a full build.")
+                return
+            index.add_with_ids(X, np.arange(first_id, first_id + len(X), dtype='int64'))
+            if params.get("rerank"):
+                append_exact_vectors(X, INDEX_PATH)
+        meta.add_song(res['name'], res['spans'])
+        index_manifest.add_song(manifest, res['name'], res['hash'], first_id, len(res['spans']))
+        new_emb[res['name']] = (res['hash'], res['embedding'])
+        if res['chroma'] is not None:
+            new_chroma[res['name']] = (res['hash'], res['chroma'])
+        if res['beats'] is not None:
+            new_beats[res['name']] = (res['hash'], res['beats'])
+
+    # 3. Feature stores: carry unchanged songs over, add the new ones
+    rewrite_store(ChromaStoreWriter(), load_chroma_store(), files, new_chroma)
+    rewrite_store(BeatStoreWriter(), load_beat_store(), files, new_beats)
+    rewrite_store(EmbeddingStoreWriter(), load_embedding_store(), files, new_emb)
+
+    save_index(index, INDEX_PATH, params or None)
+    meta.save(META_PREFIX)
+    save_song_index(vectors_by_id(index, len(meta)), meta.song_ids)
+    index_manifest.save_manifest(manifest)
+
+    print(f"✅ Incremental update complete in {time.perf_counter() - t_start:.1f}s "
+          f"({index.ntotal} chunks live).")
+
+
 if __name__ == "__main__":
-    build()
\ No newline at end of file
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    n_workers = int(args[0]) if args else NUM_WORKERS
+    index_type = next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--index=")), INDEX_TYPE)
+    rerank = "--rerank" in sys.argv or RERANK
+    shards = int(next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--shards=")), NUM_SHARDS))
+    if "--from-store" in sys.argv:
+        rebuild_from_store(index_type, rerank, shards)
+    elif "--update" in sys.argv:
+        update(n_workers)
+    else:
+        build(n_workers, index_type, rerank, shards)
\ No newline at end of file
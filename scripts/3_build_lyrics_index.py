@@ -1,19 +1,20 @@
 import os
 import sys
 import numpy as np
-import faiss
 from tqdm import tqdm
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 
 from utils.lyrics_utils import embed_file
+from utils.faiss_utils import make_index, save_index
 
 LYRICS_DIR = os.path.join(ROOT_DIR, "data", "lyrics")
 INDEX_PATH = os.path.join(ROOT_DIR, "data", "lyrics_index.faiss")
 NAMES_PATH = os.path.join(ROOT_DIR, "data", "lyrics_track_names.txt")
+INDEX_TYPE = "flat"  # flat | ivf | hnsw
 
-def build_index():
+def build_index(index_type=INDEX_TYPE):
     if not os.path.exists(LYRICS_DIR):
         print(f"Missing lyrics folder: {LYRICS_DIR}"); return
 
@@ -36,14 +37,12 @@ def build_index():
     X = np.vstack(vectors).astype('float32')
     X = X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
 
-    index = faiss.IndexFlatIP(X.shape[1])
-    index.add(X)
-
-    faiss.write_index(index, INDEX_PATH)
+    index, params = make_index(X, index_type)
+    save_index(index, INDEX_PATH, params)
     with open(NAMES_PATH, "w", encoding="utf-8") as f:
         f.write("\n".join(names))
 
     print(f"✅ Lyrics Index Built ({len(names)} tracks).")
 
 if __name__ == "__main__":
-    build_index()
\ No newline at end of file
+    build_index(sys.argv[1] if len(sys.argv) > 1 else INDEX_TYPE)
\ No newline at end of file
@@ -1,26 +1,30 @@
 import os
 import sys
 import numpy as np
-import faiss
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.faiss_utils import load_index, vectors_by_id
+from utils.chunk_meta import load_chunk_meta, META_PREFIX, REMOVED
+
 INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked.faiss")
 STATS_PATH = os.path.join(ROOT_DIR, "data", "audio_stats.npz")
 
 
 def compute():
-    if not os.path.exists(INDEX_PATH):
+    meta = load_chunk_meta(META_PREFIX)
+    if not os.path.exists(INDEX_PATH) or meta is None:
         print("Index not found. Run Step 2 first.");
         return
 
     print("Loading Index...")
-    index = faiss.read_index(INDEX_PATH)
+    index = load_index(INDEX_PATH)
 
-    # 1. Reconstruct Vectors
-    try:
-        all_vecs = index.reconstruct_n(0, index.ntotal)
-    except:
-        print("Error: Index type does not support reconstruction.");
+    # 1. Reconstruct Vectors (by chunk ID, any index type; chunks removed by --update dropped)
+    all_vecs = vectors_by_id(index, len(meta))[np.asarray(meta.song_ids) != REMOVED]
+    if len(all_vecs) == 0:
+        print("Error: Index is empty.");
         return
 
     # 2. Calculate Global Mean Vector
@@ -1,29 +1,36 @@
 import os
 import sys
-import json
 import numpy as np
-import faiss
 import torch
-import librosa
 import difflib
-from scipy.spatial.distance import cdist
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 
 from utils.openl3_utils import extract_openl3_embedding
+from utils.audio_utils import DecodedAudio, file_hash
+from utils.chroma_store import compute_chroma, load_chroma_store
+from utils.banded_dtw import dtw_cost
 from utils.lyrics_utils import embed_text
-from utils.model_def import AudioAdapter
+from utils.model_def import AudioAdapter, adapt_vectors
+from utils.chunking import pool_chunks
+from utils.faiss_utils import load_index
+from utils.chunk_meta import load_chunk_meta
+from utils.voting import VoteTally
 
 # --- Config ---
 UPLOAD_DIR = os.path.join(ROOT_DIR, "data", "uploads")
 SONGS_DIR = os.path.join(ROOT_DIR, "data", "songs")
 AUDIO_INDEX = os.path.join(ROOT_DIR, "data", "audio_chunked.faiss")
-AUDIO_META = os.path.join(ROOT_DIR, "data", "audio_chunked_meta.json")
+AUDIO_META = os.path.join(ROOT_DIR, "data", "audio_chunked_meta")
 LYRICS_INDEX = os.path.join(ROOT_DIR, "data", "lyrics_index.faiss")
 LYRICS_NAMES = os.path.join(ROOT_DIR, "data", "lyrics_track_names.txt")
 MODEL_PATH = os.path.join(ROOT_DIR, "models", "audio_adapter.pth")
 
+# Query chunks match the index's 10 s windows; the hop sets the number of searches
+QUERY_CHUNK_SIZE = 10.0
+QUERY_HOP_SIZE = 5.0
+
 
 # --- Helper: Find File ---
 def find_local_file(name, folder):
@@ -43,14 +50,16 @@ def find_local_file(name, folder):
 
 
 # --- Helper: DTW ---
-def run_dtw(path1, path2):
+def run_dtw(audio1, audio2, chroma_store=None):
+    # audio2 is the catalog song; its chroma comes from the build-time store when fresh
     try:
-        y1, sr = librosa.load(path1, sr=22050, mono=True, duration=60)
-        y2, _ = librosa.load(path2, sr=22050, mono=True, duration=60)
-        c1 = librosa.feature.chroma_cqt(y=y1, sr=sr)
-        c2 = librosa.feature.chroma_cqt(y=y2, sr=sr)
-        D, wp = librosa.sequence.dtw(C=cdist(c1.T, c2.T, 'cosine'))
-        cost = D[-1, -1] / wp.shape[0]
+        c1 = compute_chroma(audio1, duration=60)
+        c2 = None
+        if chroma_store is not None and isinstance(audio2, str):
+            c2 = chroma_store.get(os.path.basename(audio2), duration=60, content_hash=file_hash(audio2))
+        if c2 is None:
+            c2 = compute_chroma(audio2, duration=60)
+        cost = dtw_cost(c1, c2)
         return 1.0 - cost  # Convert cost to similarity
     except:
         return 0.0
@@ -71,37 +80,27 @@ def check_plagiarism(audio_path, lyrics_text=None):
     # 2. AUDIO SEARCH (Chunking)
     if os.path.exists(AUDIO_INDEX):
         print("   -> Audio Scan...")
-        index = faiss.read_index(AUDIO_INDEX)
-        with open(AUDIO_META, 'r') as f:
-            meta = json.load(f)
+        index = load_index(AUDIO_INDEX)
+        meta = load_chunk_meta(AUDIO_META)
 
-        # Extract & Transform
-        raw_emb = extract_openl3_embedding(audio_path)
+        # Extract & Transform (decode once, reused by the DTW step below)
+        query_audio = DecodedAudio(audio_path)
+        raw_emb = extract_openl3_embedding(query_audio)
         if raw_emb.ndim == 1: raw_emb = raw_emb.reshape(1, -1)
 
-        # Chunking (Simulated)
-        # For simplicity in search, we query every 10th frame or average chunks
-        # Here we just use the raw frames as queries
-
-        Q = raw_emb
-        if model:
-            with torch.no_grad():
-                Q = model(torch.from_numpy(Q).float()).numpy()
-        else:
-            Q = Q / (np.linalg.norm(Q, axis=1, keepdims=True) + 1e-12)
+        # Chunking: same sliding-window pooling (and adapter) as the index build
+        pooled, _ = pool_chunks(raw_emb, QUERY_CHUNK_SIZE, QUERY_HOP_SIZE)
+        Q = adapt_vectors(pooled, model)
 
         # Search
         D, I = index.search(Q, k=1)
 
         # Vote
-        votes = {}
-        for dist, idx in zip(D.flatten(), I.flatten()):
-            if idx == -1 or dist < 0.65: continue
-            name = meta[idx]['name']
-            votes[name] = votes.get(name, 0) + 1
+        tally = VoteTally(meta.song_ids, len(meta.songs), 0.65).add(D, I)
 
         # Top Audio Candidate
-        sorted_votes = sorted(votes.items(), key=lambda x: x[1], reverse=True)[:3]
+        chroma_store = load_chroma_store()
+        sorted_votes = [(meta.songs[s], int(tally.hits[s])) for s in tally.top(3)]
         results['audio_matches'] = []
 
         for name, count in sorted_votes:
@@ -110,7 +109,7 @@ def check_plagiarism(audio_path, lyrics_text=None):
             dtw_score = 0.0
             if local_path:
                 print(f"      Verifying melody with: {name}")
-                dtw_score = run_dtw(audio_path, local_path)
+                dtw_score = run_dtw(query_audio, local_path, chroma_store)
 
             results['audio_matches'].append({
                 "song": name,
@@ -121,7 +120,7 @@ def check_plagiarism(audio_path, lyrics_text=None):
     # 3. LYRICS SEARCH
     if lyrics_text and os.path.exists(LYRICS_INDEX):
         print("   -> Lyrics Scan...")
-        l_index = faiss.read_index(LYRICS_INDEX)
+        l_index = load_index(LYRICS_INDEX)
         with open(LYRICS_NAMES, 'r') as f:
             l_names = [x.strip() for x in f]
 
@@ -1,12 +1,13 @@
 import os
 import sys
-import json
+import math
+import time
 import numpy as np
-import faiss
 import torch
-import librosa
 import difflib
-from scipy.spatial.distance import cdist
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 
 # --- SETUP PATHS ---
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -14,25 +15,104 @@ ROOT_DIR = os.path.dirname(CURRENT_DIR)
 sys.path.append(ROOT_DIR)
 
 try:
-    from utils.openl3_utils import extract_openl3_embedding
-    from utils.model_def import AudioAdapter
+    from utils.openl3_utils import extract_openl3_embedding, stream_openl3_embedding, warm_up_openl3
+    from utils.audio_utils import DecodedAudio, file_hash, audio_duration
+    from utils.chroma_store import (compute_chroma, compute_beats, sync_chroma, load_chroma_store,
+                                    transpose_chroma, transposition_candidates, transposed_similarity,
+                                    rescale_similarity, SUBSEQ_SIM_FLOOR, CHROMA_SR, CHROMA_HOP)
+    from utils.beat_store import load_beat_store
+    from utils.banded_dtw import dtw_cost, subsequence_dtw
+    from utils.model_def import AudioAdapter, adapt_vectors
+    from utils.chunking import stream_pool_chunks, whole_seconds
+    from utils.faiss_utils import load_index, rss_mb
+    from utils.chunk_meta import load_chunk_meta, META_PREFIX
+    from utils.voting import VoteTally
+    from utils.alignment import OffsetTally
+    from utils.frame_index import load_frame_index, find_sample_runs
+    from utils.embedding_store import load_embedding_store
+    # Two-stage search: song-centroid shortlist, then chunks of SHORTLIST_SONGS songs only
+    from utils.song_index import load_song_shortlist, SHORTLIST_SONGS
+    from utils.sharded_index import ShardedIndex, load_shards_manifest
+    from utils.worker_pool import map_embedding_workers
 except ImportError:
     print("❌ Audio Engine: Could not import utils. Check sys.path.")
 
 # --- CONFIG ---
 SONGS_DIR = os.path.join(ROOT_DIR, "data", "songs")
 AUDIO_INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked.faiss")
-AUDIO_META_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked_meta.json")
 MODEL_PATH = os.path.join(ROOT_DIR, "models", "audio_adapter.pth")
+DTW_DURATION = 60
+
+# "subsequence": align a query window anywhere inside the full catalog chroma
+#   (scores rescaled onto the global scale, chroma_store.SUBSEQ_SIM_FLOOR)
+# "global": first DTW_DURATION s of both songs, end to end
+DTW_MODE = "subsequence"
+SUBSEQ_QUERY_SECONDS = 20  # Query window: the offset-aligned range, else the start
+SUBSEQ_CHROMA_MARGIN = 2   # Extra query seconds chroma is computed for on each side (CQT edges)
+
+# DTW feature rate: "frames" (chroma hop, ~43/s), "beats" (median chroma per beat,
+# catalog beats from the beat store) or "pooled" (median per CHROMA_POOL frames)
+DTW_FEATURES = "pooled"  # Best verification margin in eval_beat_chroma.py
+CHROMA_POOL = 16   # ~2.7 steps/s; also used for songs with fewer than MIN_BEATS beats
+MIN_BEATS = 8
+
+# Transposition-invariant DTW: DTW runs for this many best key offsets from the
+# chroma-profile estimate, untransposed included (1 = one DTW at the best key, 0 = off).
+# Scores at a non-zero offset are recalibrated (chroma_store.TRANSPOSE_SIM_FLOOR)
+TRANSPOSE_CANDIDATES = 1
+
+# DTW verification of the shortlisted songs runs on a persistent thread pool;
+# songs not verified within VERIFY_TIMEOUT seconds of the DTW fan-out score 0
+VERIFY_WORKERS = 5
+VERIFY_TIMEOUT = 20.0
+# Pools given up on after a timeout whose hung jobs may still hold threads; past
+# this many the timed-out pool is kept (logged) instead of starting another one
+MAX_RETIRED_POOLS = 2
+
+# Query chunks use the index's 10 s window; the hop controls how many searches run
+QUERY_CHUNK_SIZE = 10.0
+QUERY_HOP_SIZE = 5.0
+
+# Uploads longer than this are embedded block by block (bounded memory)
+STREAM_MIN_SECONDS = 600
+
+MATCH_THRESHOLD = 0.65  # Min chunk similarity that counts as a vote
+
+# Check each candidate's votes for a consistent query/catalog time offset first;
+# chroma DTW then only runs for candidates the offset histogram leaves ambiguous
+OFFSET_VERIFY = True
+
+# Map the index file read-only instead of copying it; all app workers share one copy
+INDEX_MMAP = True
+
+# scan_audio_batch: embedding worker processes and query chunks per index.search call
+# (a re-ranked index bounds its exact-vector gather itself, see RERANK_GATHER_MB)
+BATCH_WORKERS = 4
+BATCH_SEARCH_ROWS = 8192
+
+# Progressive scan: embed/search in segments and stop once the tally is settled
+PROGRESSIVE_SEGMENT_SECONDS = 10.0
+PROGRESSIVE_MAX_SECONDS = 120      # Ceiling on processed audio
+PROGRESSIVE_MIN_CHUNKS = 6         # Never decide on less than ~35 s
+PROGRESSIVE_ALPHA = 0.01           # Significance level for both stopping rules
+PROGRESSIVE_MIN_HIT_RATE = 0.3     # Chunk hit rate a genuine match is assumed to reach
 
 # --- GLOBALS ---
 LOADED_INDEX = None
 LOADED_META = None
 LOADED_MODEL = None
+LOADED_CHROMA = None
+LOADED_BEATS = None
+VERIFY_POOL = None
+VERIFY_POOL_LOCK = threading.Lock()
+RETIRED_JOBS = []  # Per retired pool: its jobs that were still running at the timeout
+LOADED_SHORTLIST = None
+LOADED_FRAMES = None  # (index, meta, OpenL3 store) of the optional per-second index, loaded on first scan_samples
 
 
 def init_audio_resources():
-    global LOADED_INDEX, LOADED_META, LOADED_MODEL
+    global LOADED_INDEX, LOADED_META, LOADED_MODEL, LOADED_CHROMA, LOADED_BEATS, LOADED_SHORTLIST
+    t_start = time.perf_counter()
     if os.path.exists(MODEL_PATH):
         try:
             LOADED_MODEL = AudioAdapter()
@@ -42,15 +122,39 @@ def init_audio_resources():
         except Exception as e:
             print(f"⚠️ [Audio Engine] Model Error: {e}")
 
-    if os.path.exists(AUDIO_INDEX_PATH):
+    sharded = load_shards_manifest()
+    if sharded is not None or os.path.exists(AUDIO_INDEX_PATH):
         try:
-            LOADED_INDEX = faiss.read_index(AUDIO_INDEX_PATH)
-            with open(AUDIO_META_PATH, 'r') as f:
-                LOADED_META = json.load(f)
+            if sharded is not None:
+                # Scatter-gather over one worker process per shard; same search() as a FAISS index
+                LOADED_INDEX = ShardedIndex(mmap=INDEX_MMAP)
+                print(f"✅ [Audio Engine] {len(LOADED_INDEX.workers)} Index Shards Started")
+            else:
+                LOADED_INDEX = load_index(AUDIO_INDEX_PATH, mmap=INDEX_MMAP)
+            # Song table + memory-mapped int32 columns (legacy JSON is converted in memory)
+            LOADED_META = load_chunk_meta(META_PREFIX, mmap=INDEX_MMAP)
+            LOADED_SHORTLIST = load_song_shortlist(LOADED_META)
             print("✅ [Audio Engine] Index Loaded")
+            if LOADED_SHORTLIST is not None:
+                print(f"✅ [Audio Engine] Song Shortlist Loaded ({LOADED_SHORTLIST.index.ntotal} song vectors, "
+                      f"top {SHORTLIST_SONGS} songs per search)")
         except Exception as e:
             print(f"⚠️ [Audio Engine] Index Error: {e}")
 
+    # Build the OpenL3 model once per process and run one dummy inference
+    if warm_up_openl3():
+        print("✅ [Audio Engine] OpenL3 Model Warmed Up")
+
+    LOADED_CHROMA = load_chroma_store()
+    if LOADED_CHROMA is not None:
+        print(f"✅ [Audio Engine] Chroma Store Loaded ({len(LOADED_CHROMA.songs)} songs)")
+    LOADED_BEATS = load_beat_store()
+    if LOADED_BEATS is not None:
+        print(f"✅ [Audio Engine] Beat Store Loaded ({len(LOADED_BEATS.songs)} songs)")
+
+    print(f"⏱️ [Audio Engine] Ready in {time.perf_counter() - t_start:.1f}s "
+          f"(pid {os.getpid()}, RSS {rss_mb():.0f} MB, index {'mmap' if INDEX_MMAP else 'in memory'})")
+
 
 def find_local_file(name, folder):
     p = os.path.join(folder, name)
@@ -63,66 +167,486 @@ def find_local_file(name, folder):
     return None
 
 
-def run_dtw(path1, path2):
+def dtw_score(c1, c2):
+    # Banded DTW on cosine cost computed in the band (no full cost matrix)
+    cost = dtw_cost(c1, c2)
+
+    # SQUARED SCORE REDUCTION (Punish weak matches)
+    sim = 1.0 - cost
+    return (sim ** 2) * 100
+
+
+def offset_score(alignment):
+    # Same squared reduction as dtw_score, applied to the mean cosine similarity
+    # along the aligned diagonal (DTW: mean cosine similarity along its path)
+    sim = min(alignment.mean_sim, 1.0)
+    return (sim ** 2) * 100
+
+
+def transposed_score(score, semitones):
+    # dtw_score-scale score found at a key offset, recalibrated for DTW_MODE
+    sim = transposed_similarity(math.sqrt(score / 100), semitones, DTW_MODE)
+    return (sim ** 2) * 100
+
+
+def run_dtw(audio1, audio2):
+    # Both arguments may be paths or DecodedAudio (the upload is decoded once per scan)
     try:
-        y1, sr = librosa.load(path1, sr=22050, mono=True, duration=60)
-        y2, _ = librosa.load(path2, sr=22050, mono=True, duration=60)
-        c1 = librosa.feature.chroma_cqt(y=y1, sr=sr)
-        c2 = librosa.feature.chroma_cqt(y=y2, sr=sr)
-        D, wp = librosa.sequence.dtw(C=cdist(c1.T, c2.T, 'cosine'))
-        cost = D[-1, -1] / wp.shape[0]
-
-        # SQUARED SCORE REDUCTION (Punish weak matches)
-        sim = 1.0 - cost
-        return (sim ** 2) * 100
+        c1 = compute_chroma(audio1, duration=DTW_DURATION)
+        c2 = compute_chroma(audio2, duration=DTW_DURATION)
+        return dtw_score(c1, c2)
     except:
         return 0.0
 
 
-def scan_audio(audio_path):
+def dtw_features(chroma, beats=None):
+    """
+    Chroma at the DTW_FEATURES rate. Returns (features, bounds) where bounds[i],
+    bounds[i + 1] are the seconds column i covers.
+    """
+    if DTW_FEATURES == "beats" and beats is not None and len(beats) >= MIN_BEATS:
+        return sync_chroma(chroma, beats)
+    if DTW_FEATURES in ("beats", "pooled"):
+        return sync_chroma(chroma, np.arange(0, chroma.shape[1], CHROMA_POOL))
+    return chroma, np.arange(chroma.shape[1] + 1) * CHROMA_HOP / CHROMA_SR
+
+
+def query_features(query_audio, duration=None, offset=0.0):
+    chroma = compute_chroma(query_audio, duration=duration, offset=offset)
+    beats = compute_beats(query_audio, duration=duration, offset=offset) if DTW_FEATURES == "beats" else None
+    features, bounds = dtw_features(chroma, beats)
+    return features, bounds + offset  # Bounds in upload seconds
+
+
+def subsequence_score(query_feats, ref_feats, window):
+    """
+    Subsequence DTW of the query seconds window[0]..window[1] inside the whole
+    catalog song; both are (features, bounds) from dtw_features. The similarity
+    is rescaled from SUBSEQ_SIM_FLOOR, on the global dtw_score scale.
+    Returns (score, (start, end) seconds of the matched catalog span).
+    """
+    q, q_bounds = query_feats
+    ref, ref_bounds = ref_feats
+    cols = np.flatnonzero((q_bounds[:-1] >= window[0]) & (q_bounds[:-1] < window[1]))
+    if len(cols) == 0:
+        # Window beyond the decoded part of the upload (streamed long files)
+        cols = np.flatnonzero(q_bounds[:-1] < SUBSEQ_QUERY_SECONDS)
+    cost, start, end = subsequence_dtw(q[:, cols[0]:cols[-1] + 1], ref)
+    sim = rescale_similarity(1.0 - cost, SUBSEQ_SIM_FLOOR)
+    return (sim ** 2) * 100, (round(float(ref_bounds[start]), 1), round(float(ref_bounds[end]), 1))
+
+
+def query_window(alignment):
+    """Query seconds to verify: start of the offset-aligned range (if any), SUBSEQ_QUERY_SECONDS long."""
+    start = alignment.query_range[0] if alignment is not None else 0
+    return start, start + SUBSEQ_QUERY_SECONDS
+
+
+def query_span(windows, decoded=None):
+    """
+    (offset, duration) of the upload the query chroma must cover for these
+    subsequence windows, SUBSEQ_CHROMA_MARGIN wider on each side. The offset is
+    a whole number of CHROMA_POOL frames, so pooled columns fall on the same grid
+    as the catalog's. A window starting past the `decoded` seconds (streamed
+    uploads) falls back to the start, as in subsequence_score.
+    """
+    if decoded is not None:
+        windows = [w if w[0] < decoded else (0, SUBSEQ_QUERY_SECONDS) for w in windows]
+    pool_frames = (max(0, min(w[0] for w in windows) - SUBSEQ_CHROMA_MARGIN) * CHROMA_SR // CHROMA_HOP) // CHROMA_POOL
+    start = pool_frames * CHROMA_POOL * CHROMA_HOP / CHROMA_SR
+    end = max(w[1] for w in windows) + SUBSEQ_CHROMA_MARGIN
+    if decoded is not None:
+        end = min(end, decoded)
+    return start, end - start
+
+
+def get_catalog_features(local_path, duration=DTW_DURATION):
+    """
+    DTW features (dtw_features) of a catalog song. Chroma and beats are read from
+    the build-time stores when fresh; misses share one decode.
+    Returns (features, decodes) where decodes is 1 only on a store miss.
+    """
+    name, content_hash = os.path.basename(local_path), file_hash(local_path)
+    chroma = beats = None
+    if LOADED_CHROMA is not None:
+        chroma = LOADED_CHROMA.get(name, duration=duration, content_hash=content_hash)
+    if DTW_FEATURES == "beats" and LOADED_BEATS is not None:
+        beats = LOADED_BEATS.get(name, content_hash=content_hash)
+
+    ref_audio = DecodedAudio(local_path, duration=duration)  # Decodes only if used
+    if chroma is None:
+        chroma = compute_chroma(ref_audio, duration=duration)
+    if DTW_FEATURES == "beats" and beats is None:
+        beats = compute_beats(ref_audio, duration=duration)
+    return dtw_features(chroma, beats), ref_audio.decode_count
+
+
+def new_tally():
+    """Running vote tally: one vote per query-chunk hit that passes MATCH_THRESHOLD."""
+    return VoteTally(LOADED_META.song_ids, len(LOADED_META.songs), MATCH_THRESHOLD)
+
+
+def new_offset_tally():
+    """Per-vote query/catalog times for offset-consistency verification, or None if disabled."""
+    if not OFFSET_VERIFY: return None
+    return OffsetTally(LOADED_META, MATCH_THRESHOLD, QUERY_CHUNK_SIZE)
+
+
+def scan_settled(tally, n_chunks):
+    """
+    Returns the reason the running tally is settled, or None to keep scanning.
+    - Leader: one-sided sign test of leader vs runner-up votes, p < PROGRESSIVE_ALPHA.
+    - Nothing: no votes at all, where a real match hitting PROGRESSIVE_MIN_HIT_RATE
+      of chunks would have produced a vote with probability 1 - alpha.
+    """
+    if n_chunks < PROGRESSIVE_MIN_CHUNKS: return None
+
+    if tally.n_votes == 0:
+        if (1.0 - PROGRESSIVE_MIN_HIT_RATE) ** n_chunks < PROGRESSIVE_ALPHA:
+            return "no candidate above threshold"
+        return None
+
+    counts = tally.hits[tally.top(2)]
+    lead = int(counts[0])
+    runner_up = int(counts[1]) if len(counts) > 1 else 0
+    n = lead + runner_up
+    p_value = sum(math.comb(n, k) for k in range(lead, n + 1)) / 2 ** n
+    if p_value < PROGRESSIVE_ALPHA:
+        return f"leader {lead} vs {runner_up} votes (p={p_value:.3g})"
+    return None
+
+
+def scan_audio(audio_path, hop_size=QUERY_HOP_SIZE, progressive=False, max_seconds=PROGRESSIVE_MAX_SECONDS):
+    """
+    progressive=True embeds and searches the upload segment by segment and stops
+    as soon as scan_settled() says more audio cannot change the verdict, or after
+    max_seconds of audio.
+    """
+    hop_size = whole_seconds(hop_size)  # Reject a bad hop before any embedding work
     if LOADED_INDEX is None: init_audio_resources()
     if LOADED_INDEX is None: return []
 
     print(f"\n🔍 [Audio Engine] Analyzing: {os.path.basename(audio_path)}")
 
-    raw_emb = extract_openl3_embedding(audio_path)
-    if raw_emb is None: return []
-    if raw_emb.ndim == 1: raw_emb = raw_emb.reshape(1, -1)
-
-    Q = raw_emb
-    if LOADED_MODEL:
-        with torch.no_grad():
-            Q = LOADED_MODEL(torch.from_numpy(Q).float()).numpy()
+    duration = audio_duration(audio_path)
+    if progressive:
+        query_audio = DecodedAudio(audio_path, duration=DTW_DURATION)
+        frame_blocks = stream_openl3_embedding(audio_path, block_seconds=PROGRESSIVE_SEGMENT_SECONDS)
+        decodes = 1  # The streaming pass (stops early with the scan)
+    elif duration is not None and duration > STREAM_MIN_SECONDS:
+        # Long mix/podcast: stream OpenL3 block by block, DTW only needs the start
+        print(f"   [Audio Engine] Streaming {duration:.0f} s upload")
+        query_audio = DecodedAudio(audio_path, duration=DTW_DURATION)
+        frame_blocks = stream_openl3_embedding(audio_path)
+        decodes = 1  # The streaming pass
     else:
-        Q = Q / (np.linalg.norm(Q, axis=1, keepdims=True) + 1e-12)
+        # Decode the upload once; OpenL3 and every DTW below reuse this PCM
+        query_audio = DecodedAudio(audio_path)
+        frame_blocks = [extract_openl3_embedding(query_audio)]
+        decodes = 0
+
+    # Pool 1 s frames into the same sliding windows (and adapter) as the index build,
+    # so query and index vectors are directly comparable. Each pooled batch is
+    # searched as it arrives and folded into a running vote tally.
+    tally = new_tally()
+    offsets = new_offset_tally()
+    n_chunks = 0
+    shortlist_sizes = []
+    for pooled, spans in stream_pool_chunks(frame_blocks, QUERY_CHUNK_SIZE, hop_size):
+        Q = adapt_vectors(pooled, LOADED_MODEL)
+        if LOADED_SHORTLIST is not None and SHORTLIST_SONGS:
+            D, I, songs, n_searched = LOADED_SHORTLIST.search(LOADED_INDEX, Q, 1, SHORTLIST_SONGS)
+            shortlist_sizes.append((len(songs), n_searched))
+        else:
+            D, I = LOADED_INDEX.search(Q, k=1)
+        tally.add(D, I)
+        if offsets is not None:
+            offsets.add(D, I, [s for s, _ in spans])
+        n_chunks += len(D)
+
+        if progressive:
+            processed = spans[-1][1]
+            reason = scan_settled(tally, n_chunks)
+            if reason or processed >= max_seconds:
+                print(f"   [Audio Engine] Early stop after {processed} s: {reason or 'duration ceiling'}")
+                break
+    if n_chunks == 0: return []
+    print(f"   [Audio Engine] {n_chunks} query chunks searched")
+    if shortlist_sizes:
+        songs, searched = max(shortlist_sizes, key=lambda x: x[1])
+        print(f"   [Audio Engine] Shortlist: {songs} of {len(LOADED_META.songs)} songs, "
+              f"{searched} of {LOADED_INDEX.ntotal} chunks per batch")
+
+    final_results, ref_decodes = verify_candidates(query_audio, tally, offsets)
+    decodes += ref_decodes + query_audio.decode_count
+    query_audio.release()
+    print(f"   [Audio Engine] Decodes this scan: {decodes}")
+    return final_results
+
 
-    D, I = LOADED_INDEX.search(Q, k=1)
+def get_verify_pool():
+    """Persistent thread pool for DTW verification (the numba DTW kernels release the GIL)."""
+    global VERIFY_POOL
+    with VERIFY_POOL_LOCK:
+        if VERIFY_POOL is None:
+            VERIFY_POOL = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix="verify")
+        return VERIFY_POOL
 
-    votes = {}
-    for dist, idx in zip(D.flatten(), I.flatten()):
-        if idx == -1 or dist < 0.65: continue
-        name = LOADED_META[idx]['name']
-        votes[name] = votes.get(name, 0) + 1
 
+def retire_verify_pool(pool, running):
+    """
+    Stops handing out `pool` after a request timed out with the `running` jobs
+    still on it, so the next request gets a fresh pool instead of queueing
+    behind them; the old threads exit once those (cancelled) jobs return. At
+    most MAX_RETIRED_POOLS can be waiting on hung jobs, after that `pool` stays.
+    """
+    global VERIFY_POOL
+    with VERIFY_POOL_LOCK:
+        RETIRED_JOBS[:] = [jobs for jobs in RETIRED_JOBS if not all(f.done() for f in jobs)]
+        if VERIFY_POOL is not pool:
+            return
+        if len(RETIRED_JOBS) >= MAX_RETIRED_POOLS:
+            print(f"   ⚠️ [Audio Engine] {len(RETIRED_JOBS)} verify pools still hung, reusing the current one")
+            return
+        RETIRED_JOBS.append(running)
+        VERIFY_POOL = None
+
+
+def verify_melody(local_path, query_feats, alignment, cancelled):
+    """
+    DTW melody check of one catalog song against the query features (shared by
+    reference between the verification threads, never copied). The query is
+    transposed to the likeliest key offsets (transposition_candidates), so a
+    transposed copy still matches. Returns (score, dtw_span or None, semitones,
+    catalog decodes) for the best offset, the score recalibrated by
+    transposed_score when that offset is not 0, or None once the `cancelled` event of
+    a timed-out request is set (checked between the decode and each DTW).
+    """
+    if cancelled.is_set(): return None
+    duration = None if DTW_MODE == "subsequence" else DTW_DURATION
+    ref_feats, ref_decodes = get_catalog_features(local_path, duration=duration)
+    q, q_bounds = query_feats
+    shifts = transposition_candidates(q, ref_feats[0], TRANSPOSE_CANDIDATES) if TRANSPOSE_CANDIDATES else [0]
+
+    best = None
+    for semitones in shifts:
+        if cancelled.is_set(): return None
+        shifted = transpose_chroma(q, semitones)
+        if DTW_MODE == "subsequence":
+            # Full catalog song, so a passage from any point in it can match
+            window = query_window(alignment)
+            score, span = subsequence_score((shifted, q_bounds), ref_feats, window)
+            dtw_span = {"query": list(window), "catalog": list(span)}
+        else:
+            score, dtw_span = dtw_score(shifted, ref_feats[0]), None
+        if best is None or score > best[0]:
+            best = (score, dtw_span, semitones)
+    best = (transposed_score(best[0], best[2]),) + best[1:]
+    return best + (ref_decodes,)
+
+
+def verify_candidates(query_audio, tally, offsets=None):
+    """
+    Verifies the top voted songs against the query. With an OffsetTally, a song
+    whose votes line up on one time offset is accepted, one with only scattered
+    votes is rejected (unless the query is too short to line up, see
+    Alignment.verdict), and the DTW melody check (DTW_MODE) runs for the rest,
+    in parallel on the verify pool for VERIFY_TIMEOUT seconds from the fan-out.
+    Jobs still running then are cancelled and the pool is retired
+    (retire_verify_pool). Accepted songs
+    are scored by offset_score, on the dtw_score scale, with the raw mean chunk
+    similarity in "offset_similarity". Returns (results, catalog decodes); the
+    query is decoded at most once, and not at all if no DTW is needed.
+    """
     # --- CHANGED TO TOP 5 HERE ---
-    sorted_votes = sorted(votes.items(), key=lambda x: x[1], reverse=True)[:5]
+    top = tally.top(5)
+    sorted_votes = [(LOADED_META.songs[s], int(tally.hits[s])) for s in top]
+    alignments = offsets.best_diagonals(top) if offsets is not None else {}
+
+    # 1. Offset verdicts; the remaining candidates need DTW
+    checked = []  # (name, alignment, score, method, dtw_span, semitones)
+    to_dtw = []   # (name, alignment, local_path)
+    for sid, (name, count) in zip(top.tolist(), sorted_votes):
+        alignment = alignments.get(sid)
+        verdict = alignment.verdict() if alignment is not None else "ambiguous"
+        if offsets is not None and verdict == "reject":
+            print(f"      Rejected (no consistent offset): {name}")
+        elif verdict == "match":
+            print(f"      Aligned at {alignment.offset:+d} s ({alignment.chunks}/{count} votes): {name}")
+            checked.append((name, alignment, offset_score(alignment), "offset", None, None))
+        else:
+            local_path = find_local_file(name, SONGS_DIR)
+            if local_path:
+                print(f"      Verifying melody with: {name}")
+                to_dtw.append((name, alignment, local_path))
+            else:
+                checked.append((name, alignment, 0.0, "dtw", None, None))
+
+    # 2. DTW fan-out: query features once, catalog features from the stores
+    decodes = 0
+    if to_dtw:
+        try:
+            if DTW_MODE == "subsequence":
+                # Chroma only around the windows the candidates align, not the whole upload
+                offset, duration = query_span([query_window(a) for _, a, _ in to_dtw], query_audio.duration)
+                query_feats = query_features(query_audio, duration=duration, offset=offset)
+            else:
+                query_feats = query_features(query_audio, duration=DTW_DURATION)
+        except Exception as e:
+            print(f"   [Audio Engine] Query chroma failed: {e}")
+            query_feats = None
 
+        futures = {}
+        if query_feats is not None:
+            # The budget starts here, so slow embedding or query chroma cannot use it up
+            pool = get_verify_pool()
+            cancelled = threading.Event()
+            futures = {name: pool.submit(verify_melody, local_path, query_feats, alignment, cancelled)
+                       for name, alignment, local_path in to_dtw}
+            _, pending = wait(futures.values(), timeout=VERIFY_TIMEOUT)
+            if pending:
+                # Queued jobs never start; running ones stop at their next check
+                cancelled.set()
+                running = [fut for fut in pending if not fut.cancel()]
+                if running:
+                    retire_verify_pool(pool, running)
+                for name, fut in futures.items():
+                    if fut in pending:
+                        print(f"      ⚠️ Verification timed out: {name}")
+
+        for name, alignment, _ in to_dtw:
+            fut = futures.get(name)
+            score, dtw_span, semitones = 0.0, None, None
+            if fut is not None and fut.done() and not fut.cancelled():
+                try:
+                    res = fut.result()
+                    if res is not None:
+                        score, dtw_span, semitones, ref_decodes = res
+                        decodes += ref_decodes
+                except Exception:
+                    score = 0.0
+            checked.append((name, alignment, score, "dtw", dtw_span, semitones))
+
+    # Vote order first, so equal scores keep the order the sequential loop gave them
+    rank = {name: i for i, (name, _) in enumerate(sorted_votes)}
     final_results = []
-    for name, count in sorted_votes:
-        local_path = find_local_file(name, SONGS_DIR)
-        dtw_score = 0.0
-        if local_path:
-            print(f"      Verifying melody with: {name}")
-            dtw_score = run_dtw(audio_path, local_path)
-
-        if dtw_score > 10.0:
-            final_results.append({
+    for name, alignment, score, method, dtw_span, semitones in sorted(checked, key=lambda c: rank[c[0]]):
+        if score > 10.0:
+            result = {
                 "song": name,
-                "score": round(dtw_score, 2)
-            })
-        # Sort by score (highest first)
-        final_results.sort(key=lambda x: x['score'], reverse=True)
-
-        # Slice the list to keep only the top 5
-        final_results = final_results[:5]
-    return final_results
\ No newline at end of file
+                "score": round(score, 2),
+                "method": method
+            }
+            if alignment is not None:
+                result["alignment"] = alignment.to_dict()
+            if method == "offset":
+                result["offset_similarity"] = round(min(alignment.mean_sim, 1.0) * 100, 2)
+            if dtw_span is not None:
+                result["dtw_span"] = dtw_span
+            if semitones is not None:
+                result["transpose"] = semitones  # Semitones the upload is above the catalog song
+            final_results.append(result)
+
+    # Sort by score (highest first), keep only the top 5
+    final_results.sort(key=lambda x: x['score'], reverse=True)
+    return final_results[:5], decodes
+
+
+def scan_samples(audio_path):
+    """
+    Short-segment (sample / hook) detection on the optional per-second index:
+    runs of consecutive upload seconds matching consecutive seconds of one
+    catalog song. Returns find_sample_runs dicts, or [] if the index is not built.
+    """
+    global LOADED_FRAMES
+    if LOADED_FRAMES is None:
+        frame_index = load_frame_index(mmap=INDEX_MMAP)
+        # The raw OpenL3 store re-scores the PQ hits exactly
+        LOADED_FRAMES = frame_index + (load_embedding_store(),) if frame_index else ()
+        if LOADED_FRAMES:
+            print(f"✅ [Audio Engine] Frame Index Loaded ({LOADED_FRAMES[0].ntotal} seconds"
+                  f"{'' if LOADED_FRAMES[2] is not None else ', no OpenL3 store: PQ scores'})")
+    if not LOADED_FRAMES:
+        print("⚠️ [Audio Engine] No frame index. Run build_frame_index.py first.")
+        return []
+
+    print(f"\n🔍 [Audio Engine] Sample scan: {os.path.basename(audio_path)}")
+    try:
+        frames = extract_openl3_embedding(audio_path)
+    except Exception as e:
+        print(f"   [Audio Engine] Embedding failed: {e}")
+        return []
+    if frames.ndim == 1: frames = frames.reshape(1, -1)
+    index, meta, store = LOADED_FRAMES
+    runs = find_sample_runs(index, meta, frames, store)
+    print(f"   [Audio Engine] {len(frames)} seconds searched, {len(runs)} matching runs")
+    return runs
+
+
+def pool_upload(audio_path, hop_size=QUERY_HOP_SIZE):
+    """Pooled raw OpenL3 query chunks (N x 512, adapter not applied) for one upload."""
+    hop_size = whole_seconds(hop_size)  # Outside the try: a bad hop is an error, not a failed file
+    try:
+        duration = audio_duration(audio_path)
+        if duration is not None and duration > STREAM_MIN_SECONDS:
+            frame_blocks = stream_openl3_embedding(audio_path)
+        else:
+            frame_blocks = [extract_openl3_embedding(audio_path)]
+        pooled = [p for p, _ in stream_pool_chunks(frame_blocks, QUERY_CHUNK_SIZE, hop_size)]
+    except Exception as e:
+        print(f"   [Audio Engine] Embedding failed for {os.path.basename(audio_path)}: {e}")
+        pooled = []
+    return np.vstack(pooled) if pooled else np.empty((0, 512), dtype='float32')
+
+
+def iter_pooled_uploads(audio_paths, hop_size, workers):
+    """Yields pool_upload results in input order, serially or from a process pool."""
+    yield from map_embedding_workers(partial(pool_upload, hop_size=hop_size), audio_paths, workers)
+
+
+def scan_audio_batch(audio_paths, hop_size=QUERY_HOP_SIZE, workers=BATCH_WORKERS):
+    """
+    Scans many uploads at once (e.g. the nightly job). Embeddings are extracted
+    in parallel worker processes; the query chunks of all uploads are stacked,
+    adapted and searched in BATCH_SEARCH_ROWS-sized index.search calls (full
+    search, no per-upload song shortlist). Votes and DTW verification are then
+    split back out per upload. Returns one scan_audio-style result list per path.
+    """
+    hop_size = whole_seconds(hop_size)  # Chunk windows are whole seconds (pool_chunks)
+    if LOADED_INDEX is None: init_audio_resources()
+    if LOADED_INDEX is None: return [[] for _ in audio_paths]
+
+    print(f"\n🔍 [Audio Engine] Batch scan of {len(audio_paths)} uploads ({workers} workers)")
+    t_start = time.perf_counter()
+    pooled = list(iter_pooled_uploads(audio_paths, hop_size, workers))
+    bounds = np.r_[0, np.cumsum([len(p) for p in pooled])]  # Upload i's rows: bounds[i]..bounds[i + 1]
+    t_embed = time.perf_counter() - t_start
+    if bounds[-1] == 0: return [[] for _ in audio_paths]
+
+    # One adapter pass and a few large searches for every query chunk of the batch
+    t0 = time.perf_counter()
+    Q = adapt_vectors(np.vstack(pooled), LOADED_MODEL)
+    D = np.empty((len(Q), 1), dtype='float32')
+    I = np.empty((len(Q), 1), dtype='int64')
+    for a in range(0, len(Q), BATCH_SEARCH_ROWS):
+        D[a:a + BATCH_SEARCH_ROWS], I[a:a + BATCH_SEARCH_ROWS] = LOADED_INDEX.search(Q[a:a + BATCH_SEARCH_ROWS], 1)
+    t_search = time.perf_counter() - t0
+    print(f"   [Audio Engine] {len(Q)} query chunks: embedding {t_embed:.1f}s, "
+          f"adapter + search {t_search:.2f}s")
+
+    results = []
+    for path, a, b in zip(audio_paths, bounds[:-1], bounds[1:]):
+        if a == b:
+            results.append([])
+            continue
+        tally = new_tally().add(D[a:b], I[a:b])
+        offset_tally = new_offset_tally()
+        if offset_tally is not None:
+            # pool_upload windows start every hop seconds
+            offset_tally.add(D[a:b], I[a:b], np.arange(b - a) * hop_size)
+        # DTW needs only the first DTW_DURATION seconds of the upload
+        query_audio = DecodedAudio(path, duration=DTW_DURATION)
+        final_results, _ = verify_candidates(query_audio, tally, offset_tally)
+        query_audio.release()
+        results.append(final_results)
+    return results
\ No newline at end of file
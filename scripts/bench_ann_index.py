@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import numpy as np
+import faiss
+
+# --- PATH SETUP ---
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.faiss_utils import make_index, vectors_by_id, load_index, RerankedIndex, INDEX_TYPES
+from utils.chunking import normalize_rows
+from utils.chunk_meta import load_chunk_meta, REMOVED
+
+INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked.faiss")
+
+# Usage: python bench_ann_index.py [n_synthetic]
+#   no argument -> benchmark on the vectors of the built chunk index
+#   n_synthetic -> benchmark on N clustered random 512-d vectors (catalog-scale test)
+N_QUERIES = 1000
+K = 10
+
+
+def synthetic_vectors(n, d=512, n_songs=None, seed=0):
+    """Song-like data: each 'song' is a centre with its chunks scattered around it."""
+    rng = np.random.default_rng(seed)
+    n_songs = n_songs or max(1, n // 40)
+    centres = rng.standard_normal((n_songs, d)).astype('float32')
+    X = centres[rng.integers(0, n_songs, n)] + 0.5 * rng.standard_normal((n, d)).astype('float32')
+    return normalize_rows(X)
+
+
+def load_catalog_vectors():
+    # Chunk IDs are not contiguous after --update removals: take every ID the
+    # metadata knows and keep the live ones
+    index = load_index(INDEX_PATH)
+    meta = load_chunk_meta()
+    X = vectors_by_id(index, len(meta))
+    return normalize_rows(X[np.asarray(meta.song_ids) != REMOVED])
+
+
+def recall(I_true, I_test, k):
+    hits = [len(set(t[:k]) & set(r[:k])) for t, r in zip(I_true, I_test)]
+    return float(np.mean(hits)) / k
+
+
+def bench(X, queries):
+    print(f"📊 {len(X)} vectors, {len(queries)} queries, d={X.shape[1]}")
+    results = {}
+    for index_type in INDEX_TYPES:
+        t0 = time.perf_counter()
+        index, params = make_index(X, index_type)
+        build_s = time.perf_counter() - t0
+
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        variants = [(index_type, index)]
+        if index_type in ("sq8", "fp16", "pq"):
+            # Same codes, shortlist re-scored against the float32 vectors
+            variants.append((index_type + "+rr", RerankedIndex(index, X)))
+        for name, idx in variants:
+            t0 = time.perf_counter()
+            D, I = idx.search(queries, K)
+            search_s = time.perf_counter() - t0
+            results[name] = (D, I, build_s, search_s, size_mb, params)
+
+    D_true, I_true = results["flat"][:2]
+    print(f"{'type':<8} {'build s':>8} {'MB':>8} {'QPS':>9} {'R@1':>6} {'R@10':>6} {'|dD@1|':>8}  params")
+    for name, (D, I, build_s, search_s, size_mb, params) in results.items():
+        qps = len(queries) / max(search_s, 1e-9)
+        extra = {k: v for k, v in params.items() if k not in ("type", "ntotal", "d")}
+        # How far the reported top-1 similarity is from the exact one
+        err = float(np.mean(np.abs(D[:, 0] - D_true[:, 0])))
+        print(f"{name:<8} {build_s:8.2f} {size_mb:8.1f} {qps:9.0f} "
+              f"{recall(I_true, I, 1):6.3f} {recall(I_true, I, K):6.3f} {err:8.4f}  {extra}")
+
+
+if __name__ == "__main__":
+    faiss.omp_set_num_threads(1)  # per-query latency, comparable to one Flask worker
+
+    if len(sys.argv) > 1:
+        X = synthetic_vectors(int(sys.argv[1]))
+    else:
+        if not os.path.exists(INDEX_PATH):
+            print("❌ No index found. Build it first or pass a synthetic size.")
+            sys.exit(1)
+        X = load_catalog_vectors()
+
+    rng = np.random.default_rng(1)
+    # Queries: perturbed catalog chunks, like a re-recorded or re-encoded upload
+    picks = rng.integers(0, len(X), min(N_QUERIES, len(X)))
+    queries = normalize_rows(X[picks] + 0.05 * rng.standard_normal((len(picks), X.shape[1])).astype('float32'))
+    bench(X, queries)
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import librosa
+from scipy.spatial.distance import cdist
+
+# --- PATH SETUP ---
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.chroma_store import compute_chroma, frames_for_duration
+from utils.banded_dtw import dtw_cost, DTW_BAND
+
+# Usage: python bench_dtw.py [n_songs] [band]
+# librosa.sequence.dtw on a full cdist matrix (run_dtw / calculate_dtw_melody)
+# vs the banded engine, on chroma of the preview clips:
+# - full band must reproduce the reference cost (engine check)
+# - default band must reproduce it for matching pairs (time-shifted / stretched copies)
+# then time and peak memory per pair, including a synthetic 60 s x 60 s pair.
+PREVIEWS_DIR = os.path.join(ROOT_DIR, "data", "spotify_previews")
+DURATION = 60
+TOLERANCE = 1e-3         # Max |normalized cost difference|
+WARPS = [(1.0, 40), (1.08, 0), (0.92, 20), (1.15, 60)]  # (tempo rate, offset frames)
+
+
+def reference_cost(c1, c2):
+    D, wp = librosa.sequence.dtw(C=cdist(c1.T, c2.T, 'cosine'))
+    return D[-1, -1] / wp.shape[0]
+
+
+def warp(c, rate, shift):
+    """Chroma of the same clip played `rate` times faster, starting `shift` frames in."""
+    t = np.arange(shift, c.shape[1] - 1, rate)
+    i = t.astype(int)
+    f = (t - i).astype('float32')
+    return c[:, i] * (1 - f) + c[:, i + 1] * f
+
+
+def measure(fn, *args):
+    fn(*args)  # Warm-up (numba compile, caches)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn(*args)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+if __name__ == "__main__":
+    n_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    band = float(sys.argv[2]) if len(sys.argv) > 2 else DTW_BAND
+
+    files = sorted(f for f in os.listdir(PREVIEWS_DIR) if f.endswith(".mp3"))[:n_songs]
+    chromas = [compute_chroma(os.path.join(PREVIEWS_DIR, f), duration=DURATION) for f in files]
+    print(f"📊 {len(chromas)} clips, band {band}")
+
+    full_err, band_err, other_err = 0.0, 0.0, []
+    for a, c1 in enumerate(chromas):
+        for rate, shift in WARPS:
+            q = warp(c1, rate, shift)
+            ref = reference_cost(q, c1)
+            full_err = max(full_err, abs(dtw_cost(q, c1, band=None) - ref))
+            band_err = max(band_err, abs(dtw_cost(q, c1, band=band) - ref))
+        for c2 in chromas[a + 1:]:
+            ref = reference_cost(c1, c2)
+            full_err = max(full_err, abs(dtw_cost(c1, c2, band=None) - ref))
+            other_err.append(dtw_cost(c1, c2, band=band) - ref)
+
+    print(f"   full band   max |dcost| {full_err:.2e}")
+    print(f"   band {band:<6} max |dcost| {band_err:.2e} (matching pairs)")
+    if other_err:
+        # The band can only raise the cost of pairs whose best path leaves it
+        print(f"   band {band:<6} mean dcost {np.mean(other_err):+.4f} (different songs, never negative: "
+              f"{min(other_err) > -TOLERANCE})")
+    assert full_err < TOLERANCE and band_err < TOLERANCE
+
+    rng = np.random.default_rng(0)
+    n = frames_for_duration(DURATION)
+    pairs = [("preview pair", chromas[0], chromas[1 % len(chromas)]),
+             (f"{DURATION} s synthetic", rng.random((12, n), dtype='float32'),
+              rng.random((12, n), dtype='float32'))]
+    for label, c1, c2 in pairs:
+        print(f"\n⏱️ {label}: {c1.shape[1]} x {c2.shape[1]} frames")
+        _, t_ref, m_ref = measure(reference_cost, c1, c2)
+        _, t_full, m_full = measure(dtw_cost, c1, c2, None)
+        _, t_band, m_band = measure(dtw_cost, c1, c2, band)
+        print(f"   librosa + cdist : {t_ref * 1e3:8.1f} ms  {m_ref / 2 ** 20:8.2f} MB peak")
+        print(f"   engine full     : {t_full * 1e3:8.1f} ms  {m_full / 2 ** 20:8.2f} MB peak")
+        print(f"   engine band     : {t_band * 1e3:8.1f} ms  {m_band / 2 ** 20:8.2f} MB peak "
+              f"({t_ref / t_band:.0f}x faster)")
+    print(f"\n✅ Engine matches librosa DTW within {TOLERANCE}")
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import numpy as np
+
+# --- PATH SETUP ---
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.voting import VoteTally
+
+# Usage: python bench_voting.py [n_query_chunks] [k]
+# Dict-loop vote aggregation (old scan_audio / hybrid_check) vs VoteTally on
+# synthetic search results, checking that both pick the same candidates.
+N_SONGS = 5000
+CHUNKS_PER_SONG = 40
+THRESHOLD = 0.65
+TOP_N = 5
+REPEATS = 5
+
+
+def loop_tally(D, I, names):
+    candidates = {}
+    for dist, idx in zip(D.flatten(), I.flatten()):
+        if idx == -1 or dist < THRESHOLD: continue
+        name = names[idx]
+        if name not in candidates:
+            candidates[name] = {'chunk_hits': 0, 'accum_sim': 0.0}
+        candidates[name]['chunk_hits'] += 1
+        candidates[name]['accum_sim'] += float(dist)
+    votes = sorted(((n, c['chunk_hits']) for n, c in candidates.items()), key=lambda x: x[1], reverse=True)
+    return votes[:TOP_N], candidates
+
+
+def vector_tally(D, I, song_ids, songs):
+    tally = VoteTally(song_ids, len(songs), THRESHOLD).add(D, I)
+    return [(songs[s], int(tally.hits[s])) for s in tally.top(TOP_N)], tally
+
+
+def timed(fn, *args):
+    best = float('inf')
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+
+if __name__ == "__main__":
+    n_query = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    rng = np.random.default_rng(0)
+    songs = [f"song_{i:05d}.mp3" for i in range(N_SONGS)]
+    song_ids = np.repeat(np.arange(N_SONGS, dtype='int32'), CHUNKS_PER_SONG)
+    names = [songs[s] for s in song_ids]  # What the old per-chunk JSON lookup returned
+
+    # A few songs the query really matches, plus background hits
+    hot = rng.choice(len(song_ids), 50)
+    I = np.where(rng.random((n_query, k)) < 0.3, rng.choice(hot, (n_query, k)),
+                 rng.integers(0, len(song_ids), (n_query, k))).astype('int64')
+    D = rng.uniform(0.3, 1.0, (n_query, k)).astype('float32')
+
+    (loop_top, loop_cands), t_loop = timed(loop_tally, D, I, names)
+    (vec_top, tally), t_vec = timed(vector_tally, D, I, song_ids, songs)
+
+    assert loop_top == vec_top, (loop_top, vec_top)
+    for name, c in loop_cands.items():
+        s = songs.index(name)
+        assert c['chunk_hits'] == tally.hits[s]
+        assert abs(c['accum_sim'] / c['chunk_hits'] - tally.mean_sim()[s]) < 1e-9
+
+    print(f"📊 {n_query} query chunks x k={k}, {len(song_ids)} catalog chunks")
+    print(f"   dict loop : {t_loop * 1e3:8.2f} ms")
+    print(f"   VoteTally : {t_vec * 1e3:8.2f} ms  ({t_loop / t_vec:.1f}x)")
+    print(f"✅ Same top-{TOP_N} candidates and per-song hits/mean similarity")
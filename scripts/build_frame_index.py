@@ -0,0 +1,36 @@
+import os
+import sys
+import time
+
+# Ensure utilities are in path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.embedding_store import load_embedding_store
+from utils.frame_index import write_frame_index, FRAME_INDEX_PATH
+from utils.faiss_utils import rss_mb
+
+# --- CONFIGURATION ---
+# Per-second sample-reuse index (see utils/frame_index.py). Built from the raw
+# OpenL3 store that 2_build_audio_index.py writes, so no audio is decoded.
+# Optional: audio_engine.scan_samples() only works once this has been run.
+
+# Usage: python build_frame_index.py
+# Re-run after 2_build_audio_index.py whenever the catalog changes.
+
+if __name__ == "__main__":
+    store = load_embedding_store()
+    if store is None:
+        print(" OpenL3 store not found. Run 2_build_audio_index.py first.")
+        sys.exit(1)
+
+    t_start = time.perf_counter()
+    index, meta = write_frame_index(store)
+    if index is None:
+        print(" OpenL3 store is empty.")
+        sys.exit(1)
+
+    size_mb = os.path.getsize(FRAME_INDEX_PATH) / 2 ** 20
+    print(f" Saved frame index ({index.ntotal} seconds of {len(meta.songs)} songs, "
+          f"{size_mb:.1f} MB, nlist {index.nlist}) to {FRAME_INDEX_PATH} "
+          f"in {time.perf_counter() - t_start:.1f}s (RSS {rss_mb():.0f} MB)")
@@ -1,89 +1,92 @@
 import os
 import sys
 import numpy as np
-import faiss
-import json
 
 # --- Path Setup ---
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 
 from utils.openl3_utils import extract_openl3_embedding
+from utils.audio_utils import DecodedAudio, as_decoded, file_hash
+from utils.chroma_store import ChromaStoreWriter, compute_chroma, compute_beats
+from utils.beat_store import BeatStoreWriter
+from utils.chunking import pool_chunks, normalize_rows
+from utils import index_manifest
+from utils.chunk_meta import ChunkMeta, META_PREFIX
+from utils.song_index import save_song_index
+from utils.faiss_utils import make_index, save_index
 
 # --- Config ---
 SONGS_DIR = os.path.join(ROOT_DIR, "data", "songs")
 INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked.faiss")
-METADATA_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked_meta.json")
 
 CHUNK_SIZE = 10.0  # Seconds
 HOP_SIZE = 5.0  # Seconds (Overlap)
+INDEX_TYPE = "flat"  # flat | ivf | hnsw | sq8 | fp16 | pq
 
 
 def process_file_into_chunks(filepath):
+    # filepath may also be a DecodedAudio so callers can reuse the decoded PCM
+    audio = as_decoded(filepath)
     try:
         # extract_openl3_embedding returns shape (T, 512) where T is seconds
-        full_emb = extract_openl3_embedding(filepath)
+        full_emb = extract_openl3_embedding(audio)
 
-        # Handle short files
-        if full_emb.ndim == 1:
-            full_emb = full_emb.reshape(1, -1)
-
-        vectors = []
-        metadata = []
-        filename = os.path.basename(filepath)
-        num_seconds = full_emb.shape[0]
-
-        # Sliding window
-        for start_sec in range(0, num_seconds, int(HOP_SIZE)):
-            end_sec = start_sec + int(CHUNK_SIZE)
-            if end_sec > num_seconds and start_sec > 0: break  # Skip partial end chunks if we have others
-
-            # Slice and Average
-            chunk_vectors = full_emb[start_sec:end_sec]
-            chunk_vec = np.mean(chunk_vectors, axis=0)
-
-            # Normalize
-            chunk_vec = chunk_vec / (np.linalg.norm(chunk_vec) + 1e-12)
-
-            vectors.append(chunk_vec)
-            metadata.append({
-                "name": filename,  # Using 'name' to match your other scripts
-                "time": f"{start_sec}-{end_sec}s"
-            })
-
-        return vectors, metadata
+        # Sliding window mean (vectorized), then Normalize
+        pooled, spans = pool_chunks(full_emb, CHUNK_SIZE, HOP_SIZE)
+        vectors = normalize_rows(pooled)
+        return vectors, spans
     except Exception as e:
-        print(f"Error chunking {filepath}: {e}")
-        return [], []
+        print(f"Error chunking {audio.path}: {e}")
+        return np.empty((0, 512), dtype='float32'), []
 
 
-def build():
+def build(index_type=INDEX_TYPE):
     all_vecs = []
-    all_meta = []
+    meta = ChunkMeta()
 
     files = [f for f in os.listdir(SONGS_DIR) if f.lower().endswith(".mp3")]
     print(f"Found {len(files)} songs. Chunking...")
 
+    # Chroma for melody verification is computed from the same decode
+    chroma_writer = ChromaStoreWriter()
+    beat_writer = BeatStoreWriter()
+    # Manifest of content hashes lets 2_build_audio_index.py --update work on this index
+    manifest = index_manifest.new_manifest()
+
     for i, f in enumerate(files):
         print(f"[{i + 1}/{len(files)}] {f}...")
-        v, m = process_file_into_chunks(os.path.join(SONGS_DIR, f))
-        all_vecs.extend(v)
-        all_meta.extend(m)
-
-    if not all_vecs: return
+        path = os.path.join(SONGS_DIR, f)
+        audio = DecodedAudio(path)
+        v, spans = process_file_into_chunks(audio)
+        content_hash = file_hash(path)
+        first_id = meta.add_song(f, spans)
+        index_manifest.add_song(manifest, f, content_hash, first_id, len(spans))
+        all_vecs.append(v)
+        try:
+            chroma_writer.add(f, content_hash, compute_chroma(audio))
+            beat_writer.add(f, content_hash, compute_beats(audio))
+        except Exception as e:
+            print(f"Chroma failed for {f}: {e}")
+        audio.release()
+
+    chroma_writer.close()
+    beat_writer.close()
+
+    if not len(meta): return
 
     # Save FAISS
-    X = np.array(all_vecs).astype('float32')
-    index = faiss.IndexFlatIP(X.shape[1])
-    index.add(X)
-    faiss.write_index(index, INDEX_PATH)
+    X = np.vstack(all_vecs).astype('float32')
+    index, params = make_index(X, index_type)
+    save_index(index, INDEX_PATH, params)
 
-    # Save Metadata
-    with open(METADATA_PATH, 'w') as f:
-        json.dump(all_meta, f)
+    # Save Metadata (song table + int32 columns)
+    meta.save(META_PREFIX)
+    save_song_index(X, meta.song_ids)
+    index_manifest.save_manifest(manifest)
 
-    print(f"✅ Indexed {len(all_meta)} chunks.")
+    print(f"✅ Indexed {len(meta)} chunks.")
 
 
 if __name__ == "__main__":
-    build()
\ No newline at end of file
+    build(sys.argv[1] if len(sys.argv) > 1 else INDEX_TYPE)
\ No newline at end of file
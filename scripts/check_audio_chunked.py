@@ -1,16 +1,18 @@
 import os
 import sys
-import json
 import numpy as np
-import faiss
-import librosa
-from scipy.spatial.distance import cdist
 
 # --- PATH SETUP ---
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
 
-from scripts.build_index_chunked import process_file_into_chunks, INDEX_PATH, METADATA_PATH
+from scripts.build_index_chunked import process_file_into_chunks, INDEX_PATH
+from utils.chunk_meta import load_chunk_meta, META_PREFIX
+from utils.voting import VoteTally
+from utils.audio_utils import DecodedAudio, file_hash
+from utils.chroma_store import compute_chroma, load_chroma_store
+from utils.banded_dtw import dtw_cost
+from utils.faiss_utils import load_index
 
 # Configuration
 UPLOADS_DIR = os.path.join(ROOT_DIR, "data", "uploads")
@@ -63,41 +65,28 @@ def get_candidate_path(song_name):
         print(f"   [Debug] Error scanning directory: {e}")
 
     return None
-def calculate_dtw_melody(path_a, path_b, sr=22050):
+def calculate_dtw_melody(path_a, path_b, sr=22050, chroma_a=None, chroma_b=None):
     """
     Computes Dynamic Time Warping (DTW) similarity on Chroma features.
+    Both inputs may be paths or DecodedAudio objects; precomputed chroma
+    (e.g. from the chroma store) skips decoding that side entirely.
     Returns a score 0.0 to 1.0.
     """
     try:
-        # Load audio (lightweight mono)
-        y1, _ = librosa.load(path_a, sr=sr, mono=True, duration=30)
-        y2, _ = librosa.load(path_b, sr=sr, mono=True, duration=30)
-
         # Extract Chroma (Pitch content)
         # We use CQT because it's pitch-invariant
-        C1 = librosa.feature.chroma_cqt(y=y1, sr=sr)
-        C2 = librosa.feature.chroma_cqt(y=y2, sr=sr)
-
-        # Normalize
-        C1 = librosa.util.normalize(C1)
-        C2 = librosa.util.normalize(C2)
-
-        # Compute Cost Matrix (Cosine distance)
-        cost = cdist(C1.T, C2.T, metric='cosine')
+        C1 = chroma_a if chroma_a is not None else compute_chroma(path_a, sr=sr, duration=30)
+        C2 = chroma_b if chroma_b is not None else compute_chroma(path_b, sr=sr, duration=30)
 
-        # Run DTW
-        D, wp = librosa.sequence.dtw(C=cost)
-
-        # Calculate similarity score
-        # Lower cost = Higher similarity
+        # Banded DTW on cosine distance (scale-invariant, so no extra normalization)
         # Normalized cost is roughly between 0 (perfect) and 1 (bad)
-        final_cost = D[-1, -1] / wp.shape[0]
+        final_cost = dtw_cost(C1, C2)
         similarity = 1 - final_cost
 
         return float(np.clip(similarity, 0.0, 1.0))
 
     except Exception as e:
-        print(f"Warning: Melody check failed for {os.path.basename(path_b)}: {e}")
+        print(f"Warning: Melody check failed for {os.path.basename(getattr(path_b, 'path', path_b))}: {e}")
         return 0.0
 
 
@@ -109,65 +98,56 @@ def hybrid_check(audio_path):
         print("Error: Index not found.")
         return
 
-    index = faiss.read_index(INDEX_PATH)
-    with open(METADATA_PATH, 'r') as f:
-        meta_db = json.load(f)
+    index = load_index(INDEX_PATH)
+    meta_db = load_chunk_meta(META_PREFIX)
+    chroma_store = load_chroma_store()
 
     # 2. Phase 1: Vector Search (Chunking)
     print("Step 1: Chunking & Vector Search...")
-    q_vecs, _ = process_file_into_chunks(audio_path)
+    query_audio = DecodedAudio(audio_path)
+    q_vecs, _ = process_file_into_chunks(query_audio)
 
-    if not q_vecs:
+    if len(q_vecs) == 0:
         print("Error: Could not extract chunks.")
         return
 
     Q = np.array(q_vecs).astype('float32')
     D, I = index.search(Q, k=1)  # Top match for each chunk
 
-    # 3. Aggregate Votes
-    candidates = {}
+    # 3. Aggregate Votes (per song ID: hits and summed similarity, weak matches < 0.65 ignored)
+    tally = VoteTally(meta_db.song_ids, len(meta_db.songs), 0.65).add(D, I)
     total_chunks = len(q_vecs)
-
-    for i, (dist, idx) in enumerate(zip(D.flatten(), I.flatten())):
-        if dist < 0.65: continue  # Ignore weak chunk matches
-
-        song_name = meta_db[idx]['name']
-
-        if song_name not in candidates:
-            candidates[song_name] = {
-                'chunk_hits': 0,
-                'accum_sim': 0.0
-            }
-        candidates[song_name]['chunk_hits'] += 1
-        candidates[song_name]['accum_sim'] += float(dist)
-
-    # Convert to list and sort by raw vote count
-    top_candidates = []
-    for name, data in candidates.items():
-        coverage = data['chunk_hits'] / total_chunks
-        avg_sim = data['accum_sim'] / data['chunk_hits']
-        top_candidates.append({
-            'name': name,
-            'coverage': coverage,
-            'audio_sim': avg_sim,
-            'raw_score': (coverage * 0.7) + (avg_sim * 0.3)
-        })
+    coverage = tally.hits / total_chunks
+    avg_sim = tally.mean_sim()
+    raw_score = (coverage * 0.7) + (avg_sim * 0.3)
 
     # Keep only top 3 for the expensive check
-    top_candidates.sort(key=lambda x: x['raw_score'], reverse=True)
-    top_candidates = top_candidates[:3]
+    top_candidates = [{
+        'name': meta_db.songs[s],
+        'coverage': float(coverage[s]),
+        'audio_sim': float(avg_sim[s]),
+        'raw_score': float(raw_score[s])
+    } for s in tally.top(3, raw_score)]
 
     print(f"Step 2: Melody Verification on top {len(top_candidates)} candidates...")
 
     # 4. Phase 2: Melody Verification (DTW)
     final_results = []
+    query_chroma = None
 
     for cand in top_candidates:
         candidate_path = get_candidate_path(cand['name'])
 
         melody_score = 0.0
         if candidate_path:
-            melody_score = calculate_dtw_melody(audio_path, candidate_path)
+            if query_chroma is None:
+                query_chroma = compute_chroma(query_audio, duration=30)
+            cand_chroma = None
+            if chroma_store is not None:
+                cand_chroma = chroma_store.get(os.path.basename(candidate_path), duration=30,
+                                               content_hash=file_hash(candidate_path))
+            melody_score = calculate_dtw_melody(query_audio, candidate_path,
+                                                chroma_a=query_chroma, chroma_b=cand_chroma)
         else:
             print(f"   [!] File not found for '{cand['name']}', skipping DTW.")
 
@@ -1,9 +1,8 @@
 import os
 import sys
 import numpy as np
-import faiss
 import librosa
-from scipy.spatial.distance import cdist
+import torch
 
 # Add project root to path so we can import utils.*
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,15 +10,21 @@ if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
 from utils.openl3_utils import extract_openl3_embedding
+from utils.banded_dtw import dtw_cost
+from utils.chunking import pool_chunks
+from utils.model_def import AudioAdapter, adapt_vectors
+from utils.faiss_utils import load_index
+from utils.chunk_meta import load_chunk_meta, META_PREFIX, REMOVED
 
 # --- CONFIG ---
 UPLOADS_DIR = os.path.join(ROOT_DIR, "data", "uploads")
 PREVIEWS_DIR = os.path.join(ROOT_DIR, "data", "spotify_previews")
-INDEX_PATH = os.path.join(ROOT_DIR, "data", "music_index.faiss")
-TRACK_LIST_PATH = os.path.join(ROOT_DIR, "data", "track_names.txt")
-STATS_PATH = os.path.join(ROOT_DIR, "data", "audio_stats.npz")
+INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked.faiss")
+MODEL_PATH = os.path.join(ROOT_DIR, "models", "audio_adapter.pth")
+STATS_PATH = os.path.join(ROOT_DIR, "data", "audio_stats.npz")  # Written by 4_precompute_stats.py
 
 TOP_K = 5
+CHUNK_K = 10  # Neighbours per query chunk; a song's score is its best chunk similarity
 WEIGHT_AUDIO = 0.7
 WEIGHT_MELODY = 0.3
 Z_THRESHOLD = 2.0
@@ -29,16 +34,38 @@ MELODY_CHECK_LIMIT = 5  # Only run slow DTW for the top N matches
 # --- Utility Functions ---
 
 def load_index_and_metadata():
-    if not os.path.exists(INDEX_PATH):
-        raise FileNotFoundError(f"FAISS index not found at {INDEX_PATH}")
-    index = faiss.read_index(INDEX_PATH)
-    names = []
-    if os.path.exists(TRACK_LIST_PATH):
-        with open(TRACK_LIST_PATH, "r", encoding="utf-8") as f:
-            names = [line.strip() for line in f if line.strip()]
-    else:
-        names = [f"track_{i}" for i in range(index.ntotal)]
-    return index, names
+    """Chunk index (2_build_audio_index.py), its chunk metadata and the adapter (None if untrained)."""
+    meta = load_chunk_meta(META_PREFIX)
+    if not os.path.exists(INDEX_PATH) or meta is None:
+        raise FileNotFoundError(f"Chunk index not found at {INDEX_PATH}. Run 2_build_audio_index.py first.")
+    model = None
+    if os.path.exists(MODEL_PATH):
+        model = AudioAdapter()
+        model.load_state_dict(torch.load(MODEL_PATH, map_location=torch.device('cpu')))
+        model.eval()
+    return load_index(INDEX_PATH), meta, model
+
+
+def query_chunks(path, model):
+    """The upload's 10 s query chunks in index space (same pooling and adapter as the build)."""
+    frames = extract_openl3_embedding(path)
+    pooled, _ = pool_chunks(frames)
+    return adapt_vectors(pooled, model)
+
+
+def song_similarities(Q, index, meta, top_k=TOP_K, k=CHUNK_K):
+    """
+    Best chunk similarity per catalog song over all query chunks Q.
+    Returns [(song name, similarity)] for the top_k songs, best first.
+    """
+    D, I = index.search(np.ascontiguousarray(Q, dtype='float32'), min(k, index.ntotal))
+    sids = np.asarray(meta.song_ids[np.where(I >= 0, I, 0)], dtype='int64')
+    valid = (I >= 0) & (sids != REMOVED)
+    best = np.full(len(meta.songs), -np.inf)
+    np.maximum.at(best, sids[valid], D[valid])
+    hit = np.flatnonzero(best > -np.inf)
+    hit = hit[np.argsort(-best[hit], kind='stable')][:top_k]
+    return [(meta.songs[s], float(best[s])) for s in hit]
 
 
 def melody_similarity(path_a: str, path_b: str, sr: int = 22050, hop_length: int = 512) -> float:
@@ -48,13 +75,8 @@ def melody_similarity(path_a: str, path_b: str, sr: int = 22050, hop_length: int
         y2, _ = librosa.load(path_b, sr=sr, mono=True)
         C1 = librosa.feature.chroma_cqt(y=y1, sr=sr, hop_length=hop_length)
         C2 = librosa.feature.chroma_cqt(y=y2, sr=sr, hop_length=hop_length)
-        C1 = C1 / (np.linalg.norm(C1, axis=0, keepdims=True) + 1e-8)
-        C2 = C2 / (np.linalg.norm(C2, axis=0, keepdims=True) + 1e-8)
-        cost = cdist(C1.T, C2.T, metric="cosine")
-        D, wp = librosa.sequence.dtw(C=cost)
-        total_cost = D[-1, -1]
-        path_length = len(wp)
-        avg_cost = total_cost / max(path_length, 1)
+        # Banded DTW, cosine cost computed inside the band (full songs: no N x M matrix)
+        avg_cost = dtw_cost(C1, C2)
         sim = 1.0 / (1.0 + avg_cost)
         return float(np.clip(sim, 0.0, 1.0))
     except Exception as e:
@@ -77,24 +99,16 @@ def check_song(path_to_upload: str):
         return
 
     print("Extracting OpenL3 embedding...")
-    q_emb = extract_openl3_embedding(path_to_upload).astype('float32')
-    # Normalize query vector (this is correct)
-    q_emb = q_emb / (np.linalg.norm(q_emb) + 1e-12)
-
-    # Load FAISS index and metadata
-    index, names = load_index_and_metadata()
-
+    # Load the chunk index, metadata and adapter
+    index, meta, model = load_index_and_metadata()
+    Q = query_chunks(path_to_upload, model)
 
-
-    if index.ntotal == 0:
-        print("Error: FAISS index is empty.")
+    if index.ntotal == 0 or len(Q) == 0:
+        print("Error: FAISS index is empty or no query chunks were extracted.")
         return []
 
     print("Querying FAISS index...")
-    k = min(max(TOP_K, 5), index.ntotal)
-    Dtop, Itop = index.search(q_emb.reshape(1, -1).astype('float32'), k)
-    Dtop = Dtop.flatten()  # Dtop should now be correct cosine similarity [0.0 to 1.0]
-    Itop = Itop.flatten()
+    matches = song_similarities(Q, index, meta, top_k=max(TOP_K, 5))
 
     # Load the PRECOMPUTED stats (FAST)
     mean_sim, std_sim = load_precomputed_stats()
@@ -103,12 +117,7 @@ def check_song(path_to_upload: str):
     top_fused = 0.0
     top_fused_name = "N/A"
 
-    for rank, (sim_val, idx) in enumerate(zip(Dtop, Itop), start=1):
-        if idx < 0 or idx >= len(names):
-            name = f"track_{idx}"
-        else:
-            name = names[idx]
-
+    for rank, (name, sim_val) in enumerate(matches, start=1):
         candidate_path = None
         for variant in [
             os.path.join(PREVIEWS_DIR, name),
@@ -132,7 +141,6 @@ def check_song(path_to_upload: str):
         results.append({
             "rank": rank,
             "name": name,
-            "index": int(idx),
             "audio_sim": audio_sim,
             "melody_sim": melody_sim,
             "fused": fused,
@@ -156,7 +164,8 @@ def check_song(path_to_upload: str):
     # Calculate Z-score using the top AUDIO score, not the fused score
     z_score = (top_audio_sim - mean_sim) / (std_sim + 1e-12)
 
-    print("\n🎧 Alignment check: index contains", index.ntotal, "items\n")
+    print(f"\n🎧 Alignment check: index contains {index.ntotal} chunks of {len(meta.songs)} songs, "
+          f"{len(Q)} query chunks\n")
 
 
 
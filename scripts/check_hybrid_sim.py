@@ -2,7 +2,6 @@ import os
 import sys
 import json
 import numpy as np
-import faiss
 
 # --- Path Setup ---
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -10,11 +9,10 @@ sys.path.append(ROOT_DIR)
 
 # --- Import LOW-LEVEL functions ---
 # We can't use the simple check_... scripts anymore
-from utils.openl3_utils import extract_openl3_embedding
 from utils.lyrics_utils import embed_text  # Assumes embed_text takes a string
 from scripts.check_audio_sim import melody_similarity, PREVIEWS_DIR
 from scripts.check_lyrics_similarity import load_index as load_lyrics_index
-from scripts.check_audio_sim import load_index_and_metadata as load_audio_index
+from scripts.check_audio_sim import load_index_and_metadata as load_audio_index, query_chunks, song_similarities
 
 UPLOADS_DIR = os.path.join(ROOT_DIR, "data", "uploads")
 
@@ -40,12 +38,18 @@ def hybrid_check(audio_path, lyrics_path=None):
     print("\n🎧 Running HYBRID similarity check (SLOW, ACCURATE MODE)")
     print("--------------------------------------------------")
 
-    # --- Step 1: Generate Query Embeddings ---
+    # --- Step 1: Load Indexes ---
+    print("🔹 Loading FAISS indexes...")
+    audio_index, audio_meta, audio_model = load_audio_index()
+    lyrics_index, lyrics_names = load_lyrics_index()
+    # The chunk index has many rows per song: songs are matched across the two indexes by name
+    lyrics_rows = {get_base_name(n): i for i, n in enumerate(lyrics_names)}
+
+    # --- Step 2: Generate Query Embeddings ---
     print("🔹 Generating query embeddings...")
-    # 1a. Audio
-    q_emb_audio = extract_openl3_embedding(audio_path).astype('float32')
-    q_emb_audio = q_emb_audio / (np.linalg.norm(q_emb_audio) + 1e-12)
-    # 1b. Lyrics
+    # 2a. Audio: 10 s query chunks in chunk-index space
+    q_audio = query_chunks(audio_path, audio_model)
+    # 2b. Lyrics
     q_emb_lyrics = np.array([])
     if lyrics_path and os.path.exists(lyrics_path):
         with open(lyrics_path, "r", encoding="utf-8") as f:
@@ -54,21 +58,12 @@ def hybrid_check(audio_path, lyrics_path=None):
         # Assumes your lyrics index is normalized, so normalize query
         q_emb_lyrics = q_emb_lyrics / (np.linalg.norm(q_emb_lyrics) + 1e-12)
 
-    # --- Step 2: Load FAISS Indexes ---
-    print("🔹 Loading FAISS indexes...")
-    audio_index, audio_names = load_audio_index()
-    lyrics_index, lyrics_names = load_lyrics_index()
-
-    # This is a critical assumption for this to work
-    if len(audio_names) != len(lyrics_names):
-        print("❌ CRITICAL ERROR: Audio and Lyrics indexes are misaligned. Stopping.")
-        return {}
-
     # --- Step 3: Run Top-K Searches ---
     print("🔹 Running Top-K searches...")
     k = 5
-    # 3a. Audio Search
-    D_audio, I_audio = audio_index.search(q_emb_audio.reshape(1, -1), k)
+    # 3a. Audio Search: best chunk similarity of every song the chunk search reached
+    audio_sims = song_similarities(q_audio, audio_index, audio_meta, top_k=len(audio_meta.songs)) \
+        if len(q_audio) else []
     # 3b. Lyrics Search
     D_lyrics, I_lyrics = np.array([]), np.array([])
     if q_emb_lyrics.size > 0:
@@ -79,28 +74,28 @@ def hybrid_check(audio_path, lyrics_path=None):
     # --- Step 4: Combine and Re-Compute ---
     print("🔸 Combining results and computing missing scores...")
 
-    # We must use a dictionary to track unique songs by their index ID
-    # This assumes index 42 in audio_names == index 42 in lyrics_names
+    # Unique songs by base name (audio filenames and lyrics names differ in extension)
     song_scores = {}
 
-    def get_song(index_id):
+    def get_song(name):
         # Helper to initialize a song entry
-        if index_id not in song_scores:
-            song_scores[index_id] = {
-                "song": audio_names[index_id],  # Use audio name by default
+        key = get_base_name(name)
+        if key not in song_scores:
+            song_scores[key] = {
+                "song": name,
                 "audio_score": 0.0,
                 "melody_sim": 0.0,
                 "lyrics_score": 0.0,
                 "fused_audio": 0.0,
                 "hybrid_score": 0.0
             }
-        return song_scores[index_id]
+        return song_scores[key]
 
     # 4a. Process Top Audio Matches
     print("   - Computing audio scores...")
     top_audio_score = 0.0
-    for rank, (sim, idx) in enumerate(zip(D_audio.flatten(), I_audio.flatten())):
-        song = get_song(idx)
+    for rank, (name, sim) in enumerate(audio_sims[:k]):
+        song = get_song(name)
 
         # --- Run slow melody check ---
         candidate_path = os.path.join(PREVIEWS_DIR, song["song"])
@@ -122,7 +117,9 @@ def hybrid_check(audio_path, lyrics_path=None):
     top_lyrics_score = 0.0
     if q_emb_lyrics.size > 0:
         for rank, (sim, idx) in enumerate(zip(D_lyrics, I_lyrics)):
-            song = get_song(idx)
+            if idx < 0:
+                continue
+            song = get_song(lyrics_names[idx])
             song["lyrics_score"] = normalize_score(sim)
             if rank == 0:
                 top_lyrics_score = song["lyrics_score"]
@@ -130,18 +127,18 @@ def hybrid_check(audio_path, lyrics_path=None):
     # 4c. --- THIS IS THE SLOW PART ---
     # Fill in the missing scores for all songs we've found
     print("   - Computing missing cross-scores (this is slow)...")
-    for idx, song in song_scores.items():
+    audio_by_name = {get_base_name(name): sim for name, sim in audio_sims}
+    for key, song in song_scores.items():
         # If we have an audio score but no lyric score, compute it
-        if song["audio_score"] > 0 and song["lyrics_score"] == 0 and q_emb_lyrics.size > 0:
-            lyric_vec = lyrics_index.reconstruct(int(idx)).reshape(1, -1)
+        if song["audio_score"] > 0 and song["lyrics_score"] == 0 and q_emb_lyrics.size > 0 \
+                and key in lyrics_rows:
+            lyric_vec = lyrics_index.reconstruct(int(lyrics_rows[key])).reshape(1, -1)
             missing_lyric_sim = float(np.dot(q_emb_lyrics, lyric_vec.T))
             song["lyrics_score"] = normalize_score(missing_lyric_sim)
 
-        # If we have a lyric score but no audio score, compute it
+        # If we have a lyric score but no audio score, take it from the chunk search (0 if not reached)
         if song["lyrics_score"] > 0 and song["audio_score"] == 0:
-            audio_vec = audio_index.reconstruct(int(idx)).reshape(1, -1)
-            missing_audio_sim = float(np.dot(q_emb_audio.reshape(1, -1), audio_vec.T))
-            song["audio_score"] = normalize_score(missing_audio_sim)
+            song["audio_score"] = normalize_score(audio_by_name.get(key, 0.0))
             # We skip the "fused" audio score for these, as it's too slow to run melody
             song["fused_audio"] = song["audio_score"]
 
@@ -3,17 +3,13 @@ import sys
 import numpy as np
 import faiss
 
-from utils.openl3_utils import extract_openl3_embedding
 from utils.lyrics_utils import embed_text
+from scripts.check_audio_sim import load_index_and_metadata, query_chunks, song_similarities
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOADS_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "data", "uploads")
 
 
-AUDIO_INDEX_PATH = os.path.join(os.path.dirname(SCRIPT_DIR), "data", "music_index.faiss")
-AUDIO_TRACKS_PATH = os.path.join(os.path.dirname(SCRIPT_DIR), "data", "track_names.txt")
-
-
 LYRICS_INDEX_PATH = os.path.join(os.path.dirname(SCRIPT_DIR), "data", "lyrics_index.faiss")
 LYRICS_TRACKS_PATH = os.path.join(os.path.dirname(SCRIPT_DIR), "data", "lyrics_track_names.txt")
 
@@ -29,14 +25,10 @@ def load_index(index_path, names_path):
     return index, names
 
 
-def query_audio(file_path, index, track_names, top_k=TOP_K):
-    emb = extract_openl3_embedding(file_path).astype("float32").reshape(1, -1)
-    D, I = index.search(emb, top_k)
-    results = []
-    for dist, idx in zip(D[0], I[0]):
-        if idx < len(track_names):
-            results.append((track_names[idx], float(dist)))
-    return results
+def query_audio(file_path, index, meta, model, top_k=TOP_K):
+    # Chunk index: best chunk similarity per song (check_audio_sim.song_similarities)
+    Q = query_chunks(file_path, model)
+    return song_similarities(Q, index, meta, top_k) if len(Q) else []
 
 
 def query_lyrics(file_path, index, track_names, top_k=TOP_K):
@@ -70,7 +62,7 @@ def combine_results(audio_results, lyrics_results, alpha=0.5):
     return sorted_results[:TOP_K]
 
 def main():
-    audio_index, audio_tracks = load_index(AUDIO_INDEX_PATH, AUDIO_TRACKS_PATH)
+    audio_index, audio_meta, audio_model = load_index_and_metadata()
     lyrics_index, lyrics_tracks = load_index(LYRICS_INDEX_PATH, LYRICS_TRACKS_PATH)
 
     mp3_files = [f for f in os.listdir(UPLOADS_DIR) if f.lower().endswith(".mp3")]
@@ -83,7 +75,7 @@ def main():
         lyrics_file = os.path.join(UPLOADS_DIR, os.path.splitext(mp3)[0] + ".txt")
 
         print(f"\nProcessing {mp3}...")
-        audio_results = query_audio(mp3_path, audio_index, audio_tracks)
+        audio_results = query_audio(mp3_path, audio_index, audio_meta, audio_model)
         lyrics_results = query_lyrics(lyrics_file, lyrics_index, lyrics_tracks)
 
         hybrid = combine_results(audio_results, lyrics_results)
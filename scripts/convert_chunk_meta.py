@@ -0,0 +1,34 @@
+import os
+import sys
+import json
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.chunk_meta import from_json_entries, META_PREFIX, LEGACY_JSON_PATH, songs_path, chunks_path
+
+# Usage: python convert_chunk_meta.py [legacy.json] [output_prefix]
+# One-shot conversion of audio_chunked_meta.json into the columnar format
+# (<prefix>.songs.json + <prefix>.chunks.npy). Chunk IDs are unchanged.
+
+
+def convert(json_path=LEGACY_JSON_PATH, prefix=META_PREFIX):
+    if not os.path.exists(json_path):
+        print(f"❌ {json_path} not found.")
+        return
+    with open(json_path, 'r') as f:
+        entries = json.load(f)
+
+    meta = from_json_entries(entries)
+    meta.save(prefix)
+
+    old_mb = os.path.getsize(json_path) / 1e6
+    new_mb = (os.path.getsize(songs_path(prefix)) + os.path.getsize(chunks_path(prefix))) / 1e6
+    removed = sum(e is None for e in entries)
+    print(f"✅ {len(meta)} chunks ({removed} removed), {len(meta.songs)} songs: "
+          f"{old_mb:.2f} MB JSON -> {new_mb:.2f} MB columnar")
+    print(f"   The engines now read {chunks_path(prefix)}; {json_path} can be deleted.")
+
+
+if __name__ == "__main__":
+    convert(*sys.argv[1:3])
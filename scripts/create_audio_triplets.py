@@ -1,42 +1,38 @@
 import os
-import json
+import sys
 import random
 import numpy as np
-import faiss
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.faiss_utils import vectors_by_id, load_index
+from utils.chunk_meta import load_chunk_meta, META_PREFIX
+
 INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked.faiss")
-METADATA_PATH = os.path.join(ROOT_DIR, "data", "audio_chunked_meta.json")
 OUTPUT_DATA_PATH = os.path.join(ROOT_DIR, "data", "audio_triplets.npz")
 
 
 def create_triplets(num_triplets=2000):
-    if not os.path.exists(INDEX_PATH) or not os.path.exists(METADATA_PATH):
+    meta = load_chunk_meta(META_PREFIX)
+    if not os.path.exists(INDEX_PATH) or meta is None:
         print("❌ Error: Index missing. Run scripts/build_index_chunked.py first!")
         return
 
     print("🔹 Loading index to generate training data...")
-    index = faiss.read_index(INDEX_PATH)
+    index = load_index(INDEX_PATH)
 
     # Extract all vectors from the index to use as training data
     try:
-        # reconstruct_n pulls the raw vectors back out of FAISS
-        all_vectors = index.reconstruct_n(0, index.ntotal)
-    except:
-        print("❌ Error: Your index type doesn't support reconstruction. Use IndexFlatIP.")
+        # Row i = chunk ID i; updated (ID-mapped) and IVF indexes are not in ID order
+        all_vectors = vectors_by_id(index, len(meta))
+    except Exception as e:
+        print(f"❌ Error: Could not reconstruct the index vectors: {e}")
         return
 
-    with open(METADATA_PATH, 'r') as f:
-        meta = json.load(f)
-
     print(f"🔹 Grouping {len(meta)} chunks by song...")
     # Group chunk indices by song name so we know which chunks belong together
-    song_to_indices = {}
-    for idx, entry in enumerate(meta):
-        name = entry['name']
-        if name not in song_to_indices:
-            song_to_indices[name] = []
-        song_to_indices[name].append(idx)
+    song_to_indices = meta.song_chunks()
 
     song_names = list(song_to_indices.keys())
 
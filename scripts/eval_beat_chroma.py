@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import numpy as np
+import librosa
+
+# --- PATH SETUP ---
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.audio_utils import DecodedAudio
+from utils.chroma_store import compute_chroma, compute_beats, sync_chroma, CHROMA_SR, CHROMA_HOP
+from utils.banded_dtw import dtw_cost, subsequence_dtw
+
+# Usage: python eval_beat_chroma.py [n_songs]
+# How DTW verification scores shift when chroma is aggregated per beat or per
+# CHROMA_POOL frames instead of used at the frame rate (audio_engine.DTW_FEATURES).
+# Queries are the preview clips re-played at another tempo and cut to start a
+# few seconds in (a genuine match), scored against every clip.
+PREVIEWS_DIR = os.path.join(ROOT_DIR, "data", "spotify_previews")
+CHROMA_POOL = 16          # Same as audio_engine.CHROMA_POOL
+QUERY_EDITS = [(1.0, 3.0), (1.06, 0.0), (0.94, 5.0)]  # (tempo rate, seconds cut from the start)
+SUBSEQ_WINDOW = 10.0      # Query seconds aligned inside the catalog clip (subsequence mode)
+MODES = ("frames", "beats", "pooled")
+
+
+def features(chroma, beats, mode):
+    if mode == "beats":
+        return sync_chroma(chroma, beats)[0]
+    if mode == "pooled":
+        return sync_chroma(chroma, np.arange(0, chroma.shape[1], CHROMA_POOL))[0]
+    return chroma
+
+
+def score(cost):
+    return (1.0 - cost) ** 2 * 100  # audio_engine.dtw_score
+
+
+def edited_clip(audio, rate, cut):
+    y = audio.at(CHROMA_SR)[int(cut * CHROMA_SR):]
+    if rate != 1.0:
+        y = librosa.effects.time_stretch(y, rate=rate)
+    return y
+
+
+def clip_features(y):
+    chroma = librosa.feature.chroma_cqt(y=y, sr=CHROMA_SR, hop_length=CHROMA_HOP).astype(np.float32)
+    _, beats = librosa.beat.beat_track(y=y, sr=CHROMA_SR, hop_length=CHROMA_HOP)
+    return chroma, np.asarray(beats, dtype=np.int32)
+
+
+if __name__ == "__main__":
+    n_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    files = sorted(f for f in os.listdir(PREVIEWS_DIR) if f.endswith(".mp3"))[:n_songs]
+
+    catalog, queries = [], []
+    for f in files:
+        audio = DecodedAudio(os.path.join(PREVIEWS_DIR, f))
+        catalog.append((compute_chroma(audio), compute_beats(audio)))
+        for rate, cut in QUERY_EDITS:
+            queries.append((len(catalog) - 1, clip_features(edited_clip(audio, rate, cut))))
+        audio.release()
+    print(f"📊 {len(queries)} edited queries x {len(catalog)} clips")
+
+    fps = CHROMA_SR / CHROMA_HOP
+    results = {}
+    for mode in MODES:
+        cat = [features(c, b, mode) for c, b in catalog]
+        S_global = np.zeros((len(queries), len(cat)))
+        S_sub = np.zeros((len(queries), len(cat)))
+        cells, t_global, t_sub = 0, 0.0, 0.0
+        for qi, (_, (chroma, beats)) in enumerate(queries):
+            q = features(chroma, beats, mode)
+            # Same query window in every mode: the columns starting in the first SUBSEQ_WINDOW s
+            q_win = features(chroma[:, :int(SUBSEQ_WINDOW * fps)], beats[beats < SUBSEQ_WINDOW * fps], mode)
+            for ci, ref in enumerate(cat):
+                cells += q.shape[1] * ref.shape[1]
+                t0 = time.perf_counter()
+                S_global[qi, ci] = score(dtw_cost(q, ref))
+                t1 = time.perf_counter()
+                S_sub[qi, ci] = score(subsequence_dtw(q_win, ref)[0])
+                t_sub += time.perf_counter() - t1
+                t_global += t1 - t0
+        n_pairs = len(queries) * len(cat)
+        results[mode] = (S_global, S_sub, cells / n_pairs, t_global / n_pairs, t_sub / n_pairs)
+
+    truth = np.array([ci for ci, _ in queries])
+    match = np.zeros((len(queries), len(catalog)), dtype=bool)
+    match[np.arange(len(queries)), truth] = True
+    base_cells = results["frames"][2]
+    for mode in MODES:
+        S_global, S_sub, cells, t_global, t_sub = results[mode]
+        print(f"\n🔹 {mode}: {cells:,.0f} cells per pair ({base_cells / cells:.0f}x fewer than frames), "
+              f"global {t_global * 1e3:.1f} ms, subsequence {t_sub * 1e3:.1f} ms per pair")
+        for label, S, S_frames in (("global", S_global, results["frames"][0]),
+                                   ("subsequence", S_sub, results["frames"][1])):
+            top1 = np.mean(S.argmax(axis=1) == truth)
+            shift = S - S_frames
+            print(f"   {label:<11} match {S[match].mean():5.1f}  other {S[~match].mean():5.1f}  "
+                  f"margin {S[match].min() - S[~match].max():+5.1f}  top-1 {top1:.0%}  "
+                  f"shift vs frames: match {shift[match].mean():+5.1f}, other {shift[~match].mean():+5.1f} "
+                  f"(max |{np.abs(shift).max():.1f}|)")
@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import numpy as np
+import librosa
+
+# --- PATH SETUP ---
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.audio_utils import DecodedAudio
+from utils.chroma_store import compute_chroma, sync_chroma, rescale_similarity, SUBSEQ_SIM_FLOOR, CHROMA_SR, CHROMA_HOP
+from utils.banded_dtw import dtw_cost, subsequence_dtw
+
+# Usage: python eval_subsequence.py [n_songs]
+# Whether DTW_MODE = "subsequence" keeps audio_engine's score scale. Edited
+# preview clips (another tempo, cut to start a few seconds in: genuine matches)
+# are scored against every clip with pooled chroma:
+# - global DTW, whole clips end to end
+# - subsequence DTW of the first SUBSEQ_QUERY_SECONDS of the query anywhere in
+#   the catalog clip, raw and rescaled from chroma_store.SUBSEQ_SIM_FLOOR
+# reporting match / other-song scores, how many other songs pass the engine's
+# score > 10 cutoff and result.html's 70 % "high" badge, and the floor that puts
+# the subsequence other-song mean on the global one (refit SUBSEQ_SIM_FLOOR
+# from it when the catalog or the features change).
+PREVIEWS_DIR = os.path.join(ROOT_DIR, "data", "spotify_previews")
+CHROMA_POOL = 16           # Same as audio_engine.CHROMA_POOL
+SUBSEQ_QUERY_SECONDS = 20  # Same as audio_engine.SUBSEQ_QUERY_SECONDS
+QUERY_EDITS = [(1.0, 3.0), (1.06, 0.0), (0.94, 5.0)]  # (tempo rate, seconds cut from the start)
+HIGH_SCORE = 70            # result.html "high" badge
+ACCEPT_SCORE = 10          # audio_engine.verify_candidates keeps scores above this
+
+
+def pooled(chroma):
+    return sync_chroma(chroma, np.arange(0, chroma.shape[1], CHROMA_POOL))[0]
+
+
+def score(sim):
+    return sim ** 2 * 100  # audio_engine.dtw_score
+
+
+def edited_clip(audio, rate, cut):
+    y = audio.at(CHROMA_SR, offset=cut)
+    if rate != 1.0:
+        y = librosa.effects.time_stretch(y, rate=rate)
+    return y
+
+
+def fit_floor(sims, target):
+    """Floor for rescale_similarity that gives `sims` the mean score `target` (bisection)."""
+    lo, hi = 0.0, 0.9
+    for _ in range(40):
+        floor = (lo + hi) / 2
+        mean = np.mean([score(rescale_similarity(s, floor)) for s in sims])
+        lo, hi = (floor, hi) if mean > target else (lo, floor)
+    return floor
+
+
+if __name__ == "__main__":
+    n_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    files = sorted(f for f in os.listdir(PREVIEWS_DIR) if f.endswith(".mp3"))[:n_songs]
+
+    catalog, queries = [], []
+    for ci, f in enumerate(files):
+        audio = DecodedAudio(os.path.join(PREVIEWS_DIR, f))
+        catalog.append(pooled(compute_chroma(audio)))
+        for rate, cut in QUERY_EDITS:
+            y = edited_clip(audio, rate, cut)
+            chroma = librosa.feature.chroma_cqt(y=y, sr=CHROMA_SR, hop_length=CHROMA_HOP).astype(np.float32)
+            queries.append((ci, pooled(chroma)))
+        audio.release()
+    print(f"📊 {len(queries)} edited queries x {len(catalog)} clips")
+
+    window = int(SUBSEQ_QUERY_SECONDS * CHROMA_SR / CHROMA_HOP / CHROMA_POOL)
+    sim_global = np.zeros((len(queries), len(catalog)))
+    sim_sub = np.zeros((len(queries), len(catalog)))
+    t_global = t_sub = 0.0
+    for qi, (_, q) in enumerate(queries):
+        for ci, ref in enumerate(catalog):
+            t0 = time.perf_counter()
+            sim_global[qi, ci] = 1.0 - dtw_cost(q, ref)
+            t1 = time.perf_counter()
+            sim_sub[qi, ci] = 1.0 - subsequence_dtw(q[:, :window], ref)[0]
+            t_sub += time.perf_counter() - t1
+            t_global += t1 - t0
+
+    truth = np.array([ci for ci, _ in queries])
+    match = np.zeros(sim_global.shape, dtype=bool)
+    match[np.arange(len(queries)), truth] = True
+    rescaled = np.vectorize(lambda s: rescale_similarity(s, SUBSEQ_SIM_FLOOR))(sim_sub)
+    n_pairs = sim_global.size
+    for label, S, t in (("global", score(sim_global), t_global),
+                        ("subsequence", score(sim_sub), t_sub),
+                        (f"subsequence, floor {SUBSEQ_SIM_FLOOR}", score(rescaled), t_sub)):
+        other = S[~match]
+        print(f"\n🔹 {label}: {t / n_pairs * 1e3:.2f} ms per pair, top-1 {np.mean(S.argmax(axis=1) == truth):.0%}")
+        print(f"   match  mean {S[match].mean():5.1f}  min {S[match].min():5.1f}")
+        print(f"   other  mean {other.mean():5.1f}  p95 {np.percentile(other, 95):5.1f}  max {other.max():5.1f}  "
+              f"> {ACCEPT_SCORE}: {np.mean(other > ACCEPT_SCORE):.0%}  > {HIGH_SCORE}: {np.mean(other > HIGH_SCORE):.0%}")
+        print(f"   margin {S[match].min() - other.max():+5.1f}")
+
+    floor = fit_floor(sim_sub[~match], score(sim_global[~match]).mean())
+    print(f"\n🔸 Floor that puts subsequence other songs on the global mean: {floor:.3f}")
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import numpy as np
+import librosa
+
+# --- PATH SETUP ---
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.audio_utils import DecodedAudio
+from utils.chroma_store import (compute_chroma, sync_chroma, transpose_chroma, transposition_candidates,
+                                transposed_similarity, rescale_similarity, TRANSPOSE_SIM_FLOOR,
+                                SUBSEQ_SIM_FLOOR, CHROMA_SR, CHROMA_HOP)
+from utils.banded_dtw import dtw_cost, subsequence_dtw
+
+# Usage: python eval_transposition.py [n_songs] [global | subsequence]
+# Pitch-shifted preview clips scored against every clip (pooled chroma, DTW as
+# audio_engine runs it for that DTW_MODE; subsequence: a SUBSEQ_QUERY_SECONDS
+# window of the query aligned anywhere in the catalog clip, rescaled from SUBSEQ_SIM_FLOOR):
+# - plain DTW (no transposition handling)
+# - key-offset estimate + one DTW at the best offset (audio_engine.TRANSPOSE_CANDIDATES = 1),
+#   raw and recalibrated like audio_engine.transposed_score
+# - brute force DTW over all 12 shifts
+# reporting top-1 accuracy, detected semitones, how often other songs pass 80
+# and time per pair. The recalibrated "other songs" mean should stay at the
+# plain-DTW level; refit chroma_store.TRANSPOSE_SIM_FLOOR[mode] if it does not.
+PREVIEWS_DIR = os.path.join(ROOT_DIR, "data", "spotify_previews")
+SEMITONES = [0, 2, -3, 5]
+CHROMA_POOL = 16  # Same as audio_engine.CHROMA_POOL
+SUBSEQ_QUERY_START = 5     # Seconds into the query clip
+SUBSEQ_QUERY_SECONDS = 20  # Same as audio_engine.SUBSEQ_QUERY_SECONDS
+MODE = "global"
+
+
+def pooled(chroma):
+    return sync_chroma(chroma, np.arange(0, chroma.shape[1], CHROMA_POOL))[0]
+
+
+def score(cost):
+    return (1.0 - cost) ** 2 * 100  # audio_engine.dtw_score
+
+
+def cost(q, ref):
+    if MODE == "subsequence":
+        step = CHROMA_POOL * CHROMA_HOP / CHROMA_SR
+        a = int(SUBSEQ_QUERY_START / step)
+        sim = 1.0 - subsequence_dtw(q[:, a:a + int(SUBSEQ_QUERY_SECONDS / step)], ref)[0]
+        return 1.0 - rescale_similarity(sim, SUBSEQ_SIM_FLOOR)  # audio_engine.subsequence_score
+    return dtw_cost(q, ref)
+
+
+def plain(q, ref):
+    return score(cost(q, ref)), 0
+
+
+def estimated(q, ref):
+    k = transposition_candidates(q, ref, 1)[0]
+    return score(cost(transpose_chroma(q, k), ref)), k
+
+
+def calibrated(q, ref):
+    raw, k = estimated(q, ref)
+    return transposed_similarity(np.sqrt(raw / 100), k, MODE) ** 2 * 100, k  # audio_engine.transposed_score
+
+
+def brute_force(q, ref):
+    return max((score(cost(transpose_chroma(q, k), ref)), k if k <= 6 else k - 12) for k in range(12))
+
+
+if __name__ == "__main__":
+    n_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    MODE = sys.argv[2] if len(sys.argv) > 2 else MODE
+    files = sorted(f for f in os.listdir(PREVIEWS_DIR) if f.endswith(".mp3"))[:n_songs]
+
+    catalog, queries = [], []
+    for ci, f in enumerate(files):
+        audio = DecodedAudio(os.path.join(PREVIEWS_DIR, f))
+        catalog.append(pooled(compute_chroma(audio)))
+        y = audio.at(CHROMA_SR)
+        for st in SEMITONES:
+            ys = librosa.effects.pitch_shift(y, sr=CHROMA_SR, n_steps=st) if st else y
+            chroma = librosa.feature.chroma_cqt(y=ys, sr=CHROMA_SR, hop_length=CHROMA_HOP).astype(np.float32)
+            queries.append((ci, st, pooled(chroma)))
+        audio.release()
+    print(f"📊 {len(queries)} queries (shifts {SEMITONES}) x {len(catalog)} clips, {MODE} DTW "
+          f"(floor {TRANSPOSE_SIM_FLOOR[MODE]})")
+
+    truth = np.array([ci for ci, _, _ in queries])
+    shifts = np.array([st for _, st, _ in queries])
+    t_plain = None
+    for label, fn in (("plain DTW", plain), ("key estimate", estimated), ("key estimate, recalibrated", calibrated),
+                      ("all 12 shifts", brute_force)):
+        fn(queries[0][2], catalog[0])  # Warm-up (numba compile)
+        S = np.zeros((len(queries), len(catalog)))
+        K = np.zeros((len(queries), len(catalog)), dtype=int)
+        t0 = time.perf_counter()
+        for qi, (_, _, q) in enumerate(queries):
+            for ci, ref in enumerate(catalog):
+                S[qi, ci], K[qi, ci] = fn(q, ref)
+        elapsed = (time.perf_counter() - t0) / S.size
+        t_plain = t_plain or elapsed
+        top1 = S.argmax(axis=1) == truth
+        found = K[np.arange(len(queries)), truth] == shifts
+        match = S[np.arange(len(queries)), truth]
+        other = np.ones_like(S, dtype=bool)
+        other[np.arange(len(queries)), truth] = False
+        print(f"\n🔹 {label}: {elapsed * 1e3:.2f} ms per pair ({elapsed / t_plain:.1f}x plain), "
+              f"other songs score {S[other].mean():.1f} ({(S[other] > 80).mean():.0%} above 80)")
+        for st in SEMITONES:
+            sel = shifts == st
+            print(f"   {st:+d} st: top-1 {top1[sel].mean():4.0%}  match score {match[sel].mean():5.1f}  "
+                  f"semitones found {found[sel].mean():4.0%}")
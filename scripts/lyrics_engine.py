@@ -1,6 +1,6 @@
 import os
 import sys
-import numpy as np
+import time
 import faiss
 
 # --- SETUP PATHS ---
@@ -9,6 +9,7 @@ ROOT_DIR = os.path.dirname(CURRENT_DIR)
 sys.path.append(ROOT_DIR)
 
 from utils.lyrics_utils import embed_text
+from utils.faiss_utils import load_index, rss_mb
 
 INDEX_PATH = os.path.join(ROOT_DIR, "data", "lyrics_index.faiss")
 NAMES_PATH = os.path.join(ROOT_DIR, "data", "lyrics_track_names.txt")
@@ -16,6 +17,9 @@ NAMES_PATH = os.path.join(ROOT_DIR, "data", "lyrics_track_names.txt")
 # --- CONFIG: TOP 3 (Changed from 5) ---
 TOP_K = 3  # <--- CHANGED HERE
 
+# Map the index file read-only instead of copying it into every worker
+INDEX_MMAP = True
+
 LYRICS_INDEX = None
 LYRICS_NAMES = None
 
@@ -24,10 +28,12 @@ def init_lyrics_resources():
     if not os.path.exists(INDEX_PATH) or not os.path.exists(NAMES_PATH):
         print(f"❌ Error: Database files missing at {INDEX_PATH}")
         return
-    LYRICS_INDEX = faiss.read_index(INDEX_PATH)
+    t_start = time.perf_counter()
+    LYRICS_INDEX = load_index(INDEX_PATH, mmap=INDEX_MMAP)
     with open(NAMES_PATH, "r", encoding="utf-8") as f:
         LYRICS_NAMES = [line.strip() for line in f]
-    print("✅ [Lyrics Engine] Database Loaded")
+    print(f"✅ [Lyrics Engine] Database Loaded in {time.perf_counter() - t_start:.2f}s "
+          f"(pid {os.getpid()}, RSS {rss_mb():.0f} MB)")
 
 def query_text(text, index, names, top_k=TOP_K):
     q = embed_text(text).astype('float32').reshape(1, -1)
@@ -1,7 +1,6 @@
 import os
 import sys
 import numpy as np
-import faiss
 import librosa
 from scipy.spatial.distance import cdist
 
@@ -10,14 +9,11 @@ ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT_DIR not in sys.path:
     sys.path.insert(0, ROOT_DIR)
 
-from utils.openl3_utils import extract_openl3_embedding  # must return normalized 1D np.array
+from scripts.check_audio_sim import load_index_and_metadata, query_chunks, song_similarities
 
 # --- CONFIG ---
 UPLOADS_DIR = os.path.join(ROOT_DIR, "data", "uploads")
 PREVIEWS_DIR = os.path.join(ROOT_DIR, "data", "spotify_previews")
-INDEX_PATH = os.path.join(ROOT_DIR, "data", "music_index.faiss")
-EMBEDDINGS_PATH = os.path.join(ROOT_DIR, "data", "music_embeddings.npy")
-TRACK_LIST_PATH = os.path.join(ROOT_DIR, "data", "track_names.txt")
 
 TOP_K = 5
 WEIGHT_AUDIO = 0.7
@@ -36,19 +32,6 @@ def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     return float(np.dot(a, b) / denom)
 
 
-def load_index_and_metadata():
-    if not os.path.exists(INDEX_PATH):
-        raise FileNotFoundError(f"FAISS index not found at {INDEX_PATH}")
-    index = faiss.read_index(INDEX_PATH)
-    names = []
-    if os.path.exists(TRACK_LIST_PATH):
-        with open(TRACK_LIST_PATH, "r", encoding="utf-8") as f:
-            names = [line.strip() for line in f if line.strip()]
-    else:
-        names = [f"track_{i}" for i in range(index.ntotal)]
-    return index, names
-
-
 def melody_similarity(path_a: str, path_b: str, sr: int = 22050, hop_length: int = 512) -> float:
     """Compare two songs using chroma features + DTW for melody similarity."""
     try:
@@ -74,30 +57,19 @@ def melody_similarity(path_a: str, path_b: str, sr: int = 22050, hop_length: int
         return 0.0
 
 
-def compute_dataset_stats(index, query_vec: np.ndarray, names_len_limit=1000):
-    ntotal = index.ntotal
-    if ntotal == 0:
+def compute_dataset_stats(Q, index, meta, names_len_limit=1000):
+    """Distribution of the upload's best-chunk similarity over the songs its top chunk neighbours reach."""
+    if index.ntotal == 0 or len(Q) == 0:
         return 0.0, 1.0, np.array([0.0])
 
-    k_all = ntotal if ntotal <= names_len_limit else names_len_limit
-
     try:
-        if k_all == ntotal:
-            sims, ids = index.search(query_vec.reshape(1, -1).astype('float32'), k_all)
-            sims = sims.flatten()
-        else:
-            if os.path.exists(EMBEDDINGS_PATH):
-                all_emb = np.load(EMBEDDINGS_PATH).astype('float32')
-                n = all_emb.shape[0]
-                idxs = np.random.choice(n, size=k_all, replace=False)
-                sample = all_emb[idxs]
-                sims = (sample @ query_vec).flatten()
-            else:
-                sims, ids = index.search(query_vec.reshape(1, -1).astype('float32'), k_all)
-                sims = sims.flatten()
+        sims = np.array([s for _, s in song_similarities(Q, index, meta, top_k=len(meta.songs),
+                                                         k=names_len_limit)])
     except Exception as e:
         print("Error computing dataset stats:", e)
         return 0.0, 1.0, np.array([0.0])
+    if sims.size == 0:
+        return 0.0, 1.0, np.array([0.0])
 
     mean = float(np.mean(sims))
     std = float(np.std(sims)) if np.std(sims) > 0 else 1.0
@@ -113,35 +85,17 @@ def check_song(path_to_upload: str):
         return
 
     print("Extracting OpenL3 embedding...")
-    q_emb = extract_openl3_embedding(path_to_upload).astype('float32')
-    q_emb = q_emb / (np.linalg.norm(q_emb) + 1e-12)
-
-    # Load FAISS index and metadata
-    index, names = load_index_and_metadata()
-
-    # --- Normalize index vectors for cosine similarity ---
-    print("Normalizing FAISS index vectors for cosine comparison...")
-    xb = index.reconstruct_n(0, index.ntotal)
-    xb = xb / (np.linalg.norm(xb, axis=1, keepdims=True) + 1e-12)
-    new_index = faiss.IndexFlatIP(xb.shape[1])
-    new_index.add(xb)
-    index = new_index
+    # Load the chunk index, metadata and adapter; query chunks in the same space
+    index, meta, model = load_index_and_metadata()
+    Q = query_chunks(path_to_upload, model)
 
     print("Querying FAISS index...")
-    k = min(max(TOP_K, 5), index.ntotal) if index.ntotal > 0 else TOP_K
-    Dtop, Itop = index.search(q_emb.reshape(1, -1).astype('float32'), k)
-    Dtop = Dtop.flatten()
-    Itop = Itop.flatten()
+    matches = song_similarities(Q, index, meta, top_k=max(TOP_K, 5)) if len(Q) else []
 
-    mean_sim, std_sim, all_sims = compute_dataset_stats(index, q_emb, names_len_limit=1000)
+    mean_sim, std_sim, all_sims = compute_dataset_stats(Q, index, meta, names_len_limit=1000)
 
     results = []
-    for rank, (sim_val, idx) in enumerate(zip(Dtop, Itop), start=1):
-        if idx < 0 or idx >= len(names):
-            name = f"track_{idx}"
-        else:
-            name = names[idx]
-
+    for rank, (name, sim_val) in enumerate(matches, start=1):
         candidate_path = None
         for variant in [
             os.path.join(PREVIEWS_DIR, name),
@@ -160,7 +114,6 @@ def check_song(path_to_upload: str):
         results.append({
             "rank": rank,
             "name": name,
-            "index": int(idx),
             "audio_sim": audio_sim,
             "melody_sim": melody_sim,
             "fused": fused,
@@ -175,7 +128,7 @@ def check_song(path_to_upload: str):
     fused_std = float(np.std(fused_values)) if fused_values.size > 0 else 1.0
     fused_z = (top_fused - fused_mean) / (fused_std + 1e-12)
 
-    print("\nAlignment check: index contains", index.ntotal, "items\n")
+    print(f"\nAlignment check: index contains {index.ntotal} chunks of {len(meta.songs)} songs\n")
     print("Top matches (audio + melody + fused):\n")
     for r in results:
         print(f"{r['rank']}. {r['name']}")
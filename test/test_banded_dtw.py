@@ -0,0 +1,85 @@
+import os
+import sys
+import numpy as np
+import librosa
+from scipy.spatial.distance import cdist
+
+# Add project root to path so we can import utils.*
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from utils.banded_dtw import dtw_cost, subsequence_dtw, DTW_BAND
+
+# The numba DTW kernels against librosa.sequence.dtw on synthetic chroma (same
+# reference as scripts/bench_dtw.py, without the preview clips)
+TOLERANCE = 1e-3         # Max |normalized cost difference|
+N_FRAMES = 240           # DTW_BAND radius 24 frames: every warp below stays inside it
+WARPS = [(1.0, 10), (1.08, 0), (0.92, 5), (1.15, 15)]  # (tempo rate, offset frames)
+
+
+def random_chroma(rng, n):
+    return rng.random((12, n), dtype='float32')
+
+
+def warp(c, rate, shift):
+    """Chroma of the same clip played `rate` times faster, starting `shift` frames in."""
+    t = np.arange(shift, c.shape[1] - 1, rate)
+    i = t.astype(int)
+    f = (t - i).astype('float32')
+    return c[:, i] * (1 - f) + c[:, i + 1] * f
+
+
+def reference_cost(c1, c2):
+    D, wp = librosa.sequence.dtw(C=cdist(c1.T, c2.T, 'cosine'))
+    return D[-1, -1] / wp.shape[0]
+
+
+def reference_subsequence(query, catalog):
+    D, wp = librosa.sequence.dtw(C=cdist(query.T, catalog.T, 'cosine'), subseq=True)
+    # wp runs backwards: wp[0] is the end cell, wp[-1] the start one
+    end = wp[0, 1]
+    return D[-1, end] / wp.shape[0], wp[-1, 1], end + 1
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    clips = [random_chroma(rng, N_FRAMES) for _ in range(4)]
+
+    # Global DTW: full band always, default band for time-shifted / stretched copies
+    for a, c1 in enumerate(clips):
+        for rate, shift in WARPS:
+            q = warp(c1, rate, shift)
+            ref = reference_cost(q, c1)
+            assert abs(dtw_cost(q, c1, band=None) - ref) < TOLERANCE
+            assert abs(dtw_cost(q, c1, band=DTW_BAND) - ref) < TOLERANCE
+        for c2 in clips[a + 1:] + [random_chroma(rng, N_FRAMES // 2)]:
+            ref = reference_cost(c1, c2)
+            assert abs(dtw_cost(c1, c2, band=None) - ref) < TOLERANCE
+            # The band can only raise the cost of pairs whose best path leaves it
+            assert dtw_cost(c1, c2, band=DTW_BAND) > ref - TOLERANCE
+    print("Global DTW matches librosa")
+
+    # Subsequence DTW: an excerpt (warped or not) of a clip, and unrelated queries
+    for c1 in clips:
+        for rate, shift in WARPS:
+            q = warp(c1, rate, shift)[:, :N_FRAMES // 3]
+            cost, start, end = subsequence_dtw(q, c1)
+            ref_cost, ref_start, ref_end = reference_subsequence(q, c1)
+            assert abs(cost - ref_cost) < TOLERANCE
+            assert (start, end) == (ref_start, ref_end)
+            assert abs(start - shift) <= 1
+        q = random_chroma(rng, N_FRAMES // 3)
+        cost, start, end = subsequence_dtw(q, c1)
+        ref_cost, ref_start, ref_end = reference_subsequence(q, c1)
+        assert abs(cost - ref_cost) < TOLERANCE and (start, end) == (ref_start, ref_end)
+    print("Subsequence DTW matches librosa")
+
+    for fn in (dtw_cost, subsequence_dtw):
+        try:
+            fn(np.zeros((12, 0), dtype='float32'), clips[0])
+            assert False, "empty chroma accepted"
+        except ValueError:
+            pass
+
+    print(f"✅ Banded and subsequence DTW kernels match librosa within {TOLERANCE}")
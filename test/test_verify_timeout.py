@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import threading
+import tempfile
+from types import SimpleNamespace
+import numpy as np
+
+# Add project root to path so we can import scripts.*
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import scripts.audio_engine as ae
+from utils.voting import VoteTally
+
+# A request whose catalog decodes hang must not starve the verify pool for the next
+# one, and a slow query phase before the DTW fan-out must not use up the budget
+N_SONGS = 5
+SLOW_DECODE = 3.0  # Seconds one pathological catalog decode takes
+SLOW_QUERY = 1.0   # Seconds of query embedding / chroma, longer than the timeout
+TIMEOUT = 0.5
+
+
+def fake_features(seed):
+    rng = np.random.default_rng(seed)
+    chroma = rng.random((12, 40)).astype(np.float32)
+    return chroma, np.arange(41, dtype=np.float64)
+
+
+def make_tally():
+    tally = VoteTally(np.arange(N_SONGS), N_SONGS, ae.MATCH_THRESHOLD)
+    return tally.add(np.ones((N_SONGS, 1), dtype='float32'), np.arange(N_SONGS).reshape(-1, 1))
+
+
+def slow_catalog_features(local_path, duration=None):
+    time.sleep(SLOW_DECODE)
+    return fake_features(0), 1
+
+
+def fast_catalog_features(local_path, duration=None):
+    return fake_features(0), 0
+
+
+def fast_query_features(query_audio, duration=None):
+    return fake_features(0)
+
+
+def slow_query_features(query_audio, duration=None):
+    time.sleep(SLOW_QUERY)
+    return fake_features(0)
+
+
+def run_request(catalog_features, query_features=fast_query_features):
+    ae.get_catalog_features = catalog_features
+    ae.query_features = query_features
+    t0 = time.perf_counter()
+    results, _ = ae.verify_candidates(None, make_tally())
+    return results, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as songs_dir:
+        names = [f"song{i}.mp3" for i in range(N_SONGS)]
+        for name in names:
+            open(os.path.join(songs_dir, name), 'wb').close()
+
+        ae.SONGS_DIR = songs_dir
+        ae.LOADED_META = SimpleNamespace(songs=names)
+        ae.DTW_MODE = "global"
+        ae.VERIFY_POOL = None
+        ae.VERIFY_WORKERS = 2
+        ae.VERIFY_TIMEOUT = TIMEOUT
+        ae.dtw_score(fake_features(0)[0], fake_features(1)[0])  # Warm-up (numba compile)
+
+        # Request 1: every decode outlives the deadline
+        results, elapsed = run_request(slow_catalog_features)
+        print(f"Slow request: {len(results)} results in {elapsed:.2f}s")
+        assert results == [] and elapsed < TIMEOUT + 0.25
+
+        # Request 2, right after: its jobs must not queue behind the hung ones
+        results, elapsed = run_request(fast_catalog_features)
+        print(f"Next request: {len(results)} results in {elapsed:.2f}s")
+        assert len(results) == N_SONGS and elapsed < TIMEOUT
+        assert all(r["score"] > 99 for r in results)
+
+        # Slow query phase: the verify budget only starts at the DTW fan-out
+        results, elapsed = run_request(fast_catalog_features, slow_query_features)
+        print(f"Slow query phase: {len(results)} results in {elapsed:.2f}s")
+        assert len(results) == N_SONGS and elapsed > SLOW_QUERY
+
+        # Hung decodes on every request: retired pools (and their threads) stay bounded
+        threads = threading.active_count()
+        for _ in range(4):
+            run_request(slow_catalog_features)
+        print(f"Retired pools after 4 more hung requests: {len(ae.RETIRED_JOBS)}, "
+              f"{threading.active_count() - threads} extra threads")
+        assert len(ae.RETIRED_JOBS) <= ae.MAX_RETIRED_POOLS
+        assert threading.active_count() - threads <= ae.MAX_RETIRED_POOLS * ae.VERIFY_WORKERS
+
+    print("✅ A timed-out request does not starve the next one and verification survives a slow query phase")
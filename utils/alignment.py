@@ -0,0 +1,129 @@
+import numpy as np
+
+from utils.chunk_meta import REMOVED
+
+# A true match keeps query_time - catalog_time constant. Offsets are binned at the
+# index hop; a diagonal is two neighbouring bins, so an offset that falls between
+# two hops (matches jitter between them) still lands in one diagonal.
+OFFSET_BIN_SECONDS = 5
+
+# Verification decisions from the strongest diagonal (see Alignment.verdict)
+ALIGN_MIN_CHUNKS = 2            # Fewer aligned chunks than this: scattered votes, rejected
+                                # (only if the query has this many chunks; shorter ones go to DTW)
+ALIGN_ACCEPT_CHUNKS = 4         # Accepted without DTW from this many aligned chunks...
+ALIGN_ACCEPT_CONSISTENCY = 0.6  # ...if they are at least this share of the song's votes
+
+
+class Alignment:
+    """Strongest offset diagonal of one candidate song."""
+
+    def __init__(self, offset, chunks, votes, mean_sim, query_range, catalog_range, query_chunks=None):
+        self.offset = offset                # Seconds, query_time - catalog_time
+        self.chunks = chunks                # Query chunks on the diagonal
+        self.votes = votes                  # All votes of the song
+        self.query_chunks = query_chunks    # Query chunks searched (None: unknown)
+        self.mean_sim = mean_sim            # Mean similarity of the aligned chunks
+        self.query_range = query_range      # (start, end) seconds in the upload
+        self.catalog_range = catalog_range  # (start, end) seconds in the catalog song
+
+    @property
+    def consistency(self):
+        return self.chunks / max(self.votes, 1)
+
+    def verdict(self):
+        """'match', 'reject' or 'ambiguous' (only the last one needs DTW)."""
+        if self.chunks < ALIGN_MIN_CHUNKS:
+            # A query with fewer chunks (under 15 s at 10 s / 5 s windows) can never line up enough
+            if self.query_chunks is not None and self.query_chunks < ALIGN_MIN_CHUNKS:
+                return "ambiguous"
+            return "reject"
+        if self.chunks >= ALIGN_ACCEPT_CHUNKS and self.consistency >= ALIGN_ACCEPT_CONSISTENCY:
+            return "match"
+        return "ambiguous"
+
+    def to_dict(self):
+        return {"offset": self.offset, "chunks": self.chunks,
+                "query": list(self.query_range), "catalog": list(self.catalog_range)}
+
+
+class OffsetTally:
+    """
+    Keeps (song, query start, catalog start, similarity) for every vote next to
+    the VoteTally, so candidates can be checked for a consistent time alignment.
+    Same vote rule: idx != -1, dist >= threshold, chunk not removed.
+    """
+
+    def __init__(self, meta, threshold, query_chunk_size):
+        self.song_ids = meta.song_ids
+        self.starts = meta.starts
+        self.ends = meta.ends
+        self.threshold = threshold
+        self.query_chunk_size = query_chunk_size
+        self.n_queries = 0
+        self._parts = []
+
+    def add(self, D, I, query_starts):
+        """D, I: (n x k) search results for n query chunks starting at query_starts seconds."""
+        self.n_queries += len(I)
+        q = np.repeat(np.asarray(query_starts, dtype='int64'), I.shape[1])
+        d = D.ravel()
+        i = I.ravel()
+        keep = (i != -1) & (d >= self.threshold)
+        q, d, i = q[keep], d[keep], i[keep]
+        sids = np.asarray(self.song_ids[i], dtype='int64')
+        live = sids != REMOVED
+        self._parts.append((sids[live], q[live], i[live], d[live].astype('float64')))
+        return self
+
+    def best_diagonals(self, songs, bin_seconds=OFFSET_BIN_SECONDS):
+        """
+        Offset histogram per song in `songs` (one bincount over song x bin) and
+        its strongest two-bin diagonal. Returns {song ID: Alignment}.
+        """
+        songs = np.asarray(songs, dtype='int64')
+        if not self._parts or len(songs) == 0:
+            return {}
+        sids, q, chunk, sim = (np.concatenate(c) for c in zip(*self._parts))
+        rank = np.full(int(max(sids.max(), songs.max())) + 1, -1, dtype='int64')
+        rank[songs] = np.arange(len(songs))
+        sel = rank[sids] >= 0
+        r, q, chunk, sim = rank[sids[sel]], q[sel], chunk[sel], sim[sel]
+        if len(r) == 0:
+            return {}
+
+        c = np.asarray(self.starts[chunk], dtype='int64')
+        b = np.floor_divide(q - c, bin_seconds)
+        b -= b.min()
+        n_bins = int(b.max()) + 2  # Spare bin so every diagonal b, b+1 exists
+        hist = np.bincount(r * n_bins + b, minlength=len(songs) * n_bins).reshape(len(songs), n_bins)
+        diag = hist[:, :-1] + hist[:, 1:]
+        best = diag.argmax(axis=1)
+
+        on = (b == best[r]) | (b == best[r] + 1)
+        r_on, q_on, c_on, e_on = r[on], q[on], c[on], np.asarray(self.ends[chunk[on]], dtype='int64')
+        n = len(songs)
+        big, small = np.iinfo('int64').max, np.iinfo('int64').min
+        q_lo, c_lo = np.full(n, big), np.full(n, big)
+        q_hi, c_hi = np.full(n, small), np.full(n, small)
+        np.minimum.at(q_lo, r_on, q_on)
+        np.maximum.at(q_hi, r_on, q_on + int(self.query_chunk_size))
+        np.minimum.at(c_lo, r_on, c_on)
+        np.maximum.at(c_hi, r_on, e_on)
+        sim_sum = np.bincount(r_on, weights=sim[on], minlength=n)
+        # Median offset of the aligned chunks: the diagonal's actual offset, not its bin
+        off = q_on - c_on
+        order = np.lexsort((off, r_on))
+        counts = np.bincount(r_on, minlength=n)
+        first = np.r_[0, np.cumsum(counts)[:-1]]
+        votes = np.bincount(r, minlength=n)
+
+        out = {}
+        for j in np.flatnonzero(counts):
+            out[int(songs[j])] = Alignment(
+                offset=int(off[order][first[j] + counts[j] // 2]),
+                chunks=int(counts[j]), votes=int(votes[j]),
+                mean_sim=float(sim_sum[j] / counts[j]),
+                query_range=(int(q_lo[j]), int(q_hi[j])),
+                catalog_range=(int(c_lo[j]), int(c_hi[j])),
+                query_chunks=self.n_queries)
+        return out
@@ -0,0 +1,112 @@
+import hashlib
+import numpy as np
+import librosa
+import soundfile as sf
+
+
+class DecodedAudio:
+    """
+    Decodes an audio file once and serves resampled views of the PCM.
+
+    Every stage of a scan (OpenL3 at 48 kHz, chroma at 22.05 kHz) asks this
+    object for audio instead of calling librosa.load on the path again.
+    """
+
+    def __init__(self, path, duration=None):
+        # duration bounds the decode itself (e.g. catalog songs only need 60 s)
+        self.path = path
+        self.duration = duration
+        self.decode_count = 0
+        self._pcm = None
+        self._native_sr = None
+        self._views = {}
+
+    def _decode(self):
+        if self._pcm is None:
+            # Native rate + mono, exactly what librosa.load does before resampling
+            self._pcm, self._native_sr = librosa.load(self.path, sr=None, mono=True,
+                                                      duration=self.duration)
+            self.decode_count += 1
+        return self._pcm
+
+    def at(self, sr, duration=None, offset=0.0):
+        """
+        Returns the mono signal at `sr` from `offset` seconds on, optionally
+        truncated to `duration` seconds. Each sample rate is resampled once and
+        cached for later stages.
+        """
+        pcm = self._decode()
+        if sr not in self._views:
+            if sr == self._native_sr:
+                self._views[sr] = pcm
+            else:
+                self._views[sr] = librosa.resample(pcm, orig_sr=self._native_sr, target_sr=sr)
+        y = self._views[sr][int(round(offset * sr)):]
+        if duration is not None:
+            y = y[:int(duration * sr)]
+        return y
+
+    def release(self):
+        """Drops the PCM buffer and all resampled views."""
+        self._pcm = None
+        self._views = {}
+
+
+def as_decoded(audio):
+    """Accepts a file path or a DecodedAudio and always returns a DecodedAudio."""
+    if isinstance(audio, DecodedAudio):
+        return audio
+    return DecodedAudio(audio)
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-1 of the file contents, used to key cached per-song features."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def audio_duration(path):
+    """Duration in seconds from the file header (no full decode), or None."""
+    try:
+        return librosa.get_duration(path=path)
+    except Exception:
+        return None
+
+
+def stream_pcm(path, block_seconds=30.0):
+    """
+    Yields (mono float32 block, native sr) without ever holding the whole file.
+    Uses soundfile when it can read the format, audioread (ffmpeg) otherwise.
+    A soundfile error after the first block is re-raised: falling back then
+    would stream the file again from the start and duplicate audio.
+    """
+    yielded = False
+    try:
+        with sf.SoundFile(path) as f:
+            sr = f.samplerate
+            for block in f.blocks(blocksize=int(block_seconds * sr), dtype='float32', always_2d=True):
+                yielded = True
+                yield block.mean(axis=1), sr
+        return
+    except RuntimeError:
+        if yielded:
+            raise
+
+    import audioread
+    with audioread.audio_open(path) as f:
+        sr, channels = f.samplerate, f.channels
+        target = int(block_seconds * sr)
+        pending, n_pending = [], 0
+        for buf in f:
+            pcm = np.frombuffer(buf, dtype='<i2').astype('float32') / 32768.0
+            pcm = pcm.reshape(-1, channels).mean(axis=1)
+            pending.append(pcm)
+            n_pending += len(pcm)
+            if n_pending >= target:
+                yield np.concatenate(pending), sr
+                pending, n_pending = [], 0
+        if pending:
+            yield np.concatenate(pending), sr
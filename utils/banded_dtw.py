@@ -0,0 +1,161 @@
+import numpy as np
+import numba
+
+# Sakoe-Chiba band half-width as a fraction of the longer sequence. The band is
+# centred on the straight line from (0, 0) to (N-1, M-1), so sequences of
+# different lengths (tempo changes) keep their diagonal inside it.
+DTW_BAND = 0.1
+
+
+@numba.njit(cache=True, nogil=True)
+def _banded_dtw(A, B, radius):
+    """
+    DTW over the cosine cost 1 - A[i].B[j] (rows pre-normalized), same steps,
+    weights and tie-breaking as librosa.sequence.dtw: diagonal, then (i, j-1),
+    then (i-1, j). Only two cost rows (float32) and their path lengths are kept;
+    the path length of a cell is that of the step chosen into it, i.e. the
+    length librosa's backtracking would return. Returns (total cost, path length).
+    """
+    N, M = A.shape[0], B.shape[0]
+    inf = np.float32(np.inf)
+    prev = np.full(M, inf, dtype=np.float32)
+    cur = np.full(M, inf, dtype=np.float32)
+    prev_len = np.zeros(M, dtype=np.int32)
+    cur_len = np.zeros(M, dtype=np.int32)
+    slope = (M - 1) / (N - 1) if N > 1 else 0.0
+    # Window [lo, hi] of the row held in prev and of the stale row in cur
+    prev_lo, prev_hi = 0, -1
+    stale_lo, stale_hi = 0, -1
+
+    for i in range(N):
+        c = int(i * slope + 0.5)
+        lo = 0 if i == 0 else max(0, c - radius)
+        hi = M - 1 if i == N - 1 else min(M - 1, c + radius)
+        for j in range(stale_lo, stale_hi + 1):
+            cur[j] = inf
+
+        for j in range(lo, hi + 1):
+            dot = np.float32(0.0)
+            for f in range(A.shape[1]):
+                dot += A[i, f] * B[j, f]
+            cost = np.float32(1.0) - dot
+
+            if i == 0 and j == 0:
+                cur[j] = cost
+                cur_len[j] = 1
+                continue
+            best = inf
+            length = 0
+            if i > 0 and j > 0 and prev[j - 1] < best:
+                best = prev[j - 1]
+                length = prev_len[j - 1]
+            if j > 0 and cur[j - 1] < best:
+                best = cur[j - 1]
+                length = cur_len[j - 1]
+            if i > 0 and prev[j] < best:
+                best = prev[j]
+                length = prev_len[j]
+            cur[j] = best + cost
+            cur_len[j] = length + 1
+
+        prev, cur = cur, prev
+        prev_len, cur_len = cur_len, prev_len
+        stale_lo, stale_hi = prev_lo, prev_hi
+        prev_lo, prev_hi = lo, hi
+
+    return prev[M - 1], prev_len[M - 1]
+
+
+@numba.njit(cache=True, nogil=True)
+def _subsequence_dtw(A, B):
+    """
+    Subsequence DTW of query A inside B, as librosa.sequence.dtw(subseq=True):
+    the path may start at any column of row 0 (no cost carried along it) and
+    ends at the column of row N-1 with the lowest accumulated cost. Start columns
+    are carried forward like path lengths. Returns (total, length, start, end).
+    """
+    N, M = A.shape[0], B.shape[0]
+    inf = np.float32(np.inf)
+    prev = np.full(M, inf, dtype=np.float32)
+    cur = np.empty(M, dtype=np.float32)
+    prev_len = np.zeros(M, dtype=np.int32)
+    cur_len = np.zeros(M, dtype=np.int32)
+    prev_start = np.zeros(M, dtype=np.int32)
+    cur_start = np.zeros(M, dtype=np.int32)
+
+    for i in range(N):
+        for j in range(M):
+            dot = np.float32(0.0)
+            for f in range(A.shape[1]):
+                dot += A[i, f] * B[j, f]
+            cost = np.float32(1.0) - dot
+
+            if i == 0:
+                cur[j] = cost
+                cur_len[j] = 1
+                cur_start[j] = j
+                continue
+            best = prev[j - 1] if j > 0 else inf
+            length = prev_len[j - 1] if j > 0 else 0
+            start = prev_start[j - 1] if j > 0 else 0
+            if j > 0 and cur[j - 1] < best:
+                best = cur[j - 1]
+                length = cur_len[j - 1]
+                start = cur_start[j - 1]
+            if prev[j] < best:
+                best = prev[j]
+                length = prev_len[j]
+                start = prev_start[j]
+            cur[j] = best + cost
+            cur_len[j] = length + 1
+            cur_start[j] = start
+
+        prev, cur = cur, prev
+        prev_len, cur_len = cur_len, prev_len
+        prev_start, cur_start = cur_start, prev_start
+
+    end = 0
+    for j in range(1, M):
+        if prev[j] < prev[end]:
+            end = j
+    return prev[end], prev_len[end], prev_start[end], end
+
+
+def band_radius(n, m, band=DTW_BAND):
+    """Half-width in frames; never narrower than the slope, so the band stays connected."""
+    if band is None:
+        return max(n, m)
+    steep = int(np.ceil(max(n, m) / max(min(n, m), 1)))
+    return max(int(band * max(n, m)), steep, 1)
+
+
+def _unit_frames(chroma):
+    X = np.ascontiguousarray(np.asarray(chroma, dtype=np.float32).T)
+    return X / (np.linalg.norm(X, axis=1, keepdims=True) + np.float32(1e-12))
+
+
+def dtw_cost(c1, c2, band=DTW_BAND):
+    """
+    Path-normalized DTW cost (D[-1, -1] / path length) between two chroma
+    matrices (12 x Frames), as librosa.sequence.dtw over cdist(c1.T, c2.T,
+    'cosine') gives it, restricted to a Sakoe-Chiba band (band=None: full DTW).
+    The cost matrix is never materialized: memory is O(frames), not O(N*M).
+    """
+    A, B = _unit_frames(c1), _unit_frames(c2)
+    if len(A) == 0 or len(B) == 0:
+        raise ValueError("Empty chroma sequence.")
+    total, length = _banded_dtw(A, B, band_radius(len(A), len(B), band))
+    return float(total) / int(length)
+
+
+def subsequence_dtw(query, catalog):
+    """
+    Best-matching span of `query` chroma anywhere inside `catalog` chroma (both
+    12 x Frames). Returns (path-normalized cost, start frame, end frame) with the
+    end exclusive. O(N*M) time on the fly, O(M) memory.
+    """
+    A, B = _unit_frames(query), _unit_frames(catalog)
+    if len(A) == 0 or len(B) == 0:
+        raise ValueError("Empty chroma sequence.")
+    total, length, start, end = _subsequence_dtw(A, B)
+    return float(total) / int(length), int(start), int(end) + 1
@@ -0,0 +1,45 @@
+import os
+import numpy as np
+
+from utils.feature_store import FeatureStoreWriter, FeatureStore
+from utils.chroma_store import CHROMA_SR, CHROMA_HOP
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BEAT_STORE_PATH = os.path.join(ROOT_DIR, "data", "beat_store.i32")
+BEAT_INDEX_PATH = os.path.join(ROOT_DIR, "data", "beat_store.json")
+
+
+class BeatStoreWriter(FeatureStoreWriter):
+    """Per-song beat positions (chroma frame indices, int32) for beat-synchronous DTW."""
+
+    def __init__(self, store_path=BEAT_STORE_PATH, index_path=BEAT_INDEX_PATH):
+        super().__init__(store_path, index_path, 1, "int32", attrs={"sr": CHROMA_SR, "hop": CHROMA_HOP})
+
+    def add(self, name, content_hash, beats):
+        self.add_frames(name, content_hash, beats)
+
+    def close(self):
+        super().close()
+        print(f"✅ Beat store written ({len(self.songs)} songs, {self.offset} beats).")
+
+
+class BeatStore(FeatureStore):
+    """Read-only, memory-mapped view over the beat store."""
+
+    def __init__(self, store_path=BEAT_STORE_PATH, index_path=BEAT_INDEX_PATH):
+        super().__init__(store_path, index_path)
+
+    def get(self, name, content_hash=None):
+        """Returns the beat frame indices of `name`, or None if missing or stale."""
+        beats = self.frames(name, content_hash=content_hash)
+        return None if beats is None else np.asarray(beats[:, 0])
+
+
+def load_beat_store():
+    if not os.path.exists(BEAT_INDEX_PATH) or not os.path.exists(BEAT_STORE_PATH):
+        return None
+    try:
+        return BeatStore()
+    except Exception as e:
+        print(f"⚠️ Beat store unreadable: {e}")
+        return None
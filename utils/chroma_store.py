@@ -0,0 +1,142 @@
+import os
+import numpy as np
+import librosa
+
+from utils.audio_utils import DecodedAudio
+from utils.feature_store import FeatureStoreWriter, FeatureStore
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHROMA_STORE_PATH = os.path.join(ROOT_DIR, "data", "chroma_store.f32")
+CHROMA_INDEX_PATH = os.path.join(ROOT_DIR, "data", "chroma_store.json")
+
+CHROMA_SR = 22050
+CHROMA_HOP = 512
+N_CHROMA = 12
+
+# Picking the best key also lifts songs that do not match; a DTW similarity found
+# at a non-zero key offset is rescaled from this floor to 1.0, per DTW mode, which
+# puts their mean back at the plain-DTW level (fitted by eval_transposition.py)
+TRANSPOSE_SIM_FLOOR = {"global": 0.28, "subsequence": 0.23}
+
+# Subsequence DTW takes the best-matching span of the whole catalog song, which
+# lifts songs that do not match above their global-DTW scores; its similarity is
+# rescaled from this floor so both DTW modes share one score scale (eval_subsequence.py)
+SUBSEQ_SIM_FLOOR = 0.34
+
+
+def compute_chroma(audio, sr=CHROMA_SR, duration=None, offset=0.0):
+    """
+    CQT chroma exactly as the DTW verifiers compute it, of `duration` seconds
+    from `offset` on. `audio` may be a path or a DecodedAudio. Returns shape (12, Frames).
+    """
+    if not isinstance(audio, DecodedAudio):
+        audio = DecodedAudio(audio, duration=None if duration is None else offset + duration)
+    y = audio.at(sr, duration=duration, offset=offset)
+    return librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=CHROMA_HOP).astype(np.float32)
+
+
+def compute_beats(audio, sr=CHROMA_SR, duration=None, offset=0.0):
+    """
+    Beat positions in chroma frame units (same sr, hop and offset as compute_chroma).
+    `audio` may be a path or a DecodedAudio.
+    """
+    if not isinstance(audio, DecodedAudio):
+        audio = DecodedAudio(audio, duration=None if duration is None else offset + duration)
+    _, beats = librosa.beat.beat_track(y=audio.at(sr, duration=duration, offset=offset), sr=sr,
+                                       hop_length=CHROMA_HOP)
+    return np.asarray(beats, dtype=np.int32)
+
+
+def sync_chroma(chroma, boundaries, sr=CHROMA_SR, hop=CHROMA_HOP):
+    """
+    Median chroma between consecutive frame boundaries (beats, or every n-th
+    frame). Returns (features (12, Segments), bounds) where bounds are the
+    Segments + 1 segment edges in seconds.
+    """
+    n = chroma.shape[1]
+    edges = librosa.util.fix_frames(np.asarray(boundaries), x_min=0, x_max=n, pad=True)
+    edges = edges[edges <= n]
+    features = librosa.util.sync(chroma, edges, aggregate=np.median, pad=False).astype(np.float32)
+    return features, edges * hop / sr
+
+
+def transpose_chroma(chroma, semitones):
+    """Chroma shifted down by `semitones` (undoes a transposition up by that many)."""
+    return np.roll(chroma, -semitones, axis=0)
+
+
+def transposition_candidates(query, catalog, n=1):
+    """
+    Optimal transposition index: scores all 12 circular shifts of the catalog's
+    global chroma profile against the query's in one 12 x 12 product and returns
+    the n best offsets (0 included, like any other shift), in semitones (-5..6)
+    the query is above the catalog song.
+    """
+    q = query.mean(axis=1)
+    r = catalog.mean(axis=1)
+    q = q / (np.linalg.norm(q) + 1e-12)
+    r = r / (np.linalg.norm(r) + 1e-12)
+    # shifted[k, p] = r[p - k]: the catalog profile transposed up k semitones
+    shifted = r[(np.arange(N_CHROMA)[None, :] - np.arange(N_CHROMA)[:, None]) % N_CHROMA]
+    order = np.argsort(-(shifted @ q), kind='stable')
+    return [int(k) if k <= N_CHROMA // 2 else int(k) - N_CHROMA for k in order[:n]]
+
+
+def rescale_similarity(sim, floor):
+    """Maps a DTW similarity (1 - cost) from floor..1 onto 0..1 (0 below the floor)."""
+    return max((sim - floor) / (1.0 - floor), 0.0)
+
+
+def transposed_similarity(sim, semitones, mode):
+    """DTW similarity (1 - cost) recalibrated for the key offset it was found at; unshifted ones are unchanged."""
+    if semitones == 0:
+        return sim
+    return rescale_similarity(sim, TRANSPOSE_SIM_FLOOR[mode])
+
+
+def frames_for_duration(duration, sr=CHROMA_SR, hop=CHROMA_HOP):
+    """Number of chroma frames librosa produces for `duration` seconds of audio."""
+    return 1 + int(duration * sr) // hop
+
+
+class ChromaStoreWriter(FeatureStoreWriter):
+    """Per-song CQT chroma, stored Frames x 12 in float32."""
+
+    def __init__(self, store_path=CHROMA_STORE_PATH, index_path=CHROMA_INDEX_PATH):
+        super().__init__(store_path, index_path, N_CHROMA, "float32",
+                         attrs={"sr": CHROMA_SR, "hop": CHROMA_HOP})
+
+    def add(self, name, content_hash, chroma):
+        self.add_frames(name, content_hash, chroma.T)
+
+    def close(self):
+        super().close()
+        print(f"✅ Chroma store written ({len(self.songs)} songs, {self.offset} frames).")
+
+
+class ChromaStore(FeatureStore):
+    """Read-only, memory-mapped view over a chroma store written by ChromaStoreWriter."""
+
+    def __init__(self, store_path=CHROMA_STORE_PATH, index_path=CHROMA_INDEX_PATH):
+        super().__init__(store_path, index_path)
+        self.sr = self.info["sr"]
+        self.hop = self.info["hop"]
+
+    def get(self, name, duration=None, content_hash=None):
+        """
+        Returns chroma (12, Frames) for `name`, or None if missing or stale.
+        Pass `content_hash` to reject entries built from a different file.
+        """
+        n = None if duration is None else frames_for_duration(duration, self.sr, self.hop)
+        frames = self.frames(name, n, content_hash)
+        return None if frames is None else frames.T
+
+
+def load_chroma_store():
+    if not os.path.exists(CHROMA_INDEX_PATH) or not os.path.exists(CHROMA_STORE_PATH):
+        return None
+    try:
+        return ChromaStore()
+    except Exception as e:
+        print(f"⚠️ Chroma store unreadable, falling back to decoding: {e}")
+        return None
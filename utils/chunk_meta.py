@@ -0,0 +1,145 @@
+import os
+import json
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# <prefix>.songs.json : song table (filenames)
+# <prefix>.chunks.npy : (3, N) int32 columns [song_id, start_s, end_s], row = chunk ID
+META_PREFIX = os.path.join(ROOT_DIR, "data", "audio_chunked_meta")
+LEGACY_JSON_PATH = META_PREFIX + ".json"
+
+REMOVED = -1  # song_id of a chunk dropped by an incremental update
+
+
+def songs_path(prefix):
+    return prefix + ".songs.json"
+
+
+def chunks_path(prefix):
+    return prefix + ".chunks.npy"
+
+
+class ChunkMeta:
+    """
+    Columnar chunk metadata. Chunk ID i has song songs[song_ids[i]] and spans
+    starts[i]..ends[i] seconds. Loaded columns are read-only memmaps; add_song
+    and remove switch to an in-memory copy.
+    """
+
+    def __init__(self, songs=None, columns=None):
+        self.songs = list(songs or [])
+        self._song_index = {name: i for i, name in enumerate(self.songs)}
+        self._columns = columns if columns is not None else np.empty((3, 0), dtype='int32')
+        self._pending = []
+
+    @property
+    def columns(self):
+        if self._pending:
+            self._columns = np.concatenate([self._columns] + self._pending, axis=1)
+            self._pending = []
+        return self._columns
+
+    @property
+    def song_ids(self):
+        return self.columns[0]
+
+    @property
+    def starts(self):
+        return self.columns[1]
+
+    @property
+    def ends(self):
+        return self.columns[2]
+
+    def __len__(self):
+        return self._columns.shape[1] + sum(p.shape[1] for p in self._pending)
+
+    def add_song(self, name, spans):
+        """Appends one chunk per (start, end) span; returns the first new chunk ID."""
+        first_id = len(self)
+        if name not in self._song_index:
+            self._song_index[name] = len(self.songs)
+            self.songs.append(name)
+        spans = np.asarray(spans, dtype='int32').reshape(-1, 2)
+        block = np.empty((3, len(spans)), dtype='int32')
+        block[0] = self._song_index[name]
+        block[1:] = spans.T
+        self._pending.append(block)
+        return first_id
+
+    def remove(self, ids):
+        """Marks chunk IDs as removed; IDs of the other chunks never move."""
+        cols = self.columns
+        if not cols.flags.writeable:
+            cols = self._columns = np.array(cols)
+        cols[0, np.asarray(ids, dtype='int64')] = REMOVED
+
+    def name(self, i):
+        sid = self.song_ids[i]
+        return None if sid == REMOVED else self.songs[sid]
+
+    def __getitem__(self, i):
+        """Same shape as an audio_chunked_meta.json entry ({"name", "time"} or None)."""
+        name = self.name(i)
+        if name is None:
+            return None
+        return {"name": name, "time": f"{self.starts[i]}-{self.ends[i]}s"}
+
+    def song_chunks(self):
+        """{song name: sorted list of live chunk IDs}."""
+        ids = self.song_ids
+        live = np.flatnonzero(ids != REMOVED)
+        order = live[np.argsort(ids[live], kind='stable')]
+        bounds = np.flatnonzero(np.diff(ids[order])) + 1
+        return {self.songs[ids[group[0]]]: group.tolist() for group in np.split(order, bounds) if len(group)}
+
+    def save(self, prefix=META_PREFIX):
+        # Song table first, so the chunk columns never point past its end
+        tmp = songs_path(prefix) + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.songs, f)
+        os.replace(tmp, songs_path(prefix))
+        tmp = chunks_path(prefix) + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.columns))
+        os.replace(tmp, chunks_path(prefix))
+
+
+def parse_time(text):
+    """'0-10s' -> (0, 10)."""
+    start, end = text.rstrip('s').split('-')
+    return int(float(start)), int(float(end))
+
+
+def from_json_entries(entries):
+    """Builds ChunkMeta from the legacy list of {"name", "time"} dicts (None = removed)."""
+    song_index = {}
+    columns = np.zeros((3, len(entries)), dtype='int32')
+    for i, entry in enumerate(entries):
+        if entry is None:
+            columns[0, i] = REMOVED
+            continue
+        columns[0, i] = song_index.setdefault(entry['name'], len(song_index))
+        columns[1:, i] = parse_time(entry['time'])
+    return ChunkMeta(list(song_index), columns)
+
+
+def exists(prefix=META_PREFIX):
+    return os.path.exists(chunks_path(prefix)) and os.path.exists(songs_path(prefix))
+
+
+def load_chunk_meta(prefix=META_PREFIX, mmap=True):
+    """
+    Loads the columnar metadata (memory-mapped by default), or converts the
+    legacy JSON file in memory if only that exists. Returns None if neither does.
+    """
+    if exists(prefix):
+        with open(songs_path(prefix), 'r') as f:
+            songs = json.load(f)
+        columns = np.load(chunks_path(prefix), mmap_mode='r' if mmap else None)
+        return ChunkMeta(songs, columns)
+    legacy = prefix + ".json"
+    if os.path.exists(legacy):
+        with open(legacy, 'r') as f:
+            return from_json_entries(json.load(f))
+    return None
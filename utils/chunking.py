@@ -0,0 +1,87 @@
+import numpy as np
+
+CHUNK_SIZE = 10.0  # Seconds
+HOP_SIZE = 5.0  # Seconds (Overlap)
+
+
+def whole_seconds(seconds, name="hop_size"):
+    """`seconds` as an int; ValueError unless it is a positive whole number (windows are whole seconds)."""
+    if seconds <= 0 or seconds != int(seconds):
+        raise ValueError(f"{name} must be a positive whole number of seconds, got {seconds}.")
+    return int(seconds)
+
+
+def chunk_spans(num_seconds, chunk_size=CHUNK_SIZE, hop_size=HOP_SIZE):
+    """
+    Window (start, end) seconds as two int arrays. The last partial window is
+    dropped unless it is the only one (short files keep a single 0-chunk window).
+    """
+    starts = np.arange(0, num_seconds, whole_seconds(hop_size))
+    ends = starts + whole_seconds(chunk_size, "chunk_size")
+    keep = (ends <= num_seconds) | (starts == 0)
+    return starts[keep], ends[keep]
+
+
+def pool_chunks(full_emb, chunk_size=CHUNK_SIZE, hop_size=HOP_SIZE):
+    """
+    Mean-pools per-second embeddings (T x D) into sliding chunks in one
+    vectorized pass (cumulative-sum sliding mean, no per-window np.mean).
+    Returns (pooled (N x D) float32, list of (start, end) seconds).
+    """
+    if full_emb.ndim == 1: full_emb = full_emb.reshape(1, -1)
+    num_seconds = full_emb.shape[0]
+
+    starts, ends = chunk_spans(num_seconds, chunk_size, hop_size)
+    if len(starts) == 0:
+        return np.empty((0, full_emb.shape[1]), dtype='float32'), []
+
+    # csum[i] = sum of the first i frames (float64 keeps long sums exact enough)
+    csum = np.zeros((num_seconds + 1, full_emb.shape[1]), dtype=np.float64)
+    np.cumsum(full_emb, axis=0, dtype=np.float64, out=csum[1:])
+    clipped = np.minimum(ends, num_seconds)
+    pooled = (csum[clipped] - csum[starts]) / (clipped - starts)[:, None]
+
+    return pooled.astype('float32'), list(zip(starts.tolist(), ends.tolist()))
+
+
+def normalize_rows(X):
+    """L2-normalizes every row (raw 512-d fallback when no adapter is trained)."""
+    X = np.asarray(X, dtype='float32')
+    return X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
+
+
+def stream_pool_chunks(frame_blocks, chunk_size=CHUNK_SIZE, hop_size=HOP_SIZE):
+    """
+    Incremental pool_chunks over an iterable of (n x D) per-second blocks
+    (e.g. stream_openl3_embedding). Yields (pooled, spans) as soon as windows
+    are complete and only keeps the frames the next window still needs, so
+    memory is bounded by chunk_size. Output matches pool_chunks on the
+    concatenated frames.
+    """
+    chunk, hop = whole_seconds(chunk_size, "chunk_size"), whole_seconds(hop_size)
+    buf = None
+    base = 0  # Absolute second of buf[0] (always the next window start)
+    total = 0
+    emitted = False
+
+    for block in frame_blocks:
+        if block is None or len(block) == 0: continue
+        if block.ndim == 1: block = block.reshape(1, -1)
+        total += len(block)
+        buf = block if buf is None else np.vstack([buf, block])
+
+        # Complete windows inside buf: starts 0, hop, ... with start + chunk <= len(buf)
+        n_windows = 0 if len(buf) < chunk else 1 + (len(buf) - chunk) // hop
+        if n_windows == 0: continue
+        pooled, spans = pool_chunks(buf[:(n_windows - 1) * hop + chunk], chunk, hop)
+        pooled, spans = pooled[:n_windows], spans[:n_windows]
+        yield pooled, [(s + base, e + base) for s, e in spans]
+        emitted = True
+
+        buf = buf[n_windows * hop:]
+        base += n_windows * hop
+
+    # Short upload: pool_chunks keeps one partial window starting at 0
+    if not emitted and total > 0:
+        pooled, spans = pool_chunks(buf, chunk, hop)
+        yield pooled, spans
@@ -0,0 +1,48 @@
+import os
+
+from utils.feature_store import FeatureStoreWriter, FeatureStore
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBEDDING_STORE_PATH = os.path.join(ROOT_DIR, "data", "openl3_store.f16")
+EMBEDDING_INDEX_PATH = os.path.join(ROOT_DIR, "data", "openl3_store.json")
+
+EMBEDDING_DIM = 512
+
+
+class EmbeddingStoreWriter(FeatureStoreWriter):
+    """
+    Raw per-second OpenL3 embeddings (Seconds x 512) in float16, so rechunking,
+    re-adapting and triplet generation never need to run OpenL3 again.
+    """
+
+    def __init__(self, store_path=EMBEDDING_STORE_PATH, index_path=EMBEDDING_INDEX_PATH):
+        super().__init__(store_path, index_path, EMBEDDING_DIM, "float16", attrs={"hop_seconds": 1.0})
+
+    def add(self, name, content_hash, embedding):
+        self.add_frames(name, content_hash, embedding)
+
+    def close(self):
+        super().close()
+        print(f"✅ OpenL3 store written ({len(self.songs)} songs, {self.offset} seconds).")
+
+
+class EmbeddingStore(FeatureStore):
+    """Read-only, memory-mapped view over the raw OpenL3 store."""
+
+    def __init__(self, store_path=EMBEDDING_STORE_PATH, index_path=EMBEDDING_INDEX_PATH):
+        super().__init__(store_path, index_path)
+
+    def get(self, name, content_hash=None):
+        """Returns the (Seconds, 512) embedding as float32, or None if missing/stale."""
+        frames = self.frames(name, content_hash=content_hash)
+        return None if frames is None else frames.astype('float32')
+
+
+def load_embedding_store():
+    if not os.path.exists(EMBEDDING_INDEX_PATH) or not os.path.exists(EMBEDDING_STORE_PATH):
+        return None
+    try:
+        return EmbeddingStore()
+    except Exception as e:
+        print(f"⚠️ OpenL3 store unreadable: {e}")
+        return None
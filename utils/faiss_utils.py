@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import faiss
+import numpy as np
+
+# Index types selectable at build time (all inner product / cosine on unit vectors).
+# sq8 / fp16 / pq store compressed codes: 4x / 2x / 16x smaller than float32;
+# ivfpq combines PQ codes with IVF lists (compressed and sublinear).
+INDEX_TYPES = ("flat", "ivf", "hnsw", "sq8", "fp16", "pq", "ivfpq")
+
+# Defaults; nlist=None picks ~4*sqrt(N) capped so every list gets >= 39 training points
+IVF_NLIST = None
+IVF_NPROBE = 16
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 128
+PQ_SUBVECTOR_DIMS = 4  # d/4 one-byte codes per vector
+RERANK_SHORTLIST = 32  # Candidates re-scored exactly per query when re-ranking
+RERANK_GATHER_MB = 64  # Cap on the float32 rows gathered per re-rank block (bounds large batch searches)
+
+# Maps flat codes and IVF lists straight from the file (read-only, shared page cache).
+# Older FAISS builds only have IO_FLAG_MMAP, which maps IVF lists but copies flat codes.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def default_nlist(n):
+    return int(max(1, min(4 * np.sqrt(n), n // 39)))
+
+
+def make_index(X, index_type="flat", nlist=IVF_NLIST, nprobe=IVF_NPROBE, hnsw_m=HNSW_M,
+               ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH, ids=None,
+               pq_dims=PQ_SUBVECTOR_DIMS):
+    """
+    Builds (and trains, for IVF) an inner-product index over X.
+    With `ids`, vector i is stored under ids[i] (IVF natively, others via IndexIDMap2).
+    Returns (index, params) where params is what save_index persists next to it.
+    """
+    X = np.ascontiguousarray(X, dtype='float32')
+    d = X.shape[1]
+    params = {"type": index_type, "ntotal": int(len(X)), "d": int(d)}
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif index_type == "ivf":
+        nlist = nlist or default_nlist(len(X))
+        quantizer = faiss.IndexFlatIP(d)
+        index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(X)
+        index.nprobe = min(nprobe, nlist)
+        params.update(nlist=int(nlist), nprobe=int(index.nprobe))
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        index.hnsw.efSearch = ef_search
+        params.update(M=int(hnsw_m), efConstruction=int(ef_construction), efSearch=int(ef_search))
+    elif index_type in ("sq8", "fp16"):
+        qtype = faiss.ScalarQuantizer.QT_8bit if index_type == "sq8" else faiss.ScalarQuantizer.QT_fp16
+        index = faiss.IndexScalarQuantizer(d, qtype, faiss.METRIC_INNER_PRODUCT)
+        index.train(X)
+    elif index_type in ("pq", "ivfpq"):
+        m = max(1, d // pq_dims)
+        while d % m:
+            m -= 1
+        # 256 centroids per sub-quantizer need at least 256 training vectors
+        nbits = 8 if len(X) >= 256 else max(1, int(np.log2(max(len(X), 2))))
+        if index_type == "pq":
+            index = faiss.IndexPQ(d, m, nbits, faiss.METRIC_INNER_PRODUCT)
+        else:
+            nlist = nlist or default_nlist(len(X))
+            quantizer = faiss.IndexFlatIP(d)
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = min(nprobe, nlist)
+            params.update(nlist=int(nlist), nprobe=int(index.nprobe))
+        index.train(X)
+        params.update(M=int(m), nbits=int(nbits))
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from {INDEX_TYPES}.")
+
+    if ids is None:
+        index.add(X)
+    else:
+        if not isinstance(index, faiss.IndexIVF):
+            index = faiss.IndexIDMap2(index)
+        index.add_with_ids(X, np.asarray(ids, dtype='int64'))
+    return index, params
+
+
+def params_path(index_path):
+    return index_path + ".params.json"
+
+
+def write_index_atomic(index, index_path):
+    """
+    faiss.write_index to a temp file next to index_path, then os.replace: app
+    workers that memory-mapped the old file keep their (unlinked) copy instead
+    of seeing it truncated under them.
+    """
+    tmp = index_path + ".tmp"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, index_path)
+
+
+def save_index(index, index_path, params=None):
+    """Writes the FAISS index plus its build/search parameters (<index>.params.json)."""
+    write_index_atomic(index, index_path)
+    if params is None:
+        params = {"type": "flat", "ntotal": int(index.ntotal), "d": int(index.d)}
+    params = dict(params, ntotal=int(index.ntotal))
+    tmp = params_path(index_path) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(params, f, indent=2)
+    os.replace(tmp, params_path(index_path))
+
+
+def apply_search_params(index, params):
+    """Restores query-time knobs (nprobe / efSearch) that older FAISS builds may not persist."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexIVF) and "nprobe" in params:
+        base.nprobe = params["nprobe"]
+    if isinstance(base, faiss.IndexHNSW) and "efSearch" in params:
+        base.hnsw.efSearch = params["efSearch"]
+    return index
+
+
+def load_params(index_path):
+    if not os.path.exists(params_path(index_path)):
+        return None
+    with open(params_path(index_path), 'r') as f:
+        return json.load(f)
+
+
+def exact_path(index_path):
+    return index_path + ".exact.f32"
+
+
+def save_exact_vectors(X, index_path):
+    """Full-precision vectors, one row per chunk ID, for exact re-ranking of compressed indexes."""
+    # Replaced, never rewritten in place: RerankedIndex maps this file
+    tmp = exact_path(index_path) + ".tmp"
+    np.ascontiguousarray(X, dtype='float32').tofile(tmp)
+    os.replace(tmp, exact_path(index_path))
+
+
+def append_exact_vectors(X, index_path):
+    """Appends rows for freshly assigned IDs (IDs are only ever appended, see update())."""
+    with open(exact_path(index_path), 'ab') as f:
+        np.ascontiguousarray(X, dtype='float32').tofile(f)
+
+
+def load_exact_vectors(index_path, d):
+    """Read-only (N, d) memmap of the exact vectors, or None if they were not saved."""
+    path = exact_path(index_path)
+    if not os.path.exists(path):
+        return None
+    n = os.path.getsize(path) // (4 * d)
+    if n == 0:
+        return np.empty((0, d), dtype='float32')
+    return np.memmap(path, dtype='float32', mode='r', shape=(n, d))
+
+
+class RerankedIndex:
+    """
+    Searches a shortlist on the compressed codes, then re-scores it against the
+    memory-mapped float32 vectors. Returned similarities are exact; only the
+    shortlisted rows are ever paged in. Everything else is delegated to `index`.
+    """
+
+    def __init__(self, index, exact, shortlist=RERANK_SHORTLIST):
+        self.index = index
+        self.exact = exact
+        self.shortlist = shortlist
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+    def search(self, Q, k):
+        Q = np.ascontiguousarray(Q, dtype='float32')
+        _, I = self.index.search(Q, max(k, self.shortlist))
+        # Queries are re-scored in blocks so the (block, shortlist, d) gather stays bounded
+        block = max(1, int(RERANK_GATHER_MB * 2 ** 20) // (I.shape[1] * self.index.d * 4))
+        D = np.empty(I.shape, dtype='float32')
+        for a in range(0, len(Q), block):
+            I_b = I[a:a + block]
+            rows = self.exact[np.where(I_b >= 0, I_b, 0)]  # (block, shortlist, d)
+            D[a:a + block] = np.einsum('qsd,qd->qs', rows, Q[a:a + block])
+        D[I < 0] = -np.finfo('float32').max  # Same filler FAISS uses for missing results
+        order = np.argsort(-D, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(D, order, 1), np.take_along_axis(I, order, 1)
+
+
+def load_index(index_path, rerank=True, mmap=False):
+    """
+    faiss.read_index plus the persisted search parameters, if any. Indexes built
+    with exact re-ranking come back wrapped in a RerankedIndex (rerank=False
+    returns the bare FAISS index, e.g. for incremental updates).
+    mmap=True maps the vectors instead of copying them; the index is then read-only.
+    """
+    index = faiss.read_index(index_path, MMAP_FLAGS if mmap else 0)
+    params = load_params(index_path)
+    if params:
+        apply_search_params(index, params)
+        if rerank and params.get("rerank"):
+            exact = load_exact_vectors(index_path, index.d)
+            if exact is not None:
+                return RerankedIndex(index, exact)
+    return index
+
+
+def as_id_map(index):
+    """
+    Returns an index that supports add_with_ids/remove_ids by stable ID.
+    Positional flat (or flat-code: SQ/PQ) indexes are wrapped in an IndexIDMap2
+    of the same kind whose IDs equal the old positions; IVF indexes store IDs
+    natively. HNSW cannot remove vectors.
+    """
+    if isinstance(index, faiss.IndexIDMap2) or isinstance(index, faiss.IndexIVF):
+        return index
+    if isinstance(index, faiss.IndexHNSW):
+        raise ValueError("HNSW indexes do not support removing vectors. Run a full build.")
+    xb = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), dtype='float32')
+    # Same (trained) quantizer, no vectors; re-encoding a decoded code gives the same code
+    base = faiss.clone_index(index)
+    base.reset()
+    mapped = faiss.IndexIDMap2(base)
+    if len(xb):
+        mapped.add_with_ids(xb, np.arange(len(xb), dtype='int64'))
+    return mapped
+
+
+def ivf_ids(index):
+    """All IDs stored in an IVF index's inverted lists (int64 array, list order)."""
+    invlists = index.invlists
+    parts = [faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+             for l in range(index.nlist) if invlists.list_size(l)]
+    return np.concatenate(parts) if parts else np.empty(0, dtype='int64')
+
+
+def vectors_by_id(index, n_ids):
+    """
+    Returns an (n_ids, d) array where row i is the vector stored under ID i
+    (positional indexes: row i is simply vector i). Missing IDs stay zero.
+    """
+    if isinstance(index, RerankedIndex):
+        # Exact rows are stored by ID already (rows of removed IDs are stale, not zero)
+        out = np.zeros((n_ids, index.d), dtype='float32')
+        n = min(n_ids, len(index.exact))
+        out[:n] = index.exact[:n]
+        return out
+    if isinstance(index, faiss.IndexIVF):
+        # IVF keeps (possibly non-contiguous) IDs in its inverted lists; removed IDs are absent
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        out = np.zeros((n_ids, index.d), dtype='float32')
+        ids = ivf_ids(index)
+        ids = ids[ids < n_ids]
+        if len(ids):
+            out[ids] = index.reconstruct_batch(ids)
+        return out
+    if not isinstance(index, faiss.IndexIDMap2):
+        return index.reconstruct_n(0, index.ntotal)
+    out = np.zeros((n_ids, index.d), dtype='float32')
+    if index.ntotal:
+        ids = faiss.vector_to_array(index.id_map)
+        out[ids] = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+    return out
+
+
+def rss_mb():
+    """Resident set size of this process in MB (Linux /proc, peak RSS elsewhere)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,75 @@
+import os
+import json
+import numpy as np
+
+
+class FeatureStoreWriter:
+    """
+    Streams per-song feature matrices (Frames x dim) into one flat binary file,
+    song after song, plus a JSON index of {song: {hash, offset, frames}}.
+    Extra `attrs` (sample rate, hop, ...) are stored alongside the index.
+    """
+
+    def __init__(self, store_path, index_path, dim, dtype="float32", attrs=None):
+        self.store_path = store_path
+        self.index_path = index_path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.attrs = attrs or {}
+        self.songs = {}
+        self.offset = 0
+        self._f = open(store_path + ".tmp", "wb")
+
+    def add_frames(self, name, content_hash, frames):
+        frames = np.ascontiguousarray(frames, dtype=self.dtype).reshape(-1, self.dim)
+        frames.tofile(self._f)
+        self.songs[name] = {"hash": content_hash, "offset": self.offset, "frames": int(frames.shape[0])}
+        self.offset += frames.shape[0]
+
+    def copy_from(self, store, name):
+        """Carries an unchanged song over from an existing store (incremental builds)."""
+        self.add_frames(name, store.songs[name]["hash"], store.frames(name))
+
+    def close(self):
+        self._f.close()
+        os.replace(self.store_path + ".tmp", self.store_path)
+        with open(self.index_path, "w") as f:
+            json.dump(dict(self.attrs,
+                           dim=self.dim,
+                           dtype=self.dtype.name,
+                           total_frames=self.offset,
+                           songs=self.songs), f)
+
+
+class FeatureStore:
+    """Read-only, memory-mapped view over a store written by FeatureStoreWriter."""
+
+    def __init__(self, store_path, index_path):
+        with open(index_path, "r") as f:
+            self.info = json.load(f)
+        self.songs = self.info["songs"]
+        self.dim = self.info["dim"]
+        self._data = None
+        if self.info["total_frames"] > 0:
+            self._data = np.memmap(store_path, dtype=self.info["dtype"], mode="r",
+                                   shape=(self.info["total_frames"], self.dim))
+
+    def __contains__(self, name):
+        return name in self.songs
+
+    def __len__(self):
+        return len(self.songs)
+
+    def frames(self, name, n_frames=None, content_hash=None):
+        """
+        Returns the (Frames, dim) view for `name`, or None if missing or stale.
+        Pass `content_hash` to reject entries built from a different file.
+        """
+        entry = self.songs.get(name)
+        if entry is None or self._data is None:
+            return None
+        if content_hash is not None and entry["hash"] != content_hash:
+            return None
+        n = entry["frames"] if n_frames is None else min(n_frames, entry["frames"])
+        start = entry["offset"]
+        return self._data[start:start + n]
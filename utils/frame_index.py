@@ -0,0 +1,157 @@
+import os
+import numpy as np
+
+from utils.faiss_utils import make_index, save_index, load_index
+from utils.chunk_meta import ChunkMeta, REMOVED, load_chunk_meta
+from utils.chunking import normalize_rows
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Optional sample-reuse index: one vector per second of catalog audio (the raw
+# OpenL3 frames, L2-normalized) in an IVF-PQ index. Row i's song and second are
+# in a ChunkMeta whose "chunks" are the 1 s frames (start = second, end = second + 1).
+FRAME_INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_frames.faiss")
+FRAME_META_PREFIX = os.path.join(ROOT_DIR, "data", "audio_frames_meta")
+
+FRAME_PQ_DIMS = 8               # 512-d frames -> 64 one-byte codes (32x smaller than float32)
+FRAME_TRAIN_SAMPLE = 100_000    # Frames the IVF/PQ quantizers are trained on
+FRAME_NPROBE = 32
+
+# Run search: a reused sample is a run of consecutive query seconds whose best
+# matches are consecutive seconds of one catalog song (constant offset)
+FRAME_K = 5                     # Neighbours per query second
+FRAME_THRESHOLD = 0.9           # Min exact frame similarity (PQ hits re-scored against the OpenL3 store)
+FRAME_MAX_GAP = 1               # Query seconds a run may skip (a missed frame)
+MIN_RUN_SECONDS = 2             # Shortest reported run
+
+
+def write_frame_index(store, index_path=FRAME_INDEX_PATH, meta_prefix=FRAME_META_PREFIX,
+                      train_sample=FRAME_TRAIN_SAMPLE, seed=0):
+    """
+    Builds the per-second index from an EmbeddingStore (no audio decoding).
+    The quantizers are trained on a random sample of frames, then the catalog is
+    added song by song, so only one song's frames are in float32 at a time.
+    Returns (index, meta).
+    """
+    names = sorted(store.songs)
+    meta = ChunkMeta()
+    for name in names:
+        n = store.songs[name]['frames']
+        meta.add_song(name, np.stack([np.arange(n), np.arange(1, n + 1)], axis=1))
+    if not len(meta):
+        return None, meta
+
+    # Frame rows are stored song after song in the same order as `meta`
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(meta), min(train_sample, len(meta)), replace=False))
+    offsets = np.r_[0, np.cumsum([store.songs[n]['frames'] for n in names])]
+    song_of = np.searchsorted(offsets, rows, side='right') - 1
+    sample = np.vstack([store.frames(names[s])[rows[song_of == s] - offsets[s]]
+                        for s in np.unique(song_of)])
+
+    index, params = make_index(normalize_rows(sample), "ivfpq", nprobe=FRAME_NPROBE, pq_dims=FRAME_PQ_DIMS)
+    index.reset()  # Keep the trained quantizers; the catalog is added below
+    for name in names:
+        frames = store.get(name)
+        if frames is not None and len(frames):
+            index.add(normalize_rows(frames))
+
+    save_index(index, index_path, params)
+    meta.save(meta_prefix)
+    return index, meta
+
+
+def load_frame_index(index_path=FRAME_INDEX_PATH, meta_prefix=FRAME_META_PREFIX, mmap=True):
+    """(index, meta) of the per-second index, or None if it was not built."""
+    if not os.path.exists(index_path):
+        return None
+    meta = load_chunk_meta(meta_prefix, mmap=mmap)
+    if meta is None:
+        return None
+    return load_index(index_path, mmap=mmap), meta
+
+
+def consecutive_runs(q, song, c, sim, max_gap=FRAME_MAX_GAP, min_seconds=MIN_RUN_SECONDS):
+    """
+    Groups frame hits (query second q, catalog song/second c, similarity) into
+    runs: same song, same offset q - c, query seconds at most max_gap + 1 apart.
+    Returns (song, q_start, q_end, c_start, c_end, n_hits, mean_sim) arrays for
+    runs covering at least min_seconds; ends are exclusive.
+    """
+    q, song, c, sim = (np.asarray(a) for a in (q, song, c, sim))
+    if len(q) == 0:
+        return tuple(np.empty(0, dtype='int64') for _ in range(6)) + (np.empty(0),)
+    off = q - c
+    order = np.lexsort((q, off, song))
+    q, song, c, sim, off = q[order], song[order], c[order], sim[order], off[order]
+
+    # Several neighbours of one query second can land on the same diagonal; keep the best
+    dup = np.r_[False, (song[1:] == song[:-1]) & (off[1:] == off[:-1]) & (q[1:] == q[:-1])]
+    if dup.any():
+        best = np.maximum.reduceat(sim, np.flatnonzero(~dup))
+        keep = ~dup
+        q, song, c, off, sim = q[keep], song[keep], c[keep], off[keep], best
+
+    new_run = np.r_[True, (song[1:] != song[:-1]) | (off[1:] != off[:-1]) | (q[1:] - q[:-1] > max_gap + 1)]
+    starts = np.flatnonzero(new_run)
+    ends = np.r_[starts[1:], len(q)] - 1
+    sim_sum = np.add.reduceat(sim, starts)
+    ok = q[ends] - q[starts] + 1 >= min_seconds
+    starts, ends, sim_sum = starts[ok], ends[ok], sim_sum[ok]
+    n_hits = ends - starts + 1
+    mean_sim = sim_sum / n_hits
+    return (song[starts], q[starts], q[ends] + 1, c[starts], c[ends] + 1, n_hits, mean_sim)
+
+
+def exact_similarities(store, meta, Qn, q, i):
+    """
+    Exact cosine similarity of normalized query seconds Qn[q] and catalog frame
+    rows i, read from the raw OpenL3 store. PQ inner products run low (near-
+    identical frames scored 0.875-0.93), so thresholds apply to these instead.
+    Rows whose song is missing from the store (or shorter there) get -inf.
+    """
+    sim = np.full(len(i), -np.inf)
+    song = np.asarray(meta.song_ids[i], dtype='int64')
+    sec = np.asarray(meta.starts[i], dtype='int64')
+    for s in np.unique(song[song != REMOVED]):
+        ref = store.frames(meta.songs[s])
+        if ref is None:
+            continue
+        sel = np.flatnonzero((song == s) & (sec < len(ref)))
+        rows = normalize_rows(ref[sec[sel]])
+        sim[sel] = np.einsum('nd,nd->n', rows, Qn[q[sel]])
+    return sim
+
+
+def find_sample_runs(index, meta, frames, store=None, k=FRAME_K, threshold=FRAME_THRESHOLD,
+                     max_gap=FRAME_MAX_GAP, min_seconds=MIN_RUN_SECONDS):
+    """
+    Searches every second of an upload (T x 512 raw OpenL3 frames) and returns
+    runs of consecutive matching seconds, longest first, as dicts with the
+    catalog song, the upload and catalog ranges in seconds and the mean similarity.
+    With the OpenL3 `store` the PQ hits are re-scored exactly before the
+    threshold; without it the (downward-biased) PQ scores are used as they are.
+    """
+    if frames is None or len(frames) == 0:
+        return []
+    Qn = normalize_rows(frames)
+    D, I = index.search(Qn, k)
+    q = np.repeat(np.arange(len(frames)), k)
+    d, i = D.ravel(), I.ravel()
+    valid = i != -1
+    q, d, i = q[valid], d[valid], i[valid]
+    if store is not None:
+        d = exact_similarities(store, meta, Qn, q, i)
+    keep = d >= threshold
+    q, d, i = q[keep], d[keep], i[keep]
+    song = np.asarray(meta.song_ids[i], dtype='int64')
+    live = song != REMOVED
+    if not live.any():
+        return []
+    c = np.asarray(meta.starts[i[live]], dtype='int64')
+    runs = consecutive_runs(q[live], song[live], c, d[live], max_gap, min_seconds)
+
+    out = [{"song": meta.songs[s], "query": [int(q0), int(q1)], "catalog": [int(c0), int(c1)],
+            "seconds": int(q1 - q0), "score": round(min(float(m), 1.0) * 100, 2)}
+           for s, q0, q1, c0, c1, _, m in zip(*runs)]
+    out.sort(key=lambda r: (r["seconds"], r["score"]), reverse=True)
+    return out
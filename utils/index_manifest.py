@@ -0,0 +1,49 @@
+import os
+import json
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_PATH = os.path.join(ROOT_DIR, "data", "audio_index_manifest.json")
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Manifest format: {"songs": {filename: {"hash", "first_id", "n_chunks"}}}
+    Chunk IDs of a song are first_id .. first_id + n_chunks - 1 (also their
+    row in the chunk metadata, see utils/chunk_meta.py).
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def new_manifest():
+    return {"songs": {}}
+
+
+def add_song(manifest, name, content_hash, first_id, n_chunks):
+    manifest["songs"][name] = {"hash": content_hash, "first_id": int(first_id), "n_chunks": int(n_chunks)}
+
+
+def diff_catalog(manifest, current_hashes):
+    """
+    Compares {filename: hash} on disk against the manifest.
+    Returns (to_embed, to_remove): new/changed files, and manifest songs
+    whose chunks must be dropped (changed or deleted).
+    """
+    known = manifest["songs"]
+    to_embed = sorted(n for n, h in current_hashes.items() if known.get(n, {}).get("hash") != h)
+    to_remove = sorted(n for n in known if n not in current_hashes or known[n]["hash"] != current_hashes[n])
+    return to_embed, to_remove
+
+
+def song_ids(manifest, name):
+    entry = manifest["songs"][name]
+    return list(range(entry["first_id"], entry["first_id"] + entry["n_chunks"]))
@@ -1,7 +1,11 @@
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from utils.chunking import normalize_rows
+
+
 class AudioAdapter(nn.Module):
     def __init__(self):
         super(AudioAdapter, self).__init__()
@@ -16,4 +20,19 @@ class AudioAdapter(nn.Module):
         x = self.relu(x)
         x = self.layer2(x)
         # Normalize so that vector length is always 1.0 (Critical for Cosine Similarity)
-        return F.normalize(x, p=2, dim=1)
\ No newline at end of file
+        return F.normalize(x, p=2, dim=1)
+
+
+def adapt_vectors(X, model, batch_size=8192):
+    """
+    Projects raw OpenL3 vectors (N x 512) into index space with batched forward
+    passes. Without a trained adapter the raw vectors are just L2-normalized.
+    """
+    X = np.asarray(X, dtype='float32')
+    if model is None:
+        return normalize_rows(X)
+    out = []
+    with torch.no_grad():
+        for i in range(0, max(len(X), 1), batch_size):
+            out.append(model(torch.from_numpy(X[i:i + batch_size])).numpy())
+    return np.vstack(out)
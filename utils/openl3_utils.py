@@ -1,31 +1,122 @@
 import openl3
-import soundfile as sf
 import numpy as np
-import librosa
+
+from utils.audio_utils import as_decoded, stream_pcm
+
+OPENL3_SR = 48000
+STREAM_BLOCK_SECONDS = 30.0
+
+# Model configuration shared by every extraction path (builds, engine, checkers)
+OPENL3_CONTENT_TYPE = "music"
+OPENL3_INPUT_REPR = "mel256"
+OPENL3_EMBEDDING_SIZE = 512
+
+# One Keras model per configuration per process (building it costs seconds)
+_MODELS = {}
+
+
+def get_openl3_model(content_type=OPENL3_CONTENT_TYPE, input_repr=OPENL3_INPUT_REPR,
+                     embedding_size=OPENL3_EMBEDDING_SIZE):
+    key = (content_type, input_repr, embedding_size)
+    if key not in _MODELS:
+        _MODELS[key] = openl3.models.load_audio_embedding_model(input_repr=input_repr,
+                                                               content_type=content_type,
+                                                               embedding_size=embedding_size)
+    return _MODELS[key]
+
+
+def warm_up_openl3():
+    """Loads the model and runs one dummy inference so the first real request is not slow."""
+    try:
+        openl3.get_audio_embedding(np.zeros(OPENL3_SR, dtype=np.float32), OPENL3_SR,
+                                   model=get_openl3_model(), hop_size=1.0, verbose=False)
+        return True
+    except Exception as e:
+        print(f"⚠️ OpenL3 warm-up failed: {e}")
+        return False
 
 
 def extract_openl3_embedding(file_path):
     """
+    Accepts a file path or an already decoded utils.audio_utils.DecodedAudio.
+
     Returns:
         numpy array of shape (Time_Steps, 512)
     """
+    audio_obj = as_decoded(file_path)
     try:
-        # Load audio using librosa to ensure consistent sample rate and mono
-        # (soundfile can sometimes fail on 24-bit headers or varying channels)
-        audio, sr = librosa.load(file_path, sr=48000, mono=True)
+        # Decode via DecodedAudio so later stages can reuse the same PCM
+        # (librosa keeps sample rate and mono handling consistent)
+        sr = 48000
+        audio = audio_obj.at(sr)
 
         # Get embeddings (hop_size=1.0 means 1 vector per second)
         emb, ts = openl3.get_audio_embedding(
             audio,
             sr,
-            content_type="music",
-            embedding_size=512,
-            hop_size=1.0
+            model=get_openl3_model(),
+            hop_size=1.0,
+            verbose=False
         )
 
         return emb  # Returns shape (N, 512) - DO NOT MEAN HERE!
 
     except Exception as e:
-        print(f"Error processing {file_path}: {e}")
+        print(f"Error processing {audio_obj.path}: {e}")
         # Return empty array to prevent crashes
-        return np.empty((0, 512))
\ No newline at end of file
+        return np.empty((0, 512))
+
+
+def stream_openl3_embedding(file_path, block_seconds=STREAM_BLOCK_SECONDS):
+    """
+    Streaming variant of extract_openl3_embedding for long uploads.
+    Decodes `block_seconds` at a time, resamples to 48 kHz with a stateful
+    resampler and yields (n, 512) per-second embeddings as they become ready,
+    so peak memory depends on the block size, not on the file length.
+
+    Concatenating the yielded blocks reproduces extract_openl3_embedding:
+    the half-window (0.5 s) of leading zeros emulates openl3's centering and the
+    last partial second is zero-padded exactly as openl3 pads it (resampler
+    length rounding can add or drop one trailing near-silent frame).
+    """
+    import soxr
+
+    # 1 s window with a 1 s hop: consecutive windows do not overlap, so the only
+    # carry-over between blocks is the half-window offset plus the partial tail
+    frame_len = OPENL3_SR
+    hop_len = OPENL3_SR
+    model = get_openl3_model()
+
+    def embed(frames_audio):
+        emb, _ = openl3.get_audio_embedding(frames_audio, OPENL3_SR, model=model, center=False,
+                                            hop_size=1.0, verbose=False)
+        return emb
+
+    resampler = None
+    buf = np.zeros(frame_len // 2, dtype=np.float32)  # centering pad
+    try:
+        for block, sr in stream_pcm(file_path, block_seconds):
+            if resampler is None:
+                resampler = soxr.ResampleStream(sr, OPENL3_SR, 1, dtype='float32', quality='HQ')
+            buf = np.concatenate([buf, resampler.resample_chunk(block.astype(np.float32))])
+
+            # Embed every complete window; the partial tail carries over to the next block
+            n_frames = len(buf) // hop_len
+            if n_frames > 0:
+                yield embed(buf[:n_frames * hop_len])
+                buf = buf[n_frames * hop_len:]
+
+        if resampler is None:
+            return  # Empty / unreadable file
+        buf = np.concatenate([buf, resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)])
+
+        # Flush: remaining full windows, then the zero-padded last partial window
+        n_frames = len(buf) // hop_len
+        if n_frames > 0:
+            yield embed(buf[:n_frames * hop_len])
+            buf = buf[n_frames * hop_len:]
+        if len(buf) > 0:
+            yield embed(np.pad(buf, (0, frame_len - len(buf))))
+
+    except Exception as e:
+        print(f"Error streaming {file_path}: {e}")
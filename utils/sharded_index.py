@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import pickle
+import atexit
+import subprocess
+import threading
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from utils.faiss_utils import load_index, make_index, save_index
+from utils.chunk_meta import ChunkMeta, REMOVED
+
+# Shard i holds the chunks of every song whose content hash maps to i. Each shard
+# is a self-contained index (chunks stored under their global chunk IDs) plus its
+# own chunk metadata, so a shard can live on its own disk / be searched by its own process.
+SHARDS_DIR = os.path.join(ROOT_DIR, "data", "audio_shards")
+SHARDS_MANIFEST_PATH = os.path.join(SHARDS_DIR, "shards.json")
+
+
+def shard_of(content_hash, n_shards):
+    return int(content_hash[:8], 16) % n_shards
+
+
+def shard_paths(i, shards_dir=SHARDS_DIR):
+    return (os.path.join(shards_dir, f"shard_{i:03d}.faiss"),
+            os.path.join(shards_dir, f"shard_{i:03d}_meta"))
+
+
+def write_shards(X, meta, hashes, n_shards, index_type="flat", shards_dir=SHARDS_DIR):
+    """
+    Splits the catalog (X row = chunk ID, ChunkMeta, {song: hash}) into n_shards
+    indexes by song hash and writes the shard manifest. Returns the manifest.
+    """
+    os.makedirs(shards_dir, exist_ok=True)
+    song_shard = np.array([shard_of(hashes[name], n_shards) for name in meta.songs], dtype='int64')
+    song_ids = np.asarray(meta.song_ids, dtype='int64')
+    live = song_ids != REMOVED
+    chunk_shard = np.where(live, song_shard[np.where(live, song_ids, 0)], -1)
+
+    shards = []
+    for i in range(n_shards):
+        ids = np.flatnonzero(chunk_shard == i)
+        index_path, meta_prefix = shard_paths(i, shards_dir)
+        shard_meta = ChunkMeta()
+        for sid in np.unique(song_ids[ids]):
+            rows = ids[song_ids[ids] == sid]
+            shard_meta.add_song(meta.songs[sid], np.stack([meta.starts[rows], meta.ends[rows]], axis=1))
+        if len(ids):
+            index, params = make_index(X[ids], index_type, ids=ids)
+            save_index(index, index_path, params)
+        shard_meta.save(meta_prefix)
+        shards.append({"index": os.path.relpath(index_path, shards_dir),
+                       "meta": os.path.relpath(meta_prefix, shards_dir),
+                       "n_chunks": int(len(ids)), "n_songs": len(shard_meta.songs)})
+
+    manifest = {"n_shards": n_shards, "index_type": index_type, "d": int(X.shape[1]), "shards": shards}
+    manifest_path = os.path.join(shards_dir, os.path.basename(SHARDS_MANIFEST_PATH))
+    with open(manifest_path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+def load_shards_manifest(path=SHARDS_MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class ShardedIndex:
+    """
+    Scatter-gather search over shard worker processes. Each worker loads one
+    shard (memory-mapped) and answers search requests over a pipe; the
+    coordinator sends a query batch to all shards before reading any reply, so
+    shards search in parallel, then merges the per-shard top-k.
+    Quacks like a FAISS index for scan_audio: search(Q, k), ntotal, d.
+    """
+
+    def __init__(self, manifest_path=SHARDS_MANIFEST_PATH, mmap=True):
+        manifest = load_shards_manifest(manifest_path)
+        shards_dir = os.path.dirname(manifest_path)
+        self.d = manifest["d"]
+        self.workers = []
+        self._lock = threading.Lock()  # One request in flight per pipe (threaded Flask)
+        for shard in manifest["shards"]:
+            if not shard["n_chunks"]:
+                continue
+            cmd = [sys.executable, "-m", "utils.sharded_index", os.path.join(shards_dir, shard["index"])]
+            if not mmap:
+                cmd.append("--no-mmap")
+            proc = subprocess.Popen(cmd, cwd=ROOT_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self.workers.append(proc)
+        # Handshake: every worker reports its ntotal once the shard is loaded
+        self.ntotal = sum(self._recv(proc) for proc in self.workers)
+        atexit.register(self.close)
+
+    @staticmethod
+    def _send(proc, msg):
+        pickle.dump(msg, proc.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+        proc.stdin.flush()
+
+    @staticmethod
+    def _recv(proc):
+        reply = pickle.load(proc.stdout)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def _scatter_gather(self, msg, k):
+        with self._lock:
+            for proc in self.workers:
+                self._send(proc, msg)
+            parts = [self._recv(proc) for proc in self.workers]
+        return merge_topk(parts, k)
+
+    def search(self, Q, k):
+        return self._scatter_gather(("search", np.ascontiguousarray(Q, dtype='float32'), k), k)
+
+    def search_ids(self, Q, k, ids):
+        """Restricted search (song shortlist): every shard searches its share of `ids`."""
+        return self._scatter_gather(("subset", np.ascontiguousarray(Q, dtype='float32'), k,
+                                     np.asarray(ids, dtype='int64')), k)
+
+    def close(self):
+        for proc in self.workers:
+            try:
+                self._send(proc, ("close",))
+                proc.wait(timeout=5)
+            except Exception:
+                proc.kill()
+        self.workers = []
+
+
+def merge_topk(parts, k):
+    """Merges per-shard (D, I) results into the global top-k by similarity."""
+    if not parts:
+        raise ValueError("No non-empty shards to search.")
+    D = np.concatenate([p[0] for p in parts], axis=1)
+    I = np.concatenate([p[1] for p in parts], axis=1)
+    order = np.argsort(-D, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(D, order, 1), np.take_along_axis(I, order, 1)
+
+
+def serve(index_path, mmap=True):
+    """Shard worker loop: replies to ("search", Q, k) / ("subset", Q, k, ids) until ("close",)."""
+    import faiss
+    from utils.song_index import search_subset
+
+    # Keep the pipe clean: anything printed (by us or FAISS) goes to stderr
+    out = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    inp = sys.stdin.buffer
+
+    def reply(obj):
+        pickle.dump(obj, out, protocol=pickle.HIGHEST_PROTOCOL)
+        out.flush()
+
+    faiss.omp_set_num_threads(1)  # One core per shard; shards are the parallelism
+    index = load_index(index_path, mmap=mmap)
+    if isinstance(index, faiss.IndexIDMap):
+        own_ids = np.sort(faiss.vector_to_array(index.id_map))
+    else:
+        own_ids = None  # IVF: IDs are inside the inverted lists, filter with a selector
+    reply(int(index.ntotal))
+
+    while True:
+        try:
+            msg = pickle.load(inp)
+        except EOFError:
+            break
+        if msg[0] == "close":
+            break
+        try:
+            if msg[0] == "search":
+                _, Q, k = msg
+                reply(index.search(Q, k))
+            elif msg[0] == "subset":
+                _, Q, k, ids = msg
+                if own_ids is not None:
+                    ids = ids[np.isin(ids, own_ids, assume_unique=True)]
+                reply(search_subset(index, Q, k, ids))
+        except Exception as e:
+            reply(RuntimeError(f"shard {os.path.basename(index_path)}: {e}"))
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], mmap="--no-mmap" not in sys.argv)
@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import faiss
+
+from utils.chunk_meta import REMOVED
+from utils.chunking import normalize_rows
+from utils.faiss_utils import RerankedIndex, write_index_atomic
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Coarse stage: a few pooled vectors per song, row -> song ID in <index>.songs.npy
+SONG_INDEX_PATH = os.path.join(ROOT_DIR, "data", "audio_song_index.faiss")
+
+SONG_SEGMENTS = 4       # Pooled vectors per song (contiguous runs of its chunks)
+SHORTLIST_SONGS = 50    # Songs whose chunks the fine (chunk-level) search visits (0: audio_engine searches all chunks)
+
+
+def row_songs_path(index_path):
+    return index_path + ".songs.npy"
+
+
+def song_centroids(X, song_ids, segments=SONG_SEGMENTS):
+    """
+    Mean-pools chunk vectors (row = chunk ID) into up to `segments` normalized
+    vectors per song. Returns (centroids, row_song) with row_song[i] = song ID.
+    """
+    live = np.flatnonzero(song_ids != REMOVED)
+    order = live[np.argsort(song_ids[live], kind='stable')]
+    sids = np.asarray(song_ids[order], dtype='int64')
+    if len(sids) == 0:
+        return np.empty((0, X.shape[1]), dtype='float32'), np.empty(0, dtype='int32')
+
+    # Rank of each chunk within its song -> segment number
+    starts = np.r_[0, np.flatnonzero(np.diff(sids)) + 1]
+    lengths = np.diff(np.r_[starts, len(sids)])
+    rank = np.arange(len(sids)) - np.repeat(starts, lengths)
+    seg = rank * segments // np.repeat(lengths, lengths)
+
+    group = sids * segments + seg
+    bounds = np.r_[0, np.flatnonzero(np.diff(group)) + 1]
+    sums = np.add.reduceat(np.asarray(X, dtype='float32')[order], bounds, axis=0)
+    return normalize_rows(sums), (group[bounds] // segments).astype('int32')
+
+
+def save_song_index(X, song_ids, index_path=SONG_INDEX_PATH, segments=SONG_SEGMENTS):
+    """Builds the song-centroid index from the chunk vectors and writes it next to its row map."""
+    centroids, row_song = song_centroids(X, song_ids, segments)
+    index = faiss.IndexFlatIP(centroids.shape[1])
+    index.add(centroids)
+    # Row map first: a worker loading between the two replaces sees the old index
+    # with a row map at least as long (songs are only ever appended)
+    tmp = row_songs_path(index_path) + ".tmp"
+    with open(tmp, 'wb') as f:
+        np.save(f, row_song)
+    os.replace(tmp, row_songs_path(index_path))
+    write_index_atomic(index, index_path)
+    return index
+
+
+def selector_params(index, ids):
+    """Search parameters restricting `index` to `ids`, keeping its nprobe / efSearch."""
+    sel = faiss.IDSelectorBatch(ids)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=sel)
+
+
+def search_subset(index, Q, k, ids):
+    """
+    k-NN of Q restricted to chunk IDs `ids`. Scores the selected rows directly
+    when the index can hand them out (flat/SQ/PQ, ID-mapped, re-rank store),
+    otherwise lets FAISS filter with an ID selector (IVF, HNSW).
+    """
+    if hasattr(index, "search_ids"):
+        return index.search_ids(Q, k, ids)  # ShardedIndex: each shard filters its own IDs
+    Q = np.ascontiguousarray(Q, dtype='float32')
+    ids = np.asarray(ids, dtype='int64')
+    if len(ids) == 0:
+        return (np.full((len(Q), k), -np.finfo('float32').max, dtype='float32'),
+                np.full((len(Q), k), -1, dtype='int64'))
+    try:
+        rows = index.exact[ids] if isinstance(index, RerankedIndex) else index.reconstruct_batch(ids)
+    except RuntimeError:
+        base = index.index if isinstance(index, RerankedIndex) else index
+        return base.search(Q, k, params=selector_params(base, ids))
+
+    S = Q @ np.asarray(rows, dtype='float32').T
+    kk = min(k, len(ids))
+    top = np.argpartition(-S, kk - 1, axis=1)[:, :kk] if kk < len(ids) else np.tile(np.arange(kk), (len(Q), 1))
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(S, top, 1), axis=1, kind='stable'), 1)
+    D = np.take_along_axis(S, top, 1)
+    I = ids[top]
+    if kk < k:
+        # Fewer candidates than k: pad like FAISS does
+        D = np.pad(D, ((0, 0), (0, k - kk)), constant_values=-np.finfo('float32').max)
+        I = np.pad(I, ((0, 0), (0, k - kk)), constant_values=-1)
+    return D, I
+
+
+class SongShortlist:
+    """Coarse song-level stage: picks the songs whose chunks the chunk search visits."""
+
+    def __init__(self, index, row_song, song_ids, n_songs):
+        self.index = index
+        self.row_song = row_song
+        self.n_songs = n_songs
+        self.rows_per_song = int(np.bincount(row_song).max()) if len(row_song) else 1
+        # Chunk IDs grouped by song, for turning a song shortlist into an ID list
+        live = np.flatnonzero(song_ids != REMOVED)
+        self._chunks = live[np.argsort(song_ids[live], kind='stable')]
+        counts = np.bincount(np.asarray(song_ids[live], dtype='int64'), minlength=self.n_songs)
+        self._offsets = np.r_[0, np.cumsum(counts)]
+
+    def songs(self, Q, m=SHORTLIST_SONGS):
+        """Top-m song IDs by their best centroid similarity to any query chunk."""
+        k = min(self.index.ntotal, m * self.rows_per_song)
+        D, I = self.index.search(np.ascontiguousarray(Q, dtype='float32'), k)
+        valid = I >= 0
+        best = np.full(self.n_songs, -np.inf)
+        np.maximum.at(best, self.row_song[I[valid]], D[valid])
+        hit = np.flatnonzero(best > -np.inf)
+        if len(hit) > m:
+            hit = hit[np.argpartition(-best[hit], m - 1)[:m]]
+        return hit[np.argsort(-best[hit], kind='stable')]
+
+    def chunk_ids(self, songs):
+        return np.concatenate([self._chunks[self._offsets[s]:self._offsets[s + 1]] for s in songs]
+                              or [np.empty(0, dtype='int64')])
+
+    def search(self, chunk_index, Q, k, m=SHORTLIST_SONGS):
+        """Chunk-level k-NN restricted to the top-m songs. Returns (D, I, songs, n_chunks)."""
+        songs = self.songs(Q, m)
+        ids = self.chunk_ids(songs)
+        D, I = search_subset(chunk_index, Q, k, ids)
+        return D, I, songs, len(ids)
+
+
+def load_song_shortlist(meta, index_path=SONG_INDEX_PATH):
+    """Loads the song-centroid index for a ChunkMeta, or None if it was not built."""
+    if not os.path.exists(index_path) or not os.path.exists(row_songs_path(index_path)):
+        return None
+    row_song = np.load(row_songs_path(index_path))
+    return SongShortlist(faiss.read_index(index_path), row_song, meta.song_ids, len(meta.songs))
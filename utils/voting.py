@@ -0,0 +1,54 @@
+import numpy as np
+
+from utils.chunk_meta import REMOVED
+
+
+class VoteTally:
+    """
+    Per-song chunk votes over one or more search batches, kept as arrays indexed
+    by song ID (ChunkMeta.songs). Equivalent to the old {name: count} dict loop:
+    every (dist, idx) hit with idx != -1 and dist >= threshold is one vote.
+    """
+
+    def __init__(self, song_ids, n_songs, threshold):
+        self.song_ids = song_ids    # chunk ID -> song ID
+        self.threshold = threshold
+        self.hits = np.zeros(n_songs, dtype='int64')
+        self.sim_sum = np.zeros(n_songs, dtype='float64')
+        # Order in which songs got their first vote, the dict's tie-break order
+        self.first_seen = np.full(n_songs, np.iinfo('int64').max, dtype='int64')
+        self.n_votes = 0
+
+    def add(self, D, I):
+        d = D.ravel()
+        i = I.ravel()
+        keep = (i != -1) & (d >= self.threshold)
+        sids = np.asarray(self.song_ids[i[keep]], dtype='int64')
+        weights = d[keep].astype('float64')
+        live = sids != REMOVED
+        sids, weights = sids[live], weights[live]
+
+        n = len(self.hits)
+        self.hits += np.bincount(sids, minlength=n)
+        self.sim_sum += np.bincount(sids, weights=weights, minlength=n)
+        songs, first = np.unique(sids, return_index=True)
+        self.first_seen[songs] = np.minimum(self.first_seen[songs], self.n_votes + first)
+        self.n_votes += len(sids)
+        return self
+
+    def mean_sim(self):
+        return self.sim_sum / np.maximum(self.hits, 1)
+
+    def top(self, n, score=None):
+        """
+        Song IDs of the n best songs that got any vote, by `score` (default: vote
+        count) descending, ties in first-vote order like sorted(dict.items()).
+        """
+        score = self.hits if score is None else np.asarray(score)
+        cand = np.flatnonzero(self.hits)
+        if len(cand) > n > 0:
+            # argpartition finds the n-th best score; keep everything tied with it
+            kth = score[cand][np.argpartition(-score[cand], n - 1)[n - 1]]
+            cand = cand[score[cand] >= kth]
+        order = np.lexsort((self.first_seen[cand], -score[cand]))
+        return cand[order][:n]
@@ -0,0 +1,38 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+from utils.openl3_utils import warm_up_openl3
+
+
+def init_embedding_worker(initializer=None):
+    # One core per worker; the pool provides the parallelism
+    torch.set_num_threads(1)
+    warm_up_openl3()  # One OpenL3 model per worker, reused for every file
+    if initializer is not None:
+        initializer()
+
+
+def map_embedding_workers(fn, items, workers, initializer=None):
+    """
+    Yields fn(item) in input order, serially or from a pool of `workers`
+    processes with a warmed-up OpenL3 model each. `initializer` runs once per
+    process before the first item (e.g. to load the adapter); fn and
+    initializer must be module-level functions so the pool can pickle them.
+    Workers are spawned, not forked: the caller has usually loaded TF/OpenL3
+    and torch already, and forking a process with their threads running can
+    deadlock the children.
+    """
+    if workers <= 1:
+        warm_up_openl3()
+        if initializer is not None:
+            initializer()
+        for item in items:
+            yield fn(item)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_embedding_worker, initargs=(initializer,)) as pool:
+        # map() preserves submission order, so results line up with the inputs
+        yield from pool.map(fn, items)